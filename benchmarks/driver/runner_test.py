@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 from esrally.driver import runner
@@ -67,3 +69,30 @@ def test_bulk_runner_without_errors_with_detailed_results(benchmark):
         "bulk-size": BULK_SIZE,
         "detailed-results": True
     })
+
+
+bulk_response = json.dumps({
+    "took": 500,
+    "errors": False,
+    "items": es.no_errors["items"]
+})
+
+
+@pytest.mark.benchmark(
+    group="bulk-response-parsing",
+    warmup="on",
+    warmup_iterations=100,
+    disable_gc=True
+)
+def test_deserialize_bulk_response(benchmark):
+    benchmark(json.loads, bulk_response)
+
+
+@pytest.mark.benchmark(
+    group="bulk-response-parsing",
+    warmup="on",
+    warmup_iterations=10000,
+    disable_gc=True
+)
+def test_parse_bulk_response(benchmark):
+    benchmark(runner.parse, bulk_response, ["took", "errors"])
@@ -0,0 +1,60 @@
+import pickle
+import random
+import time
+
+import pytest
+
+from esrally import metrics, track
+from esrally.driver import driver
+
+SAMPLES = 10000
+
+task = track.Task("index-append", track.Operation("index-append", operation_type=track.OperationType.Bulk))
+
+
+def create_sample_buffer():
+    rnd = random.Random(17)
+    sampler = driver.Sampler(client_id=0, task=task, start_timestamp=time.perf_counter())
+    for i in range(SAMPLES):
+        sampler.add(metrics.SampleType.Normal, {"success": True, "index": "logs-181998", "bulk-size": 5000}, rnd.uniform(50, 150),
+                    rnd.uniform(40, 100), 5000, "docs", i * 0.1, i / SAMPLES)
+    return sampler.drain()
+
+
+buffer = create_sample_buffer()
+encoded = driver.encode_samples(buffer)
+
+
+@pytest.mark.benchmark(
+    group="sample-encoding",
+    warmup="on",
+    warmup_iterations=10,
+    disable_gc=True
+)
+def test_encode_samples(benchmark):
+    benchmark.extra_info["bytes_per_sample"] = len(encoded) / SAMPLES
+    benchmark(driver.encode_samples, buffer)
+
+
+@pytest.mark.benchmark(
+    group="sample-encoding",
+    warmup="on",
+    warmup_iterations=10,
+    disable_gc=True
+)
+def test_decode_samples(benchmark):
+    benchmark.extra_info["bytes_per_sample"] = len(encoded) / SAMPLES
+    benchmark(driver.decode_samples, encoded)
+
+
+@pytest.mark.benchmark(
+    group="sample-encoding",
+    warmup="on",
+    warmup_iterations=10,
+    disable_gc=True
+)
+def test_pickle_sample_objects(benchmark):
+    # baseline: this is how samples were sent before
+    samples = buffer.to_samples()
+    benchmark.extra_info["bytes_per_sample"] = len(pickle.dumps(samples)) / SAMPLES
+    benchmark(pickle.dumps, samples)
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from esrally import metrics, track
+from esrally.driver import driver
+
+SAMPLES = 1000 * 1000
+CLIENTS = 8
+BATCHES = 20
+
+task = track.Task("index-append", track.Operation("index-append", operation_type=track.OperationType.Bulk))
+
+
+def create_samples():
+    rnd = random.Random(11)
+    samples = []
+    timestamps = [1470838595.0] * CLIENTS
+    for i in range(SAMPLES):
+        client_id = i % CLIENTS
+        timestamps[client_id] += rnd.uniform(0.001, 0.01)
+        sample_type = metrics.SampleType.Warmup if i < SAMPLES // 10 else metrics.SampleType.Normal
+        samples.append(driver.Sample(client_id, timestamps[client_id], timestamps[client_id] - 1470838595.0, task, sample_type, None, 10,
+                                     10, 5000, "docs", timestamps[client_id] - 1470838595.0, None))
+    return samples
+
+
+samples = create_samples()
+batch_size = SAMPLES // BATCHES
+batches = [samples[i:i + batch_size] for i in range(0, SAMPLES, batch_size)]
+
+
+def calculate_in_one_go():
+    return driver.ThroughputCalculator().calculate(samples)
+
+
+def calculate_incrementally():
+    calculator = driver.ThroughputCalculator()
+    for batch in batches:
+        calculator.calculate(batch)
+
+
+@pytest.mark.benchmark(
+    group="throughput-calculation",
+    warmup="on",
+    warmup_iterations=1,
+    disable_gc=True
+)
+def test_calculate_throughput(benchmark):
+    benchmark(calculate_in_one_go)
+
+
+@pytest.mark.benchmark(
+    group="throughput-calculation",
+    warmup="on",
+    warmup_iterations=1,
+    disable_gc=True
+)
+def test_calculate_throughput_incrementally(benchmark):
+    benchmark(calculate_incrementally)
@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from esrally import config, metrics, reporter, track
+
+DOCS = 5 * 1000 * 1000
+TASKS = 20
+
+tasks = [track.Task("task-%d" % i, track.Operation("op-%d" % i, operation_type=track.OperationType.Search)) for i in range(TASKS)]
+challenge = track.Challenge(name="benchmark", schedule=tasks, default=True)
+
+SUCCESS = {"success": True}
+FAILURE = {"success": False}
+
+
+def create_store():
+    cfg = config.Config()
+    cfg.add(config.Scope.application, "system", "env.name", "benchmark")
+    cfg.add(config.Scope.application, "track", "params", {})
+    store = metrics.InMemoryMetricsStore(cfg)
+    rnd = random.Random(17)
+    # every request creates a latency and a service time sample and we add one throughput sample every 100 requests
+    for i in range(DOCS // 2):
+        task = tasks[i % TASKS].name
+        sample_type = "warmup" if i < DOCS // 20 else "normal"
+        meta = FAILURE if i % 1000 == 0 else SUCCESS
+        service_time = rnd.uniform(1, 100)
+        # we only set the properties that are used for querying to keep memory usage manageable
+        for name, value in (("latency", service_time + rnd.uniform(0, 5)), ("service_time", service_time)):
+            store._add({"name": name, "task": task, "operation-type": "Search", "sample-type": sample_type, "lap": 1,
+                        "value": value, "unit": "ms", "meta": meta})
+        if i % 100 == 0:
+            store._add({"name": "throughput", "task": task, "operation-type": "Search", "sample-type": sample_type, "lap": 1,
+                        "value": rnd.uniform(100, 200), "unit": "ops/s", "meta": SUCCESS})
+    return store
+
+
+store = create_store()
+
+
+@pytest.mark.benchmark(
+    group="summary-report",
+    warmup="on",
+    warmup_iterations=1,
+    disable_gc=True
+)
+def test_calculate_summary_report(benchmark):
+    benchmark(reporter.StatsCalculator(store, challenge, lap=1))
@@ -1,6 +1,8 @@
 import os
 import pytest
+from elasticsearch.serializer import JSONSerializer
 
+from esrally import client
 from esrally.track import params, track
 
 
@@ -125,3 +127,74 @@ def test_search_params_no_body_params(benchmark):
         }
     })
     benchmark(search.params)
+
+
+def search_with_body_params(serialize_body):
+    return params.SearchParamSource(track=track.Track(name="benchmark-track"), params={
+        "index": "_all",
+        "body": {
+            "query": {
+                "bool": {
+                    "must": [
+                        {"match": {"title": "nor"}},
+                        {"range": {"year": {"gte": 1990, "lte": 2010}}}
+                    ],
+                    "filter": {"term": {"genre": "rock"}}
+                }
+            },
+            "aggs": {
+                "per_year": {"date_histogram": {"field": "released", "interval": "year"}}
+            },
+            "size": 20
+        },
+        "body-params": {
+            "query.bool.filter.term.genre": terms
+        },
+        "serialize-body": serialize_body
+    })
+
+
+# simulates what the Elasticsearch client does with the request body
+serializer = client.BytesPassThroughSerializer(JSONSerializer())
+
+
+@pytest.mark.benchmark(
+    group="search-body-serialization",
+    warmup="on",
+    warmup_iterations=10000,
+    disable_gc=True
+)
+def test_search_params_serialized_per_request(benchmark):
+    search = search_with_body_params(serialize_body=False)
+    benchmark(lambda: serializer.dumps(search.params()["body"]))
+
+
+@pytest.mark.benchmark(
+    group="search-body-serialization",
+    warmup="on",
+    warmup_iterations=10000,
+    disable_gc=True
+)
+def test_search_params_pre_serialized(benchmark):
+    search = search_with_body_params(serialize_body=True)
+    benchmark(lambda: serializer.dumps(search.params()["body"]))
+
+
+@pytest.mark.benchmark(
+    group="synthetic-bulk",
+    warmup="on",
+    warmup_iterations=10,
+    disable_gc=True
+)
+def test_synthetic_bulk_params(benchmark):
+    source = params.SyntheticBulkParamSource(track=track.Track(name="benchmark-track"), params={
+        "index": "logs",
+        "bulk-size": 5000,
+        "fields": {
+            "status": {"type": "keyword", "cardinality": 1000, "skew": 1.2},
+            "size": {"type": "long", "min": 0, "max": 65536},
+            "@timestamp": {"type": "date", "start": "2018-01-01", "end": "2019-01-01"},
+            "message": {"type": "text", "vocabulary": terms, "min-words": 3, "max-words": 12}
+        }
+    })
+    benchmark(source.partition(0, 1).params)
@@ -1,4 +1,7 @@
+import contextlib
 import logging
+import threading
+
 import certifi
 import urllib3
 
@@ -98,6 +101,12 @@ class EsClientFactory:
         else:
             self.logger.info("HTTP compression: off")
 
+        self.serializer = self.client_options.pop("serializer", "json")
+        if self.serializer not in SERIALIZERS:
+            raise exceptions.SystemSetupError("Unknown serializer [{}] in client-options. Valid values are {}.".format(
+                self.serializer, SERIALIZERS))
+        self.logger.info("Serializer: %s", self.serializer)
+
     def _is_set(self, client_opts, k):
         try:
             return client_opts[k]
@@ -106,4 +115,94 @@ class EsClientFactory:
 
     def create(self):
         import elasticsearch
-        return elasticsearch.Elasticsearch(hosts=self.hosts, ssl_context=self.ssl_context, **self.client_options)
+        return elasticsearch.Elasticsearch(hosts=self.hosts, ssl_context=self.ssl_context,
+                                           serializer=BytesPassThroughSerializer(create_serializer(self.serializer, self.logger)),
+                                           **self.client_options)
+
+
+def create_serializer(name, logger=None):
+    """
+    Creates the JSON serializer with the provided name. Falls back to elasticsearch-py's default serializer if the serializer's library
+    is not installed.
+
+    :param name: The name of the serializer. See ``SERIALIZERS`` for valid values.
+    :param logger: An optional logger.
+    :return: A serializer instance suitable for elasticsearch-py.
+    """
+    import elasticsearch
+    if name == "orjson":
+        try:
+            return OrjsonSerializer()
+        except ImportError:
+            console.warn("The serializer 'orjson' has been requested but orjson is not installed. Falling back to the default serializer. "
+                         "Install it with 'pip3 install orjson'.", logger=logger)
+    return elasticsearch.serializer.JSONSerializer()
+
+
+class OrjsonSerializer:
+    """
+    A drop-in replacement for elasticsearch-py's ``JSONSerializer`` that is based on the much faster `orjson` library.
+    """
+    mimetype = "application/json"
+
+    def __init__(self):
+        import orjson
+        import elasticsearch
+        self.orjson = orjson
+        # reuse the conversions for dates, decimals and UUIDs of the default serializer
+        self.default = elasticsearch.serializer.JSONSerializer().default
+
+    def loads(self, s):
+        import elasticsearch
+        try:
+            return self.orjson.loads(s)
+        except (ValueError, TypeError) as e:
+            raise elasticsearch.exceptions.SerializationError(s, e)
+
+    def dumps(self, data):
+        import elasticsearch
+        # don't serialize strings
+        if isinstance(data, str):
+            return data
+        try:
+            # elasticsearch-py joins bulk lines with str separators so we must not return bytes here
+            return self.orjson.dumps(data, default=self.default).decode("utf-8")
+        except (ValueError, TypeError) as e:
+            raise elasticsearch.exceptions.SerializationError(data, e)
+
+
+# "json" is elasticsearch-py's default serializer, "orjson" requires that orjson is installed
+SERIALIZERS = ["json", "orjson"]
+
+
+class BytesPassThroughSerializer:
+    """
+    Serializes request bodies like the provided serializer but passes request bodies that are already serialized to ``bytes`` through as
+    is. elasticsearch-py's default serializer cannot handle ``bytes`` and would raise a ``SerializationError``.
+
+    Within ``raw_responses()``, responses are not deserialized at all but returned as a string so callers can extract only the
+    properties that they need (see ``esrally.driver.runner.parse``).
+    """
+    def __init__(self, delegate):
+        self.delegate = delegate
+        self.mimetype = delegate.mimetype
+        # only the thread that has requested raw responses should get them in case the client is shared
+        self.local = threading.local()
+
+    @contextlib.contextmanager
+    def raw_responses(self):
+        self.local.raw = True
+        try:
+            yield
+        finally:
+            self.local.raw = False
+
+    def dumps(self, data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return data
+        return self.delegate.dumps(data)
+
+    def loads(self, s):
+        if getattr(self.local, "raw", False):
+            return s
+        return self.delegate.loads(s)
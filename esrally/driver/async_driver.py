@@ -0,0 +1,315 @@
+import asyncio
+import concurrent.futures
+import copy
+import datetime
+import logging
+import threading
+import time
+
+from esrally import actor, exceptions, track
+from esrally.driver import driver, runner, scheduler
+from esrally.utils import convert
+
+
+class AsyncClient:
+    """
+    Holds the state of one client that is driven by an ``AsyncLoadGenerator``.
+    """
+
+    def __init__(self, client_id, tasks, es):
+        self.client_id = client_id
+        self.tasks = tasks
+        self.es = es
+        self.current_task_index = 0
+        self.current_task = None
+        # used to indicate that we want to prematurely consider this completed. This is *not* due to cancellation but a regular event in
+        # a benchmark and used to model task dependency of parallel tasks.
+        self.complete = threading.Event()
+        self.executor_future = None
+        self.sampler = None
+
+    def at_joinpoint(self):
+        return isinstance(self.current_task, driver.JoinPoint)
+
+    def current_task_and_advance(self):
+        current = self.tasks[self.current_task_index]
+        self.current_task_index += 1
+        return current
+
+
+class AsyncLoadGenerator(actor.RallyActor):
+    """
+    A load generator that drives multiple clients within one process. Each client runs as a coroutine on an asyncio event loop which
+    runs in a dedicated background thread. Waiting for the next scheduled request does not block any thread so hundreds of clients can
+    share one process.
+
+    Towards the master, this load generator behaves exactly like multiple ``LoadGenerator`` instances: it reports samples and reached join
+    points per client and it expects ``Drive`` and ``CompleteCurrentTask`` messages per client.
+    """
+
+    WAKEUP_INTERVAL_SECONDS = 5
+
+    def __init__(self):
+        super().__init__()
+        self.master = None
+        self.config = None
+        self.track = None
+        self.clients = {}
+        self.abort_on_error = False
+        self.precise_timing = False
+        self.loop = None
+        self.loop_thread = None
+        self.request_pool = None
+        # cancellation via future does not work, hence we use our own mechanism with a shared variable and polling
+        self.cancel = threading.Event()
+        self.wakeup_scheduled = False
+        self.wakeup_interval = AsyncLoadGenerator.WAKEUP_INTERVAL_SECONDS
+
+    @actor.no_retry("load generator")
+    def receiveMsg_StartAsyncLoadGenerator(self, msg, sender):
+        self.logger.info("AsyncLoadGenerator for clients %s is about to start.", msg.client_ids)
+        self.master = sender
+        self.config = driver.load_local_config(msg.config)
+        self.abort_on_error = self.config.opts("driver", "on.error") == "abort"
+        self.precise_timing = driver.precise_timing(self.config)
+        self.track = msg.track
+        track.set_absolute_data_path(self.config, self.track)
+        self.cancel.clear()
+        # we need to wake up more often in test mode
+        if self.config.opts("track", "test.mode.enabled"):
+            self.wakeup_interval = 0.5
+        if self.config.opts("driver", "profiling"):
+            self.logger.warning("Driver profiling is not supported by the asyncio load generator mode. Ignoring.")
+        runner.register_default_runners()
+        if self.track.has_plugins:
+            track.load_track_plugins(self.config, runner.register_runner, scheduler.register_scheduler)
+        for client_id, tasks in zip(msg.client_ids, msg.tasks):
+            # each client has its own connections to all clusters
+            self.clients[client_id] = AsyncClient(client_id, tasks, driver.es_clients(self.config))
+        # The Elasticsearch client is blocking. Hence, requests are issued from a thread pool and each client's coroutine waits
+        # (without blocking the event loop) for its request to finish. As each client issues at most one request at a time, a pool of
+        # this size is sufficient.
+        self.request_pool = concurrent.futures.ThreadPoolExecutor(max_workers=len(self.clients))
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.run_event_loop, name="rally-asyncio-load-generator", daemon=True)
+        self.loop_thread.start()
+        for c in self.clients.values():
+            self.drive(c)
+
+    @actor.no_retry("load generator")
+    def receiveMsg_Drive(self, msg, sender):
+        sleep_time = datetime.timedelta(seconds=msg.client_start_timestamp - time.perf_counter())
+        c = self.clients[msg.client_id]
+        self.logger.info("AsyncLoadGenerator client [%d] is continuing its work at task index [%d] on [%f], that is in [%s].",
+                         c.client_id, c.current_task_index, msg.client_start_timestamp, sleep_time)
+        # the payload tells us which client should start driving
+        self.wakeupAfter(sleep_time, payload=c.client_id)
+
+    @actor.no_retry("load generator")
+    def receiveMsg_CompleteCurrentTask(self, msg, sender):
+        c = self.clients[msg.client_id]
+        # finish now ASAP. Remaining samples will be sent with the next WakeupMessage. We will also need to skip to the next
+        # JoinPoint. But if we are already at a JoinPoint at the moment, there is nothing to do.
+        if c.at_joinpoint():
+            self.logger.info("AsyncLoadGenerator client [%s] has received CompleteCurrentTask but is currently at [%s]. Ignoring.",
+                             str(c.client_id), c.current_task)
+        else:
+            self.logger.info("AsyncLoadGenerator client [%s] has received CompleteCurrentTask. Completing current task [%s].",
+                             str(c.client_id), c.current_task)
+            c.complete.set()
+
+    @actor.no_retry("load generator")
+    def receiveMsg_WakeupMessage(self, msg, sender):
+        if msg.payload is not None:
+            c = self.clients[msg.payload]
+            self.logger.info("AsyncLoadGenerator client [%s] starts driving now.", str(c.client_id))
+            self.drive(c)
+            return
+
+        self.wakeup_scheduled = False
+        for c in self.clients.values():
+            self.send_samples(c)
+        if self.cancel.is_set():
+            self.logger.info("AsyncLoadGenerator for clients %s has detected that benchmark has been cancelled. Notifying master...",
+                             list(self.clients.keys()))
+            self.send(self.master, actor.BenchmarkCancelled())
+            return
+        for c in self.clients.values():
+            if c.executor_future is not None and c.executor_future.done():
+                e = c.executor_future.exception(timeout=0)
+                if e:
+                    self.logger.info("AsyncLoadGenerator client [%s] has detected a benchmark failure. Notifying master...",
+                                     str(c.client_id))
+                    # the exception might be user-defined and not be on the load path of the master driver. Hence, it cannot be
+                    # deserialized on the receiver so we convert it here to a plain string.
+                    self.send(self.master, actor.BenchmarkFailure("Error in load generator [{}]".format(c.client_id), str(e)))
+                    return
+                else:
+                    self.logger.info("AsyncLoadGenerator client [%s] is ready for the next task.", str(c.client_id))
+                    c.executor_future = None
+                    self.drive(c)
+        self.schedule_wakeup()
+
+    def receiveMsg_ActorExitRequest(self, msg, sender):
+        self.logger.info("AsyncLoadGenerator for clients %s is exiting due to ActorExitRequest.", list(self.clients.keys()))
+        self.cancel.set()
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.request_pool is not None:
+            self.request_pool.shutdown(wait=False)
+
+    def receiveMsg_BenchmarkFailure(self, msg, sender):
+        # sent by our no_retry infrastructure; forward to master
+        self.send(self.master, msg)
+
+    def receiveUnrecognizedMessage(self, msg, sender):
+        self.logger.info("AsyncLoadGenerator received unknown message [%s] (ignoring).", str(msg))
+
+    def run_event_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def schedule_wakeup(self):
+        # all clients share one periodic wakeup
+        if not self.wakeup_scheduled and any(c.executor_future is not None for c in self.clients.values()):
+            self.wakeup_scheduled = True
+            self.wakeupAfter(datetime.timedelta(seconds=self.wakeup_interval))
+
+    def drive(self, c):
+        task_allocation = c.current_task_and_advance()
+        # skip non-tasks in the task list
+        while task_allocation is None:
+            task_allocation = c.current_task_and_advance()
+        c.current_task = task_allocation
+
+        if isinstance(task_allocation, driver.JoinPoint):
+            self.logger.info("AsyncLoadGenerator client [%d] reached join point [%s].", c.client_id, task_allocation)
+            # clients that don't execute tasks don't need to care about waiting
+            if c.executor_future is not None:
+                c.executor_future.result()
+            self.send_samples(c)
+            c.complete.clear()
+            c.executor_future = None
+            c.sampler = None
+            self.send(self.master, driver.JoinPointReached(c.client_id, task_allocation))
+        elif isinstance(task_allocation, driver.TaskAllocation):
+            task = task_allocation.task
+            # There may be a situation where there are more (parallel) tasks than clients. If we were asked to complete all tasks, we not
+            # only need to complete actively running tasks but actually all scheduled tasks until we reach the next join point.
+            if c.complete.is_set():
+                self.logger.info("AsyncLoadGenerator client [%d] skips [%s] because it has been asked to complete all tasks until next "
+                                 "join point.", c.client_id, task)
+            else:
+                self.logger.info("AsyncLoadGenerator client [%d] is executing [%s].", c.client_id, task)
+                c.sampler = driver.Sampler(c.client_id, task, start_timestamp=time.perf_counter())
+                schedule = driver.schedule_for(self.track, task_allocation.task, task_allocation.client_index_in_task)
+                executor = AsyncExecutor(task, schedule, c.es, c.sampler, self.cancel, c.complete, self.request_pool,
+                                         self.abort_on_error, self.precise_timing)
+                c.executor_future = asyncio.run_coroutine_threadsafe(executor(), self.loop)
+                self.schedule_wakeup()
+        else:
+            raise exceptions.RallyAssertionError("Unknown task type [%s]" % type(task_allocation))
+
+    def send_samples(self, c):
+        if c.sampler:
+            samples = c.sampler.drain()
+            if len(samples) > 0:
+                self.send(self.master, driver.UpdateSamples(c.client_id, driver.encode_samples(samples)))
+            return samples
+        return None
+
+
+class AsyncExecutor:
+    def __init__(self, task, schedule, es, sampler, cancel, complete, request_pool, abort_on_error=False, precise=False):
+        """
+        Executes tasks according to the schedule for a given operation as a coroutine.
+
+        :param task: The task that is executed.
+        :param schedule: The schedule for this task.
+        :param es: Elasticsearch client that will be used to execute the operation.
+        :param sampler: A container to store raw samples.
+        :param cancel: A shared boolean that indicates we need to cancel execution.
+        :param complete: A shared boolean that indicates we need to prematurely complete execution.
+        :param request_pool: A thread pool which is used to issue the (blocking) requests.
+        :param precise: If ``True``, busy-wait for the last ``driver.PRECISE_TIMING_SPIN_PERIOD`` seconds before the scheduled time of
+                        each request. This happens in ``request_pool`` so the event loop is not blocked.
+        """
+        self.task = task
+        self.op = task.operation
+        self.schedule = schedule
+        self.es = es
+        self.sampler = sampler
+        self.cancel = cancel
+        self.complete = complete
+        self.request_pool = request_pool
+        self.abort_on_error = abort_on_error
+        self.precise = precise
+        # runners are shared by all clients within this process but they may hold per-client state (e.g. a scroll id)
+        self.runners = {}
+        self.logger = logging.getLogger(__name__)
+
+    def runner_for_client(self, r):
+        key = id(r)
+        if key not in self.runners:
+            try:
+                self.runners[key] = copy.deepcopy(r)
+            except BaseException:
+                self.logger.warning("Cannot create a copy of runner [%s]. It will be shared by all clients of this load generator.", r)
+                self.runners[key] = r
+        return self.runners[key]
+
+    async def __call__(self):
+        loop = asyncio.get_event_loop()
+        total_start = time.perf_counter()
+        # noinspection PyBroadException
+        try:
+            for expected_scheduled_time, sample_type, percent_completed, r, params in self.schedule:
+                if self.cancel.is_set():
+                    self.logger.info("User cancelled execution.")
+                    break
+                absolute_expected_schedule_time = total_start + expected_scheduled_time
+                throughput_throttled = expected_scheduled_time > 0
+                spin = throughput_throttled and self.precise
+                if throughput_throttled:
+                    rest = absolute_expected_schedule_time - time.perf_counter()
+                    if spin:
+                        rest -= driver.PRECISE_TIMING_SPIN_PERIOD
+                    if rest > 0:
+                        await asyncio.sleep(rest)
+                if spin:
+                    # busy-wait on the request thread instead of the event loop which is shared by all clients
+                    start, total_ops, total_ops_unit, request_meta_data = await loop.run_in_executor(
+                        self.request_pool, driver.execute_single_at, absolute_expected_schedule_time, self.runner_for_client(r), self.es,
+                        params, self.abort_on_error)
+                else:
+                    start = time.perf_counter()
+                    total_ops, total_ops_unit, request_meta_data = await loop.run_in_executor(
+                        self.request_pool, driver.execute_single, self.runner_for_client(r), self.es, params, self.abort_on_error)
+                stop = time.perf_counter()
+
+                service_time = stop - start
+                # Do not calculate latency separately when we don't throttle throughput. This metric is just confusing then.
+                latency = stop - absolute_expected_schedule_time if throughput_throttled else service_time
+                # how much later than scheduled the request has been issued; meaningless if we don't throttle
+                schedule_lag = convert.seconds_to_ms(start - absolute_expected_schedule_time) if throughput_throttled else None
+                # last sample should bump progress to 100% if externally completed.
+                completed = percent_completed if not self.complete.is_set() else 1.0
+                self.sampler.add(sample_type, request_meta_data, convert.seconds_to_ms(latency), convert.seconds_to_ms(service_time),
+                                 total_ops, total_ops_unit, (stop - total_start), completed, schedule_lag)
+
+                if self.complete.is_set():
+                    self.logger.info("Task is considered completed due to external event.")
+                    break
+        except BaseException:
+            self.logger.exception("Could not execute schedule")
+            raise
+        finally:
+            # the task may end before the schedule is exhausted; release its resources immediately but without blocking the event loop
+            if hasattr(self.schedule, "close"):
+                await loop.run_in_executor(self.request_pool, self.schedule.close)
+            # Actively set it if this task completes its parent
+            if self.task.completes_parent:
+                self.complete.set()
@@ -1,9 +1,18 @@
+import array
+import bisect
 import concurrent.futures
 import threading
 import datetime
+import heapq
+import itertools
 import logging
+import math
+import operator
+import pickle
 import queue
+import sys
 import time
+import zlib
 
 import thespian.actors
 from esrally import actor, config, exceptions, metrics, track, client, paths, PROGRAM_NAME
@@ -70,13 +79,33 @@ class StartLoadGenerator:
         self.tasks = tasks
 
 
+class StartAsyncLoadGenerator:
+    """
+    Starts a load generator that drives multiple clients concurrently within one process.
+    """
+
+    def __init__(self, client_ids, config, track, tasks):
+        """
+        :param client_ids: Client ids of all clients that are driven by this load generator.
+        :param config: Rally internal configuration object.
+        :param track: The track to use.
+        :param tasks: Tasks to run. Contains one list of tasks per client id (in the same order as ``client_ids``).
+        """
+        self.client_ids = client_ids
+        self.config = config
+        self.track = track
+        self.tasks = tasks
+
+
 class Drive:
     """
     Tells a load generator to drive (either after a join point or initially).
     """
 
-    def __init__(self, client_start_timestamp):
+    def __init__(self, client_start_timestamp, client_id=None):
         self.client_start_timestamp = client_start_timestamp
+        # only needed for load generators that drive multiple clients
+        self.client_id = client_id
 
 
 class CompleteCurrentTask:
@@ -85,7 +114,10 @@ class CompleteCurrentTask:
     specific task that is marked accordingly in the track finishes, it will also signal termination of all other tasks in the same parallel
     element).
     """
-    pass
+
+    def __init__(self, client_id=None):
+        # only needed for load generators that drive multiple clients
+        self.client_id = client_id
 
 
 class UpdateSamples:
@@ -94,6 +126,10 @@ class UpdateSamples:
     """
 
     def __init__(self, client_id, samples):
+        """
+        :param client_id: The id of the client that has gathered these samples.
+        :param samples: Samples encoded with ``encode_samples``.
+        """
         self.client_id = client_id
         self.samples = samples
 
@@ -131,7 +167,7 @@ class DriverActor(actor.RallyActor):
 
     WAKEUP_INTERVAL_SECONDS = 1
 
-    # post-process request metrics every N seconds and send it to the metrics store
+    # flush post-processed request metrics every N seconds to the metrics store
     POST_PROCESS_INTERVAL_SECONDS = 30
 
     """
@@ -197,7 +233,7 @@ class DriverActor(actor.RallyActor):
 
     @actor.no_retry("driver")
     def receiveMsg_UpdateSamples(self, msg, sender):
-        self.coordinator.update_samples(msg.samples)
+        self.coordinator.update_samples(decode_samples(msg.samples))
 
     @actor.no_retry("driver")
     def receiveMsg_WakeupMessage(self, msg, sender):
@@ -207,7 +243,7 @@ class DriverActor(actor.RallyActor):
             self.post_process_timer += DriverActor.WAKEUP_INTERVAL_SECONDS
             if self.post_process_timer >= DriverActor.POST_PROCESS_INTERVAL_SECONDS:
                 self.post_process_timer = 0
-                self.coordinator.post_process_samples()
+                self.coordinator.flush_samples()
             self.coordinator.update_progress_message()
             self.wakeupAfter(datetime.timedelta(seconds=DriverActor.WAKEUP_INTERVAL_SECONDS))
 
@@ -216,14 +252,22 @@ class DriverActor(actor.RallyActor):
                                 #globalName="/rally/driver/worker/%s" % str(client_id),
                                 targetActorRequirements=self._requirements(host))
 
+    def create_async_client(self, host):
+        # imported lazily as the asyncio-based load generator requires at least Python 3.5
+        from esrally.driver import async_driver
+        return self.createActor(async_driver.AsyncLoadGenerator, targetActorRequirements=self._requirements(host))
+
     def start_load_generator(self, driver, client_id, cfg, track, allocations):
         self.send(driver, StartLoadGenerator(client_id, cfg, track, allocations))
 
-    def drive_at(self, driver, client_start_timestamp):
-        self.send(driver, Drive(client_start_timestamp))
+    def start_async_load_generator(self, driver, client_ids, cfg, track, allocations):
+        self.send(driver, StartAsyncLoadGenerator(client_ids, cfg, track, allocations))
+
+    def drive_at(self, driver, client_id, client_start_timestamp):
+        self.send(driver, Drive(client_start_timestamp, client_id))
 
-    def complete_current_task(self, driver):
-        self.send(driver, CompleteCurrentTask())
+    def complete_current_task(self, driver, client_id):
+        self.send(driver, CompleteCurrentTask(client_id))
 
     def on_task_finished(self, metrics, next_task_scheduled_in):
         if next_task_scheduled_in > 0:
@@ -314,8 +358,7 @@ class Driver:
         self.progress_counter = 0
         self.quiet = False
         self.allocations = None
-        self.raw_samples = []
-        self.throughput_calculator = None
+        self.sample_postprocessor = None
         self.most_recent_sample_per_client = {}
 
         self.number_of_steps = 0
@@ -329,13 +372,14 @@ class Driver:
         self.track = t
         self.challenge = select_challenge(self.config, self.track)
         self.quiet = self.config.opts("system", "quiet.mode", mandatory=False, default_value=False)
-        self.throughput_calculator = ThroughputCalculator()
         self.metrics_store = metrics.metrics_store(cfg=self.config,
                                                    track=self.track.name,
                                                    challenge=self.challenge.name,
                                                    meta_info=metrics_meta_info,
                                                    lap=lap,
                                                    read_only=False)
+        self.sample_postprocessor = SamplePostprocessor(self.metrics_store, self.track.meta_data, self.challenge.meta_data)
+        self.sample_postprocessor.start()
         for host in self.config.opts("driver", "load_driver_hosts"):
             if host != "localhost":
                 self.load_driver_hosts.append(net.resolve(host))
@@ -358,7 +402,18 @@ class Driver:
         self.logger.info("Benchmark consists of [%d] steps executed by (at most) [%d] clients as specified by the allocation matrix:\n%s",
                          self.number_of_steps, len(self.allocations), self.allocations)
 
-        for client_id in range(allocator.clients):
+        load_generator_mode = self.config.opts("driver", "load_generator.mode", mandatory=False, default_value="process")
+        if load_generator_mode == "asyncio":
+            self.start_async_load_generators(allocator.clients)
+        elif load_generator_mode == "process":
+            self.start_load_generators(allocator.clients)
+        else:
+            raise exceptions.SystemSetupError("Unknown load generator mode [%s]." % load_generator_mode)
+
+        self.update_progress_message()
+
+    def start_load_generators(self, number_of_clients):
+        for client_id in range(number_of_clients):
             # allocate clients round-robin to all defined hosts
             host = self.load_driver_hosts[client_id % len(self.load_driver_hosts)]
             self.logger.info("Allocating load generator [%d] on [%s]", client_id, host)
@@ -367,7 +422,30 @@ class Driver:
             self.logger.info("Starting load generator [%d].", client_id)
             self.target.start_load_generator(driver, client_id, self.config, self.track, self.allocations[client_id])
 
-        self.update_progress_message()
+    def start_async_load_generators(self, number_of_clients):
+        clients_per_load_generator = self.config.opts("driver", "load_generator.clients", mandatory=False, default_value=100)
+        # allocate clients round-robin to all defined hosts (same as in the process-based mode) ...
+        client_ids_per_host = {}
+        for client_id in range(number_of_clients):
+            host = self.load_driver_hosts[client_id % len(self.load_driver_hosts)]
+            client_ids_per_host.setdefault(host, []).append(client_id)
+        # ... but let one load generator drive multiple clients. We still track one entry per client in ``self.drivers`` so all client
+        # coordination (join points, sampling, completing tasks) works exactly the same way for both modes.
+        self.drivers = [None] * number_of_clients
+        load_generators = []
+        for host in self.load_driver_hosts:
+            client_ids = client_ids_per_host.get(host, [])
+            for start in range(0, len(client_ids), clients_per_load_generator):
+                group = client_ids[start:start + clients_per_load_generator]
+                self.logger.info("Allocating asyncio load generator for clients %s on [%s]", group, host)
+                driver = self.target.create_async_client(host)
+                for client_id in group:
+                    self.drivers[client_id] = driver
+                load_generators.append((driver, group))
+        for driver, group in load_generators:
+            self.logger.info("Starting asyncio load generator for clients %s.", group)
+            self.target.start_async_load_generator(driver, group, self.config, self.track,
+                                                   [self.allocations[client_id] for client_id in group])
 
     def joinpoint_reached(self, client_id, client_local_timestamp, task):
         self.currently_completed += 1
@@ -393,6 +471,7 @@ class Driver:
 
             if self.finished():
                 self.logger.info("All steps completed.")
+                self.sample_postprocessor.stop()
                 self.logger.debug("Closing metrics store...")
                 self.metrics_store.close()
                 # immediately clear as we don't need it anymore and it can consume a significant amount of memory
@@ -418,7 +497,7 @@ class Driver:
                     client_start_timestamp = client_ended_task_at + (start_next_task - master_received_msg_at)
                     self.logger.info("Scheduling next task for client id [%d] at their timestamp [%f] (master timestamp [%f])",
                                      client_id, client_start_timestamp, start_next_task)
-                    self.target.drive_at(driver, client_start_timestamp)
+                    self.target.drive_at(driver, client_id, client_start_timestamp)
         else:
             current_join_point = task
             # we need to actively send CompleteCurrentTask messages to all remaining clients.
@@ -438,25 +517,45 @@ class Driver:
                     self.complete_current_task_sent = True
                     self.logger.info("All affected clients have finished. Notifying all clients to complete their current tasks.")
                     for client_id, driver in enumerate(self.drivers):
-                        self.target.complete_current_task(driver)
+                        self.target.complete_current_task(driver, client_id)
 
     def reset_relative_time(self):
         self.logger.debug("Resetting relative time of request metrics store.")
-        self.metrics_store.reset_relative_time()
+        with self.sample_postprocessor.lock:
+            self.metrics_store.reset_relative_time()
 
     def finished(self):
         return self.current_step == self.number_of_steps
 
     def close(self):
         self.progress_reporter.finish()
+        if self.sample_postprocessor:
+            self.sample_postprocessor.stop()
         if self.metrics_store and self.metrics_store.opened:
             self.metrics_store.close()
 
     def update_samples(self, samples):
-        self.raw_samples += samples
         if len(samples) > 0:
             most_recent = samples[-1]
             self.most_recent_sample_per_client[most_recent.client_id] = most_recent
+            self.sample_postprocessor.add(samples, self.sample_watermarks())
+
+    def sample_watermarks(self):
+        """
+        Clients send their samples independently of each other so samples of other clients for the same point in time may still arrive
+        later. Each client sends its samples in order though, so all samples of a task before the most recent sample of its slowest client
+        have arrived.
+
+        :return: A dict that maps each task to the ``absolute_time`` before which all samples of the task have been received.
+        """
+        watermarks = {}
+        for client_id, sample in self.most_recent_sample_per_client.items():
+            # clients that have reached the join point won't send any further samples
+            if client_id not in self.clients_completed_current_step:
+                watermark = watermarks.get(sample.task)
+                if watermark is None or sample.absolute_time < watermark:
+                    watermarks[sample.task] = sample.absolute_time
+        return watermarks
 
     def update_progress_message(self, task_finished=False):
         if not self.quiet and self.current_step >= 0:
@@ -477,22 +576,145 @@ class Driver:
             if task_finished:
                 self.progress_reporter.finish()
 
+    def flush_samples(self):
+        self.sample_postprocessor.request_flush()
+
     def post_process_samples(self):
-        if len(self.raw_samples) == 0:
+        start = time.perf_counter()
+        # wait until all samples that we have received so far are stored in the metrics store
+        self.sample_postprocessor.drain()
+        self.metrics_store.flush(refresh=False)
+        self.logger.debug("Postprocessing remaining samples took [%f] seconds.", (time.perf_counter() - start))
+
+
+class SamplePostprocessor:
+    """
+    Post-processes samples continuously on a background thread: it stores latency and service time of each sample in the metrics store
+    and calculates throughput. Samples are processed as they arrive, so the amount of pending samples does not depend on the duration of
+    a task.
+    """
+
+    FLUSH = "flush"
+    FINISH = "finish"
+    STOP = "stop"
+
+    def __init__(self, metrics_store, track_meta_data, challenge_meta_data, max_pending_batches=1024):
+        """
+        :param metrics_store: The metrics store to which all metrics are written.
+        :param track_meta_data: Track meta data that are added to all metrics records.
+        :param challenge_meta_data: Challenge meta data that are added to all metrics records.
+        :param max_pending_batches: The number of sample batches that may wait to be processed before ``add`` blocks.
+        """
+        self.metrics_store = metrics_store
+        self.track_meta_data = track_meta_data
+        self.challenge_meta_data = challenge_meta_data
+        self.throughput_calculator = ThroughputCalculator()
+        # merged meta data of track, challenge, operation and task
+        self.meta_data_per_task = {}
+        self.q = queue.Queue(maxsize=max_pending_batches)
+        # guards all accesses to the metrics store while the background thread is running
+        self.lock = threading.Lock()
+        self.failure = None
+        self.thread = threading.Thread(target=self.run, name="rally-sample-postprocessor", daemon=True)
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        self.thread.start()
+
+    def add(self, samples, watermarks=None):
+        """
+        Enqueues a batch of samples for post-processing. Blocks if too many batches are pending.
+
+        :param samples: A list of samples.
+        :param watermarks: A dict that maps tasks to the point in time before which all of their samples have been received (see
+                           ``ThroughputCalculator.calculate``). If ``None``, no samples are expected to arrive later.
+        """
+        if len(samples) > 0:
+            self.q.put((samples, watermarks))
+
+    def request_flush(self):
+        """
+        Asks the background thread to flush the metrics store after it has processed all samples received so far. Does not block.
+        """
+        self.q.put(SamplePostprocessor.FLUSH)
+
+    def drain(self):
+        """
+        Blocks until all samples that have been added so far are processed. No further samples are expected for the current tasks, so
+        samples that have been held back from throughput calculation due to watermarks are processed as well.
+        """
+        self.q.put(SamplePostprocessor.FINISH)
+        self.q.join()
+        if self.failure:
+            failure = self.failure
+            self.failure = None
+            raise exceptions.RallyError("Could not post-process samples") from failure
+
+    def stop(self):
+        if self.thread.is_alive():
+            self.q.put(SamplePostprocessor.STOP)
+            self.thread.join()
+
+    def run(self):
+        while True:
+            items = [self.q.get()]
+            # process everything that has arrived in the meantime in one go
+            try:
+                while True:
+                    items.append(self.q.get_nowait())
+            except queue.Empty:
+                pass
+            samples = []
+            watermarks = None
+            flush = False
+            finish = False
+            stop = False
+            for item in items:
+                if item is SamplePostprocessor.FLUSH:
+                    flush = True
+                elif item is SamplePostprocessor.FINISH:
+                    finish = True
+                elif item is SamplePostprocessor.STOP:
+                    stop = True
+                else:
+                    batch, watermarks = item
+                    samples.extend(batch)
+            if finish:
+                watermarks = None
+            # noinspection PyBroadException
+            try:
+                with self.lock:
+                    self.process(samples, watermarks)
+                    if flush:
+                        # Don't force refresh here in the interest of short processing times. We don't need to query immediately
+                        # afterwards so there is no need for frequent refreshes.
+                        self.metrics_store.flush(refresh=False)
+            except BaseException as e:
+                self.logger.exception("Could not post-process [%d] samples.", len(samples))
+                self.failure = e
+            finally:
+                for _ in items:
+                    self.q.task_done()
+            if stop:
+                break
+
+    def meta_data(self, task):
+        meta_data = self.meta_data_per_task.get(task)
+        if meta_data is None:
+            meta_data = merge(self.track_meta_data, self.challenge_meta_data, task.operation.meta_data, task.meta_data)
+            self.meta_data_per_task[task] = meta_data
+        return meta_data
+
+    def process(self, samples, watermarks=None):
+        # without watermarks we may need to calculate throughput based on samples that have been held back
+        if len(samples) == 0 and watermarks is not None:
             return
-        total_start = time.perf_counter()
-        start = total_start
-        # we do *not* do this here to avoid concurrent updates (actors are single-threaded) but rather to make it clear that we use
-        # only a snapshot and that new data will go to a new sample set.
-        raw_samples = self.raw_samples
-        self.raw_samples = []
-        for sample in raw_samples:
-            meta_data = self.merge(
-                self.track.meta_data,
-                self.challenge.meta_data,
-                sample.operation.meta_data,
-                sample.task.meta_data,
-                sample.request_meta_data)
+        start = time.perf_counter()
+        for sample in samples:
+            # The metrics store copies meta data for each record so we can safely reuse the merged meta data per task.
+            meta_data = self.meta_data(sample.task)
+            if sample.request_meta_data:
+                meta_data = merge(meta_data, sample.request_meta_data)
 
             self.metrics_store.put_value_cluster_level(name="latency", value=sample.latency_ms, unit="ms", task=sample.task.name,
                                                        operation=sample.operation.name, operation_type=sample.operation.type,
@@ -504,45 +726,37 @@ class Driver:
                                                        sample_type=sample.sample_type, absolute_time=sample.absolute_time,
                                                        relative_time=sample.relative_time, meta_data=meta_data)
 
+            if sample.schedule_lag_ms is not None:
+                self.metrics_store.put_value_cluster_level(name="schedule_lag", value=sample.schedule_lag_ms, unit="ms",
+                                                           task=sample.task.name, operation=sample.operation.name,
+                                                           operation_type=sample.operation.type, sample_type=sample.sample_type,
+                                                           absolute_time=sample.absolute_time, relative_time=sample.relative_time,
+                                                           meta_data=meta_data)
+
         end = time.perf_counter()
-        self.logger.debug("Storing latency and service time took [%f] seconds.", (end - start))
+        self.logger.debug("Storing latency, service time and schedule lag took [%f] seconds.", (end - start))
         start = end
-        aggregates = self.throughput_calculator.calculate(raw_samples)
+        aggregates = self.throughput_calculator.calculate(samples, watermarks=watermarks)
         end = time.perf_counter()
         self.logger.debug("Calculating throughput took [%f] seconds.", (end - start))
         start = end
-        for task, samples in aggregates.items():
-            meta_data = self.merge(
-                self.track.meta_data,
-                self.challenge.meta_data,
-                task.operation.meta_data,
-                task.meta_data
-            )
-            for absolute_time, relative_time, sample_type, throughput, throughput_unit in samples:
+        for task, throughput_samples in aggregates.items():
+            meta_data = self.meta_data(task)
+            for absolute_time, relative_time, sample_type, throughput, throughput_unit in throughput_samples:
                 self.metrics_store.put_value_cluster_level(name="throughput", value=throughput, unit=throughput_unit, task=task.name,
                                                            operation=task.operation.name, operation_type=task.operation.type,
                                                            sample_type=sample_type, absolute_time=absolute_time,
                                                            relative_time=relative_time, meta_data=meta_data)
         end = time.perf_counter()
         self.logger.debug("Storing throughput took [%f] seconds.", (end - start))
-        start = end
-        # this will be a noop for the in-memory metrics store. If we use an ES metrics store however, this will ensure that we already send
-        # the data and also clear the in-memory buffer. This allows users to see data already while running the benchmark. In cases where
-        # it does not matter (i.e. in-memory) we will still defer this step until the end.
-        #
-        # Don't force refresh here in the interest of short processing times. We don't need to query immediately afterwards so there is
-        # no need for frequent refreshes.
-        self.metrics_store.flush(refresh=False)
-        end = time.perf_counter()
-        self.logger.debug("Flushing the metrics store took [%f] seconds.", (end - start))
-        self.logger.debug("Postprocessing [%d] raw samples took [%f] seconds in total.", len(raw_samples), (end - total_start))
 
-    def merge(self, *args):
-        result = {}
-        for arg in args:
-            if arg is not None:
-                result.update(arg)
-        return result
+
+def merge(*args):
+    result = {}
+    for arg in args:
+        if arg is not None:
+            result.update(arg)
+    return result
 
 
 class LoadGenerator(actor.RallyActor):
@@ -578,18 +792,12 @@ class LoadGenerator(actor.RallyActor):
 
     @actor.no_retry("load generator")
     def receiveMsg_StartLoadGenerator(self, msg, sender):
-        def es_clients(all_hosts, all_client_options):
-            es = {}
-            for cluster_name, cluster_hosts in all_hosts.items():
-                es[cluster_name] = client.EsClientFactory(cluster_hosts, all_client_options[cluster_name]).create()
-            return es
-
         self.logger.info("LoadGenerator[%d] is about to start.", msg.client_id)
         self.master = sender
         self.client_id = msg.client_id
         self.config = load_local_config(msg.config)
         self.abort_on_error = self.config.opts("driver", "on.error") == "abort"
-        self.es = es_clients(self.config.opts("client", "hosts").all_hosts, self.config.opts("client", "options").all_client_options)
+        self.es = es_clients(self.config)
         self.track = msg.track
         track.set_absolute_data_path(self.config, self.track)
         self.tasks = msg.tasks
@@ -714,7 +922,8 @@ class LoadGenerator(actor.RallyActor):
                 # from (client) index 0 in both cases instead of 0 for indexA and 4 for indexB.
                 schedule = schedule_for(self.track, task_allocation.task, task_allocation.client_index_in_task)
 
-                executor = Executor(task, schedule, self.es, self.sampler, self.cancel, self.complete, self.abort_on_error)
+                executor = Executor(task, schedule, self.es, self.sampler, self.cancel, self.complete, self.abort_on_error,
+                                    precise_timing(self.config))
                 final_executor = Profiler(executor, self.client_id, task) if profiling_enabled else executor
 
                 self.executor_future = self.pool.submit(final_executor)
@@ -732,47 +941,266 @@ class LoadGenerator(actor.RallyActor):
 
     def send_samples(self):
         if self.sampler:
-            samples = self.sampler.samples
+            samples = self.sampler.drain()
             if len(samples) > 0:
-                self.send(self.master, UpdateSamples(self.client_id, samples))
+                self.send(self.master, UpdateSamples(self.client_id, encode_samples(samples)))
             return samples
         return None
 
 
+def es_clients(cfg):
+    """
+    Creates one Elasticsearch client per configured cluster.
+
+    :param cfg: Rally internal configuration object.
+    :return: A dict with the cluster name as key and the corresponding client as value.
+    """
+    all_hosts = cfg.opts("client", "hosts").all_hosts
+    all_client_options = cfg.opts("client", "options").all_client_options
+    es = {}
+    for cluster_name, cluster_hosts in all_hosts.items():
+        es[cluster_name] = client.EsClientFactory(cluster_hosts, all_client_options[cluster_name]).create()
+    return es
+
+
 class Sampler:
     """
     Encapsulates management of gathered samples.
+
+    Samples are recorded column-wise into one of two ``SampleBuffer`` instances. The executor thread adds samples to the active buffer
+    while the actor drains the buffer that has been filled most recently. Buffers grow as needed so no sample is ever dropped.
     """
 
     def __init__(self, client_id, task, start_timestamp):
         self.client_id = client_id
         self.task = task
         self.start_timestamp = start_timestamp
-        self.q = queue.Queue(maxsize=16384)
+        self.lock = threading.Lock()
+        self.active = SampleBuffer(client_id)
+        self.standby = SampleBuffer(client_id)
         self.logger = logging.getLogger(__name__)
 
-    def add(self, sample_type, request_meta_data, latency_ms, service_time_ms, total_ops, total_ops_unit, time_period, percent_completed):
-        try:
-            self.q.put_nowait(Sample(self.client_id, time.time(), time.perf_counter() - self.start_timestamp, self.task,
-                                     sample_type, request_meta_data, latency_ms, service_time_ms, total_ops, total_ops_unit, time_period,
-                                     percent_completed))
-        except queue.Full:
-            self.logger.warning("Dropping sample for [%s] due to a full sampling queue.", self.task.operation.name)
+    def add(self, sample_type, request_meta_data, latency_ms, service_time_ms, total_ops, total_ops_unit, time_period, percent_completed,
+            schedule_lag_ms=None):
+        absolute_time = time.time()
+        relative_time = time.perf_counter() - self.start_timestamp
+        with self.lock:
+            self.active.add(self.task, absolute_time, relative_time, sample_type, request_meta_data, latency_ms, service_time_ms,
+                            total_ops, total_ops_unit, time_period, percent_completed, schedule_lag_ms)
+
+    def drain(self):
+        """
+        Swaps buffers and provides all samples that have been added since the last call.
+
+        :return: A ``SampleBuffer``. It is only valid until the next call to this method.
+        """
+        self.standby.clear()
+        with self.lock:
+            self.active, self.standby = self.standby, self.active
+        return self.standby
 
     @property
     def samples(self):
-        samples = []
-        try:
-            while True:
-                samples.append(self.q.get_nowait())
-        except queue.Empty:
-            pass
-        return samples
+        return self.drain().to_samples()
+
+
+class SampleBuffer:
+    """
+    Stores samples of one client column-wise in compact arrays instead of one object per sample. Tasks and units are interned.
+    """
+
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.tasks = []
+        self.task_ids = {}
+        self.units = []
+        self.unit_ids = {}
+        self.task_id = array.array("H")
+        self.absolute_time = array.array("d")
+        self.relative_time = array.array("d")
+        self.sample_type = array.array("B")
+        self.latency_ms = array.array("d")
+        self.service_time_ms = array.array("d")
+        self.total_ops = array.array("d")
+        self.unit_id = array.array("H")
+        self.time_period = array.array("d")
+        # NaN represents "unknown" (i.e. ``None``)
+        self.percent_completed = array.array("d")
+        # NaN represents "not throttled" (i.e. ``None``)
+        self.schedule_lag_ms = array.array("d")
+        self.request_meta_data = []
+
+    @staticmethod
+    def intern(value, values, ids):
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = len(values)
+            values.append(value)
+            ids[value] = value_id
+        return value_id
+
+    def add(self, task, absolute_time, relative_time, sample_type, request_meta_data, latency_ms, service_time_ms, total_ops,
+            total_ops_unit, time_period, percent_completed, schedule_lag_ms=None):
+        self.task_id.append(SampleBuffer.intern(task, self.tasks, self.task_ids))
+        self.absolute_time.append(absolute_time)
+        self.relative_time.append(relative_time)
+        self.sample_type.append(sample_type)
+        self.latency_ms.append(latency_ms)
+        self.service_time_ms.append(service_time_ms)
+        self.total_ops.append(total_ops)
+        self.unit_id.append(SampleBuffer.intern(total_ops_unit, self.units, self.unit_ids))
+        self.time_period.append(time_period)
+        self.percent_completed.append(float("nan") if percent_completed is None else percent_completed)
+        self.schedule_lag_ms.append(float("nan") if schedule_lag_ms is None else schedule_lag_ms)
+        self.request_meta_data.append(request_meta_data)
+
+    def clear(self):
+        for column in [self.task_id, self.absolute_time, self.relative_time, self.sample_type, self.latency_ms, self.service_time_ms,
+                       self.total_ops, self.unit_id, self.time_period, self.percent_completed, self.schedule_lag_ms]:
+            del column[:]
+        self.request_meta_data = []
+
+    def __len__(self):
+        return len(self.absolute_time)
+
+    def __getitem__(self, i):
+        total_ops = self.total_ops[i]
+        percent_completed = self.percent_completed[i]
+        schedule_lag_ms = self.schedule_lag_ms[i]
+        return Sample(self.client_id, self.absolute_time[i], self.relative_time[i], self.tasks[self.task_id[i]],
+                      metrics.SampleType(self.sample_type[i]), self.request_meta_data[i], self.latency_ms[i], self.service_time_ms[i],
+                      int(total_ops) if total_ops.is_integer() else total_ops, self.units[self.unit_id[i]], self.time_period[i],
+                      None if math.isnan(percent_completed) else percent_completed,
+                      None if math.isnan(schedule_lag_ms) else schedule_lag_ms)
+
+    def to_samples(self):
+        return [self[i] for i in range(len(self))]
+
+
+# Version of the wire format of ``encode_samples``
+SAMPLE_ENCODING_VERSION = 2
+# Marks samples without request meta data
+NO_META_DATA = 0xFFFF
+
+
+def _to_little_endian(column):
+    if sys.byteorder == "big":
+        column = array.array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _from_little_endian(typecode, data):
+    column = array.array(typecode)
+    column.frombytes(data)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def _delta_encode(column):
+    # timestamps are stored as differences in nanoseconds. These are small numbers for consecutive samples and compress very well.
+    nanos = [round(value * 1000000000) for value in column]
+    return array.array("q", map(operator.sub, nanos, itertools.chain((0,), nanos)))
+
+
+def _delta_decode(deltas):
+    return array.array("d", (value / 1000000000 for value in itertools.accumulate(deltas)))
+
+
+def encode_samples(buffer, compression_level=1):
+    """
+    Encodes all samples in a ``SampleBuffer`` into a compact binary representation that is suitable to be sent to the master. Numeric
+    columns are packed as little endian arrays and timestamps are delta-encoded. Tasks, units and the keys of request meta data are sent
+    only once per batch. The whole batch is compressed.
+
+    :param buffer: A ``SampleBuffer``.
+    :param compression_level: The zlib compression level (default: 1).
+    :return: The encoded samples as ``bytes``. Use ``decode_samples`` to restore them.
+    """
+    # request meta data dicts usually share only a handful of distinct sets of keys. We send each set of keys only once.
+    shapes = []
+    shape_ids = {}
+    shape_column = array.array("H")
+    meta_data_values = []
+    for meta_data in buffer.request_meta_data:
+        if meta_data is None:
+            shape_column.append(NO_META_DATA)
+        else:
+            shape = tuple(meta_data)
+            shape_id = shape_ids.get(shape)
+            if shape_id is None:
+                shape_id = SampleBuffer.intern(shape, shapes, shape_ids)
+            shape_column.append(shape_id)
+            meta_data_values.extend(meta_data.values())
+
+    payload = pickle.dumps((
+        SAMPLE_ENCODING_VERSION,
+        buffer.client_id,
+        buffer.tasks,
+        buffer.units,
+        shapes,
+        meta_data_values,
+        _to_little_endian(buffer.task_id),
+        _to_little_endian(_delta_encode(buffer.absolute_time)),
+        _to_little_endian(_delta_encode(buffer.relative_time)),
+        buffer.sample_type.tobytes(),
+        _to_little_endian(buffer.latency_ms),
+        _to_little_endian(buffer.service_time_ms),
+        _to_little_endian(buffer.total_ops),
+        _to_little_endian(buffer.unit_id),
+        _to_little_endian(_delta_encode(buffer.time_period)),
+        _to_little_endian(buffer.percent_completed),
+        _to_little_endian(buffer.schedule_lag_ms),
+        _to_little_endian(shape_column)
+    ), protocol=pickle.HIGHEST_PROTOCOL)
+    return zlib.compress(payload, compression_level)
+
+
+def decode_samples(data):
+    """
+    Decodes samples that have been encoded with ``encode_samples``.
+
+    :param data: The encoded samples.
+    :return: A list of ``Sample`` instances.
+    """
+    payload = pickle.loads(zlib.decompress(data))
+    # check the version first as the number of columns may differ between versions
+    version = payload[0]
+    if version != SAMPLE_ENCODING_VERSION:
+        raise exceptions.RallyAssertionError("Cannot decode samples with encoding version [%s] (expected [%s])." %
+                                             (version, SAMPLE_ENCODING_VERSION))
+    client_id, tasks, units, shapes, meta_data_values, task_id, absolute_time, relative_time, sample_type, latency_ms, service_time_ms, \
+        total_ops, unit_id, time_period, percent_completed, schedule_lag_ms, shape_column = payload[1:]
+    buffer = SampleBuffer(client_id)
+    buffer.tasks = tasks
+    buffer.units = units
+    buffer.task_id = _from_little_endian("H", task_id)
+    buffer.absolute_time = _delta_decode(_from_little_endian("q", absolute_time))
+    buffer.relative_time = _delta_decode(_from_little_endian("q", relative_time))
+    buffer.sample_type = array.array("B", sample_type)
+    buffer.latency_ms = _from_little_endian("d", latency_ms)
+    buffer.service_time_ms = _from_little_endian("d", service_time_ms)
+    buffer.total_ops = _from_little_endian("d", total_ops)
+    buffer.unit_id = _from_little_endian("H", unit_id)
+    buffer.time_period = _delta_decode(_from_little_endian("q", time_period))
+    buffer.percent_completed = _from_little_endian("d", percent_completed)
+    buffer.schedule_lag_ms = _from_little_endian("d", schedule_lag_ms)
+
+    values = iter(meta_data_values)
+    request_meta_data = []
+    for shape_id in _from_little_endian("H", shape_column):
+        if shape_id == NO_META_DATA:
+            request_meta_data.append(None)
+        else:
+            request_meta_data.append({k: next(values) for k in shapes[shape_id]})
+    buffer.request_meta_data = request_meta_data
+    return buffer.to_samples()
 
 
 class Sample:
     def __init__(self, client_id, absolute_time, relative_time, task, sample_type, request_meta_data, latency_ms, service_time_ms,
-                 total_ops, total_ops_unit, time_period, percent_completed):
+                 total_ops, total_ops_unit, time_period, percent_completed, schedule_lag_ms=None):
         self.client_id = client_id
         self.absolute_time = absolute_time
         self.relative_time = relative_time
@@ -786,6 +1214,8 @@ class Sample:
         self.time_period = time_period
         # may be None for eternal tasks!
         self.percent_completed = percent_completed
+        # None if the task is not throttled
+        self.schedule_lag_ms = schedule_lag_ms
 
     @property
     def operation(self):
@@ -813,6 +1243,7 @@ class ThroughputCalculator:
         Stores per task numbers needed for throughput calculation in between multiple calculations.
         """
         def __init__(self, bucket_interval, sample_type, start_time):
+            # samples after the most recently completed bucket (sorted by time)
             self.unprocessed = []
             self.total_count = 0
             self.interval = 0
@@ -821,6 +1252,8 @@ class ThroughputCalculator:
             self.bucket = bucket_interval
             self.sample_type = sample_type
             self.has_samples_in_sample_type = False
+            # whether samples in ``unprocessed`` could not finish a bucket because they are not before the watermark
+            self.held_back = False
             # start relative to the beginning of our (calculation) time slice.
             self.start_time = start_time
 
@@ -828,22 +1261,10 @@ class ThroughputCalculator:
         def throughput(self):
             return self.total_count / self.interval
 
-        def maybe_update_sample_type(self, current_sample_type):
-            if self.sample_type < current_sample_type:
-                self.sample_type = current_sample_type
-                self.has_samples_in_sample_type = False
-
-        def update_interval(self, absolute_sample_time):
-            self.interval = max(absolute_sample_time - self.start_time, self.interval)
-
-        def can_calculate_throughput(self):
-            return self.interval > 0 and self.interval >= self.bucket
-
         def can_add_final_throughput_sample(self):
             return self.interval > 0 and not self.has_samples_in_sample_type
 
         def finish_bucket(self, new_total):
-            self.unprocessed = []
             self.total_count = new_total
             self.has_samples_in_sample_type = True
             self.bucket = int(self.interval) + self.bucket_interval
@@ -851,76 +1272,134 @@ class ThroughputCalculator:
     def __init__(self):
         self.task_stats = {}
 
-    def calculate(self, samples, bucket_interval_secs=1):
+    def calculate(self, samples, bucket_interval_secs=1, watermarks=None):
         """
         Calculates global throughput based on samples gathered from multiple load generators.
 
         :param samples: A list containing all samples from all load generators.
         :param bucket_interval_secs: The bucket interval for aggregations.
+        :param watermarks: An optional dict that maps tasks to the point in time (``absolute_time``) before which all samples of that task
+                           have been received. Only samples before the watermark of their task can finish a bucket. Later samples are held
+                           back until a subsequent calculation as samples of other load generators for the same time may still arrive.
+                           Tasks without a watermark are calculated completely. If ``None``, all samples are considered, including those
+                           that have been held back previously.
         :return: A global view of throughput samples.
         """
 
-        import itertools
         samples_per_task = {}
+        # Hashing tasks is expensive, so we look up samples per task object identity and hash each task object only once.
+        samples_per_task_object = {}
         # first we group all samples by task (operation).
         for sample in samples:
-            k = sample.task
-            if k not in samples_per_task:
-                samples_per_task[k] = []
-            samples_per_task[k].append(sample)
+            task_samples = samples_per_task_object.get(id(sample.task))
+            if task_samples is None:
+                k = sample.task
+                if k not in samples_per_task:
+                    samples_per_task[k] = []
+                task_samples = samples_per_task[k]
+                samples_per_task_object[id(k)] = task_samples
+            task_samples.append(sample)
+
+        if watermarks is None:
+            for task, stats in self.task_stats.items():
+                if stats.held_back and task not in samples_per_task:
+                    samples_per_task[task] = []
 
         global_throughput = {}
-        # with open("raw_samples_new.csv", "a") as sample_log:
-        # print("client_id,absolute_time,relative_time,operation,sample_type,total_ops,time_period", file=sample_log)
-        for k, v in samples_per_task.items():
-            task = k
+        for task, v in samples_per_task.items():
             if task not in global_throughput:
                 global_throughput[task] = []
-            # sort all samples by time
-            if task in self.task_stats:
-                samples = itertools.chain(v, self.task_stats[task].unprocessed)
-            else:
-                samples = v
-            current_samples = sorted(samples, key=lambda s: s.absolute_time)
+            current_samples = ThroughputCalculator._sorted_samples(v, self.task_stats[task].unprocessed if task in self.task_stats else [])
 
             if task not in self.task_stats:
                 first_sample = current_samples[0]
                 self.task_stats[task] = ThroughputCalculator.TaskStats(bucket_interval=bucket_interval_secs,
                                                                        sample_type=first_sample.sample_type,
                                                                        start_time=first_sample.absolute_time - first_sample.time_period)
-            current = self.task_stats[task]
-            count = current.total_count
-            for sample in current_samples:
-                # print("%d,%f,%f,%s,%s,%d,%f" %
-                #       (sample.client_id, sample.absolute_time, sample.relative_time, sample.operation, sample.sample_type,
-                #        sample.total_ops, sample.time_period), file=sample_log)
-
-                # once we have seen a new sample type, we stick to it.
-                current.maybe_update_sample_type(sample.sample_type)
-
-                # we need to store the total count separately and cannot update `current.total_count` immediately here because we would
-                # count all raw samples in `unprocessed` twice. Hence, we'll only update `current.total_count` when we have calculated a new
-                # throughput sample.
-                count += sample.total_ops
-                current.update_interval(sample.absolute_time)
-
-                if current.can_calculate_throughput():
-                    current.finish_bucket(count)
-                    global_throughput[task].append(
-                        (sample.absolute_time, sample.relative_time, current.sample_type, current.throughput,
-                         # we calculate throughput per second
-                         "%s/s" % sample.total_ops_unit))
-                else:
-                    current.unprocessed.append(sample)
+            watermark = watermarks.get(task) if watermarks is not None else None
+            self._calculate_task(self.task_stats[task], current_samples, global_throughput[task], watermark)
+        return global_throughput
 
-            # also include the last sample if we don't have one for the current sample type, even if it is below the bucket interval
-            # (mainly needed to ensure we show throughput data in test mode)
-            if current.can_add_final_throughput_sample():
-                current.finish_bucket(count)
-                global_throughput[task].append(
-                    (sample.absolute_time, sample.relative_time, current.sample_type, current.throughput, "%s/s" % sample.total_ops_unit))
+    @staticmethod
+    def _sorted_samples(new_samples, unprocessed):
+        # only the new samples need to be sorted, the unprocessed ones are still sorted from the previous calculation
+        new_samples = sorted(new_samples, key=operator.attrgetter("absolute_time"))
+        if not unprocessed:
+            return new_samples
+        # on ties, new samples come first (and each sequence retains its order)
+        return [s for _, _, _, s in heapq.merge(((s.absolute_time, 0, i, s) for i, s in enumerate(new_samples)),
+                                                ((s.absolute_time, 1, i, s) for i, s in enumerate(unprocessed)))]
+
+    @staticmethod
+    def _first_bucket_end(times, lo, hi, start_time, bucket):
+        # binary search for the first sample in [lo, hi) whose interval (relative to start_time) completes the current bucket
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if times[mid] - start_time >= bucket:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    @staticmethod
+    def _next_sample_type_change(sample_types, lo, current_sample_type, max_sample_type):
+        change = len(sample_types)
+        for sample_type in range(current_sample_type + 1, max_sample_type + 1):
+            pos = sample_types.find(sample_type, lo, change)
+            if pos != -1:
+                change = pos
+        return change
+
+    def _calculate_task(self, current, samples, throughput_samples, watermark=None):
+        n = len(samples)
+        times = array.array("d", [s.absolute_time for s in samples])
+        # only samples before the watermark can finish a bucket; for later ones we may not have received all preceding samples yet
+        limit = n if watermark is None else bisect.bisect_left(times, watermark)
+        current.held_back = limit < n
+        sample_types = bytes([s.sample_type for s in samples])
+        max_sample_type = max(sample_types)
+        # counts[i + 1] is the total count including sample i. We need to store the total count separately and cannot update
+        # `current.total_count` immediately because we would count all raw samples in `unprocessed` twice. Hence, we'll only update
+        # `current.total_count` when we have calculated a new throughput sample.
+        counts = list(itertools.accumulate(itertools.chain((current.total_count,), (s.total_ops for s in samples))))
+        # Invariant: at this point the interval is always smaller than the current bucket (otherwise we'd have finished the bucket
+        # already) so only new samples can complete a bucket.
+        last_processed = -1
+        pos = 0
+        while pos < limit:
+            # once we have seen a new sample type, we stick to it.
+            if sample_types[pos] > current.sample_type:
+                current.sample_type = metrics.SampleType(sample_types[pos])
+                current.has_samples_in_sample_type = False
+            # all samples in [pos, end) have the current sample type
+            end = min(ThroughputCalculator._next_sample_type_change(sample_types, pos, current.sample_type, max_sample_type), limit)
+            while pos < end:
+                i = ThroughputCalculator._first_bucket_end(times, pos, end, current.start_time, current.bucket)
+                if i == end:
+                    break
+                sample = samples[i]
+                current.interval = max(times[i] - current.start_time, current.interval)
+                current.finish_bucket(counts[i + 1])
+                throughput_samples.append(
+                    (sample.absolute_time, sample.relative_time, current.sample_type, current.throughput,
+                     # we calculate throughput per second
+                     "%s/s" % sample.total_ops_unit))
+                last_processed = i
+                pos = i + 1
+            pos = end
+        current.unprocessed = samples[last_processed + 1:]
+        if limit == 0:
+            return
+        current.interval = max(times[limit - 1] - current.start_time, current.interval)
 
-        return global_throughput
+        # also include the last sample if we don't have one for the current sample type, even if it is below the bucket interval
+        # (mainly needed to ensure we show throughput data in test mode)
+        if current.can_add_final_throughput_sample():
+            sample = samples[limit - 1]
+            current.unprocessed = samples[limit:]
+            current.finish_bucket(counts[limit])
+            throughput_samples.append(
+                (sample.absolute_time, sample.relative_time, current.sample_type, current.throughput, "%s/s" % sample.total_ops_unit))
 
 
 class Profiler:
@@ -957,7 +1436,7 @@ class Profiler:
 
 
 class Executor:
-    def __init__(self, task, schedule, es, sampler, cancel, complete, abort_on_error=False):
+    def __init__(self, task, schedule, es, sampler, cancel, complete, abort_on_error=False, precise=False):
         """
         Executes tasks according to the schedule for a given operation.
 
@@ -967,6 +1446,7 @@ class Executor:
         :param sampler: A container to store raw samples.
         :param cancel: A shared boolean that indicates we need to cancel execution.
         :param complete: A shared boolean that indicates we need to prematurely complete execution.
+        :param precise: If ``True``, wait for the scheduled time of the next request with ``wait_until_precisely``.
         """
         self.task = task
         self.op = task.operation
@@ -976,6 +1456,7 @@ class Executor:
         self.cancel = cancel
         self.complete = complete
         self.abort_on_error = abort_on_error
+        self.precise = precise
         self.logger = logging.getLogger(__name__)
 
     def __call__(self, *args, **kwargs):
@@ -989,9 +1470,12 @@ class Executor:
                 absolute_expected_schedule_time = total_start + expected_scheduled_time
                 throughput_throttled = expected_scheduled_time > 0
                 if throughput_throttled:
-                    rest = absolute_expected_schedule_time - time.perf_counter()
-                    if rest > 0:
-                        time.sleep(rest)
+                    if self.precise:
+                        wait_until_precisely(absolute_expected_schedule_time)
+                    else:
+                        rest = absolute_expected_schedule_time - time.perf_counter()
+                        if rest > 0:
+                            time.sleep(rest)
                 start = time.perf_counter()
                 total_ops, total_ops_unit, request_meta_data = execute_single(runner, self.es, params, self.abort_on_error)
                 stop = time.perf_counter()
@@ -999,10 +1483,12 @@ class Executor:
                 service_time = stop - start
                 # Do not calculate latency separately when we don't throttle throughput. This metric is just confusing then.
                 latency = stop - absolute_expected_schedule_time if throughput_throttled else service_time
+                # how much later than scheduled the request has been issued; meaningless if we don't throttle
+                schedule_lag = convert.seconds_to_ms(start - absolute_expected_schedule_time) if throughput_throttled else None
                 # last sample should bump progress to 100% if externally completed.
                 completed = percent_completed if not self.complete.is_set() else 1.0
                 self.sampler.add(sample_type, request_meta_data, convert.seconds_to_ms(latency), convert.seconds_to_ms(service_time),
-                                 total_ops, total_ops_unit, (stop - total_start), completed)
+                                 total_ops, total_ops_unit, (stop - total_start), completed, schedule_lag)
 
                 if self.complete.is_set():
                     self.logger.info("Task is considered completed due to external event.")
@@ -1011,11 +1497,63 @@ class Executor:
             self.logger.exception("Could not execute schedule")
             raise
         finally:
+            # the task may end before the schedule is exhausted; release its resources immediately
+            if hasattr(self.schedule, "close"):
+                self.schedule.close()
             # Actively set it if this task completes its parent
             if self.task.completes_parent:
                 self.complete.set()
 
 
+# With precise timing we sleep until this many seconds before the scheduled time of a request and busy-wait for the rest.
+PRECISE_TIMING_SPIN_PERIOD = 0.001
+
+
+def precise_timing(cfg):
+    """
+    :param cfg: The config object.
+    :return: ``True`` iff the user has chosen the timing mode "precise".
+    """
+    timing_mode = cfg.opts("driver", "timing.mode", mandatory=False, default_value="sleep")
+    if timing_mode not in ["sleep", "precise"]:
+        raise exceptions.SystemSetupError("Unknown timing mode [%s]." % timing_mode)
+    return timing_mode == "precise"
+
+
+def spin_until(deadline):
+    """
+    Busy-waits until ``time.perf_counter()`` has reached ``deadline``. The GIL is released in between so other threads can proceed.
+    """
+    while time.perf_counter() < deadline:
+        time.sleep(0)
+
+
+def wait_until_precisely(deadline):
+    """
+    Waits until ``time.perf_counter()`` has reached ``deadline``. In contrast to ``time.sleep`` this is accurate to a few microseconds
+    because it only sleeps until ``PRECISE_TIMING_SPIN_PERIOD`` seconds before ``deadline`` and busy-waits for the rest of the time.
+
+    :param deadline: The point in time as determined by ``time.perf_counter()`` until which to wait.
+    """
+    rest = deadline - time.perf_counter() - PRECISE_TIMING_SPIN_PERIOD
+    if rest > 0:
+        time.sleep(rest)
+    spin_until(deadline)
+
+
+def execute_single_at(deadline, runner, es, params, abort_on_error=False):
+    """
+    Busy-waits until ``deadline`` and then invokes the given runner once. This is intended for callers that must not busy-wait on their
+    own thread (e.g. an event loop) so both happen on the thread that issues the request.
+
+    :param deadline: The point in time as determined by ``time.perf_counter()`` until which to busy-wait.
+    :return: a tuple of: the point in time when the request has been issued followed by the return value of ``execute_single``.
+    """
+    spin_until(deadline)
+    start = time.perf_counter()
+    return (start,) + execute_single(runner, es, params, abort_on_error)
+
+
 def execute_single(runner, es, params, abort_on_error=False):
     """
     Invokes the given runner once and provides the runner's return value in a uniform structure.
@@ -1250,7 +1788,8 @@ def schedule_for(current_track, task, client_index):
         warmup_time_period = task.warmup_time_period if task.warmup_time_period else 0
         logger.info("Creating time-period based schedule with [%s] distribution for [%s] with a warmup period of [%s] seconds and a "
                     "time period of [%s] seconds.", task.schedule, task, str(warmup_time_period), str(task.time_period))
-        return time_period_based(sched, warmup_time_period, task.time_period, runner_for_op, params_for_op)
+        return close_params_when_done(time_period_based(sched, warmup_time_period, task.time_period, runner_for_op, params_for_op),
+                                      params_for_op)
     else:
         warmup_iterations = task.warmup_iterations if task.warmup_iterations else 0
         if task.iterations:
@@ -1261,7 +1800,24 @@ def schedule_for(current_track, task, client_index):
             iterations = 1
         logger.info("Creating iteration-count based schedule with [%s] distribution for [%s] with [%d] warmup iterations and "
                     "[%d] iterations." % (task.schedule, op, warmup_iterations, iterations))
-        return iteration_count_based(sched, warmup_iterations, iterations, runner_for_op, params_for_op)
+        return close_params_when_done(iteration_count_based(sched, warmup_iterations, iterations, runner_for_op, params_for_op),
+                                      params_for_op)
+
+
+def close_params_when_done(schedule, params):
+    """
+    Closes the parameter source (if it supports that) as soon as the schedule is exhausted or closed. This releases resources of the
+    parameter source (e.g. open files or background threads) also if a task ends before the parameter source is exhausted.
+
+    :param schedule: A schedule generator.
+    :param params: The parameter source for a given operation.
+    :return: A generator for the same elements as ``schedule``.
+    """
+    try:
+        yield from schedule
+    finally:
+        if hasattr(params, "close"):
+            params.close()
 
 
 def time_period_based(sched, warmup_time_period, time_period, runner, params):
@@ -1,4 +1,11 @@
+import concurrent.futures
+import contextlib
+import gzip
+import json
+import re
+import struct
 import sys
+import threading
 import types
 import time
 import random
@@ -6,7 +13,7 @@ import logging
 from collections import Counter, OrderedDict
 from copy import deepcopy
 
-from esrally import exceptions, track
+from esrally import exceptions, metrics, track
 
 # Mapping from operation type to specific runner
 __RUNNERS = {}
@@ -19,6 +26,8 @@ def register_default_runners():
     register_runner(track.OperationType.NodesStats.name, NodeStats())
     register_runner(track.OperationType.Search.name, Query())
     register_runner(track.OperationType.RawRequest.name, RawRequest())
+    register_runner(track.OperationType.SlicedScroll.name, SlicedScroll())
+    register_runner(track.OperationType.MultiSearch.name, MultiSearch())
 
     # We treat the following as administrative commands and thus already start to wrap them in a retry.
     register_runner(track.OperationType.ClusterHealth.name, Retry(ClusterHealth()))
@@ -173,10 +182,114 @@ def mandatory(params, key, op):
                                    " parameter source." % (str(op), key))
 
 
+_JSON_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def parse(response, props):
+    """
+    Extracts the provided properties from a JSON object without deserializing it completely. Parsing stops as soon as all properties have
+    been found, so this is cheap for properties that Elasticsearch returns before potentially large parts of a response (e.g. ``took``
+    or ``hits.total`` of a search response, which precede ``hits.hits``).
+
+    :param response: A JSON object as string.
+    :param props: A list of properties in dot notation, e.g. ``["took", "hits.total"]``.
+    :return: A dict with the values of all properties in ``props`` that are present in ``response``.
+    """
+    result = {}
+    _parse_object(response, _WHITESPACE.match(response, 0).end(), "", set(props), result)
+    return result
+
+
+def _parse_object(s, idx, prefix, props, result):
+    """
+    Parses the JSON object starting at ``s[idx]``.
+
+    :return: The index after the end of the object or ``None`` if all properties have been found.
+    """
+    if s[idx] != "{":
+        raise ValueError("Expected JSON object at position %d" % idx)
+    idx = _WHITESPACE.match(s, idx + 1).end()
+    if s[idx] == "}":
+        return idx + 1
+    while True:
+        key, idx = json.decoder.scanstring(s, idx + 1)
+        idx = _WHITESPACE.match(s, idx).end()
+        if s[idx] != ":":
+            raise ValueError("Expected ':' at position %d" % idx)
+        idx = _WHITESPACE.match(s, idx + 1).end()
+        prop = prefix + key
+        if prop in props:
+            result[prop], idx = _JSON_DECODER.raw_decode(s, idx)
+            if len(result) == len(props):
+                return None
+        elif s[idx] == "{" and any(p.startswith(prop + ".") for p in props):
+            idx = _parse_object(s, idx, prop + ".", props, result)
+            if idx is None:
+                return None
+        else:
+            # skip the value
+            _, idx = _JSON_DECODER.raw_decode(s, idx)
+        idx = _WHITESPACE.match(s, idx).end()
+        if s[idx] == ",":
+            idx = _WHITESPACE.match(s, idx + 1).end()
+        elif s[idx] == "}":
+            return idx + 1
+        else:
+            raise ValueError("Expected ',' or '}' at position %d" % idx)
+
+
+def extract(response, props):
+    """
+    Extracts the provided properties from a response that is either a raw JSON string (see ``raw_responses``) or has already been
+    deserialized.
+
+    :param response: The response as string or dict.
+    :param props: A list of properties in dot notation, e.g. ``["took", "hits.total"]``.
+    :return: A dict with the values of all properties in ``props`` that are present in ``response``.
+    """
+    if isinstance(response, str):
+        return parse(response, props)
+    result = {}
+    for prop in props:
+        value = response
+        for key in prop.split("."):
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            result[prop] = value
+    return result
+
+
+def raw_responses(es):
+    """
+    :param es: The Elasticsearch client.
+    :return: A context manager in which ``es`` returns responses as unparsed JSON strings. If the client does not support this,
+             responses are deserialized as usual.
+    """
+    serializer = getattr(getattr(es, "transport", None), "serializer", None)
+    if hasattr(serializer, "raw_responses"):
+        return serializer.raw_responses()
+    return contextlib.ExitStack()
+
+
+def filter_path(params, props):
+    """
+    :param params: The parameters of an operation.
+    :param props: A list of properties that a runner needs in dot notation.
+    :return: A value for the request parameter ``filter_path`` that restricts the response to ``props`` if ``filter-response`` is
+             enabled for this operation, ``None`` otherwise.
+    """
+    return ",".join(props) if params.get("filter-response", False) else None
+
+
 class BulkIndex(Runner):
     """
     Bulk indexes the given documents.
     """
+    # the properties of a bulk response that ``simple_stats`` needs
+    SIMPLE_STATS_PROPERTIES = ["took", "errors", "items.*.status", "items.*.error.reason", "items.*._shards.failed"]
 
     def __init__(self):
         super().__init__()
@@ -191,7 +304,8 @@ class BulkIndex(Runner):
 
         It expects a parameter dict with the following mandatory keys:
 
-        * ``body``: containing all documents for the current bulk request.
+        * ``body``: containing all documents for the current bulk request. This is either a list of lines or, if the bulk has been read
+          with ``zero-copy``, a ``bytes`` object that already contains the complete request body.
         * ``bulk-size``: the number of documents in this bulk.
         * ``action_metadata_present``: if ``True``, assume that an action and metadata line is present (meaning only half of the lines
         contain actual documents to index)
@@ -201,6 +315,15 @@ class BulkIndex(Runner):
         The following keys are optional:
 
         * ``pipeline``: If present, runs the the specified ingest pipeline for this bulk.
+        * ``filter-response``: If ``True`` and ``detailed-results`` is ``False``, Elasticsearch only returns the properties of the
+          response that the runner needs (via ``filter_path``). Defaults to ``False``.
+        * ``precompress``: If ``True``, ``body`` is a gzip-compressed ``bytes`` object that is sent with ``Content-Encoding: gzip``.
+        * ``bulk-size-bytes``: The size of ``body`` if it is a list of lines. It is reported as is.
+        * ``retry-rejected``: The maximum number of times that items which have been rejected by Elasticsearch (HTTP status 429) are sent
+          again. Only rejected items are sent. Defaults to 0.
+        * ``retry-initial-backoff``: The time in seconds to wait before the first retry of rejected items. It doubles with each retry and
+          Rally waits a random time between half of it and the full time. Defaults to 0.1.
+        * ``retry-max-backoff``: The maximum time in seconds to wait between two retries of rejected items. Defaults to 5.
         * ``detailed-results``: If ``True``, the runner will analyze the response and add detailed meta-data. Defaults to ``False``. Note
         that this has a very significant impact on performance and will very likely cause a bottleneck in the benchmark driver so please
         be very cautious enabling this feature. Our own measurements have shown a median overhead of several thousand times (execution time
@@ -223,6 +346,21 @@ class BulkIndex(Runner):
         * ``success-count``: Number of successfully processed items for this request (denoted in ``unit``).
         * ``error-count``: Number of failed items for this request (denoted in ``unit``).
         * ``took``` Value of the the ``took`` property in the bulk response.
+        * ``prefetch-queue-depth``: Number of bulk requests that have been prepared ahead when this request was issued. Only present if
+          ``prefetch`` is enabled.
+        * ``prefetch-stall-time``: Time in milliseconds that the client waited for this bulk request to be prepared. Only present if
+          ``prefetch`` is enabled.
+        * ``bulk-size-bytes``: Size of the (uncompressed) bulk request body in bytes. Only present if the body is provided as ``bytes``
+          or if the parameter source provides ``bulk-size-bytes``.
+        * ``compressed-size-bytes``: Size of the compressed bulk request body in bytes. Only present if ``precompress`` is enabled.
+        * ``uncompressed-size-bytes``: Size of the uncompressed bulk request body in bytes. Only present if ``precompress`` is enabled.
+        * ``retries``: The number of bulk requests that have been issued to retry rejected items. Only present if ``retry-rejected`` is
+          enabled and Elasticsearch has reported errors.
+        * ``retried-docs``: The total number of items that have been sent again. Only present along with ``retries``.
+        * ``retry-time``: Time in milliseconds that has been spent with retries, including waiting times. Only present along with
+          ``retries``.
+
+        ``success-count`` and ``error-count`` are based on the outcome of the last attempt for each item.
 
         If ``detailed-results`` is ``True`` the following meta data are returned in addition:
 
@@ -351,16 +489,35 @@ class BulkIndex(Runner):
         if "pipeline" in params:
             bulk_params["pipeline"] = params["pipeline"]
 
+        if not detailed_results:
+            response_filter = filter_path(params, BulkIndex.SIMPLE_STATS_PROPERTIES)
+            if response_filter:
+                bulk_params["filter_path"] = response_filter
+
         with_action_metadata = mandatory(params, "action-metadata-present", self)
         bulk_size = mandatory(params, "bulk-size", self)
 
-        if with_action_metadata:
-            # only half of the lines are documents
-            response = es.bulk(body=params["body"], params=bulk_params)
+        precompressed = params.get("precompress", False)
+        max_retries = int(params.get("retry-rejected", 0))
+        if max_retries > 0 and not with_action_metadata:
+            raise exceptions.DataError("Parameter source for operation '%s' must provide an action and meta-data line for each document "
+                                       "to retry rejected documents." % str(self))
+        with contextlib.ExitStack() as stack:
+            if not detailed_results:
+                # we only need to deserialize the complete response if there are errors
+                stack.enter_context(raw_responses(es))
+            response = self.send(es, params, params["body"], bulk_params, precompressed)
+
+        if isinstance(response, str) and parse(response, ["errors"]).get("errors", False):
+            response = es.transport.serializer.loads(response)
+        retry_meta_data = None
+        if max_retries > 0 and isinstance(response, dict) and response.get("errors", False):
+            retry_meta_data = self.retry_rejected(es, params, bulk_params, response, max_retries)
+
+        if detailed_results:
+            stats = self.detailed_stats(params, bulk_size, response)
         else:
-            response = es.bulk(body=params["body"], index=index, doc_type=params["type"], params=bulk_params)
-
-        stats = self.detailed_stats(params, bulk_size, response) if detailed_results else self.simple_stats(bulk_size, response)
+            stats = self.simple_stats(bulk_size, response)
 
         meta_data = {
             "index": str(index) if index else None,
@@ -369,10 +526,95 @@ class BulkIndex(Runner):
             "bulk-size": bulk_size
         }
         meta_data.update(stats)
+        if retry_meta_data:
+            meta_data.update(retry_meta_data)
+        # only present if bulk requests are prepared in the background
+        for key in ["prefetch-queue-depth", "prefetch-stall-time"]:
+            if key in params:
+                meta_data[key] = params[key]
+        body = params["body"]
+        if precompressed:
+            meta_data["compressed-size-bytes"] = len(body)
+            # the last four bytes of a gzip member contain the size of the uncompressed data (modulo 2^32)
+            meta_data["uncompressed-size-bytes"] = struct.unpack("<I", body[-4:])[0]
+            meta_data["bulk-size-bytes"] = meta_data["uncompressed-size-bytes"]
+        elif isinstance(body, (bytes, bytearray, memoryview)):
+            meta_data["bulk-size-bytes"] = len(body)
+        elif "bulk-size-bytes" in params:
+            # provided by the parameter source as it is too expensive to determine for a list of lines
+            meta_data["bulk-size-bytes"] = params["bulk-size-bytes"]
         if not stats["success"]:
             meta_data["error-type"] = "bulk"
         return meta_data
 
+    def send(self, es, params, body, bulk_params, precompressed=False):
+        index = params.get("index")
+        with_action_metadata = mandatory(params, "action-metadata-present", self)
+        if isinstance(body, (bytes, bytearray, memoryview)):
+            # elasticsearch-py would iterate over a bytes body and serialize each item so we need to bypass ``es.bulk()``.
+            path = "/%s/%s/_bulk" % (index, params["type"]) if not with_action_metadata else "/_bulk"
+            headers = {"content-type": "application/x-ndjson"}
+            if precompressed:
+                headers["content-encoding"] = "gzip"
+            return es.transport.perform_request("POST", path, params=bulk_params, body=body, headers=headers)
+        elif with_action_metadata:
+            # only half of the lines are documents
+            return es.bulk(body=body, params=bulk_params)
+        else:
+            return es.bulk(body=body, index=index, doc_type=params["type"], params=bulk_params)
+
+    def retry_rejected(self, es, params, bulk_params, response, max_retries):
+        """
+        Resends all items that Elasticsearch has rejected (HTTP status 429) with exponential backoff and jitter until either no items are
+        rejected anymore or ``max_retries`` retries have been made. The items of ``response`` are replaced with the items of the retries.
+
+        :return: A dict with meta data about the retries.
+        """
+        initial_backoff = float(params.get("retry-initial-backoff", 0.1))
+        max_backoff = float(params.get("retry-max-backoff", 5))
+        body = params["body"]
+        if params.get("precompress", False):
+            # retries are small so we send them uncompressed
+            body = gzip.decompress(body)
+        is_raw = isinstance(body, (bytes, bytearray, memoryview))
+        lines = bytes(body).split(b"\n") if is_raw else body
+        # determine the lines of each item upfront as they change with each retry
+        item_lines = []
+        line = 0
+        for item in response["items"]:
+            op = next(iter(item))
+            # all actions except delete are followed by a source line
+            line_count = 1 if op == "delete" else 2
+            item_lines.append((line, line + line_count))
+            line += line_count
+
+        items = response["items"]
+        retries = 0
+        retried_docs = 0
+        start = time.perf_counter()
+        for retry in range(max_retries):
+            rejected = [idx for idx, item in enumerate(items) if next(iter(item.values()))["status"] == 429]
+            if not rejected:
+                break
+            backoff = min(max_backoff, initial_backoff * 2 ** retry)
+            # spread retries of different clients
+            time.sleep(backoff / 2 + random.uniform(0, backoff / 2))
+            retry_lines = []
+            for idx in rejected:
+                first, last = item_lines[idx]
+                retry_lines.extend(lines[first:last])
+            retry_body = b"\n".join(retry_lines) + b"\n" if is_raw else retry_lines
+            retry_response = self.send(es, params, retry_body, bulk_params)
+            for idx, item in zip(rejected, retry_response["items"]):
+                items[idx] = item
+            retries += 1
+            retried_docs += len(rejected)
+        return {
+            "retries": retries,
+            "retried-docs": retried_docs,
+            "retry-time": (time.perf_counter() - start) * 1000
+        }
+
     def detailed_stats(self, params, bulk_size, response):
         ops = {}
         shards_histogram = OrderedDict()
@@ -381,9 +623,16 @@ class BulkIndex(Runner):
         bulk_request_size_bytes = 0
         total_document_size_bytes = 0
         with_action_metadata = mandatory(params, "action-metadata-present", self)
+        body = params["body"]
+        if params.get("precompress", False):
+            lines = gzip.decompress(body).splitlines()
+        elif isinstance(body, (bytes, bytearray, memoryview)):
+            lines = bytes(body).splitlines()
+        else:
+            lines = (line.encode("utf-8") for line in body)
 
-        for line_number, data in enumerate(params["body"]):
-            line_size = len(data.encode('utf-8'))
+        for line_number, data in enumerate(lines):
+            line_size = len(data)
             if with_action_metadata:
                 if line_number % 2 == 1:
                     total_document_size_bytes += line_size
@@ -431,14 +680,15 @@ class BulkIndex(Runner):
     def simple_stats(self, bulk_size, response):
         bulk_error_count = 0
         error_details = set()
-        if response["errors"]:
+        props = extract(response, ["took", "errors"])
+        if props.get("errors", False):
             for idx, item in enumerate(response["items"]):
                 data = next(iter(item.values()))
                 if data["status"] > 299 or data["_shards"]["failed"] > 0:
                     bulk_error_count += 1
                     self.extract_error_details(error_details, data)
         stats = {
-            "took": response.get("took"),
+            "took": props.get("took"),
             "success": bulk_error_count == 0,
             "success-count": bulk_size - bulk_error_count,
             "error-count": bulk_error_count
@@ -537,6 +787,9 @@ class Query(Runner):
     * `cache`: True iff the request cache should be used.
     * `body`: Query body
 
+    If `filter-response` is `True`, only the response properties that are needed for the meta data are returned by Elasticsearch (via
+    `filter_path`). This does not apply to scroll queries.
+
     If the following parameters are present in addition, a scroll query will be issued:
 
     * `pages`: Number of pages to retrieve at most for this scroll. If a scroll query does yield less results than the specified number of
@@ -558,6 +811,8 @@ class Query(Runner):
 
     * ``pages``: Total number of pages that have been retrieved.
     """
+    # the properties of a search response that ``request_body_query`` needs
+    REQUEST_BODY_QUERY_PROPERTIES = ["took", "timed_out", "hits.total"]
 
     def __init__(self):
         super().__init__()
@@ -574,18 +829,23 @@ class Query(Runner):
         request_params = params.get("request-params", {})
         if "cache" in params:
             request_params["request_cache"] = params["cache"]
-        r = es.search(
-            index=params.get("index", "_all"),
-            doc_type=params.get("type"),
-            body=mandatory(params, "body", self),
-            **request_params)
-        hits = r["hits"]["total"]
+        response_filter = filter_path(params, Query.REQUEST_BODY_QUERY_PROPERTIES)
+        if response_filter and "filter_path" not in request_params:
+            request_params["filter_path"] = response_filter
+        # avoid deserializing the potentially large list of hits that we don't need
+        with raw_responses(es):
+            r = es.search(
+                index=params.get("index", "_all"),
+                doc_type=params.get("type"),
+                body=mandatory(params, "body", self),
+                **request_params)
+        props = extract(r, Query.REQUEST_BODY_QUERY_PROPERTIES)
         return {
             "weight": 1,
             "unit": "ops",
-            "hits": hits,
-            "timed_out": r["timed_out"],
-            "took": r["took"]
+            "hits": props.get("hits.total"),
+            "timed_out": props.get("timed_out"),
+            "took": props.get("took")
         }
 
     def scroll_query(self, es, params):
@@ -658,6 +918,223 @@ class Query(Runner):
         return "query"
 
 
+class MultiSearch(Runner):
+    """
+    Runs a multi search request against Elasticsearch.
+
+    It expects the following keys in the `params` hash:
+
+    * `body`: The complete multi search request body as ``bytes`` (in NDJSON format).
+    * `searches`: The number of searches in `body`.
+
+    The following keys are optional:
+
+    * `request-params`: Request parameters for the multi search request.
+    * `filter-response`: If `True`, only the response properties that are needed for the meta data are returned by Elasticsearch (via
+      `filter_path`).
+
+    Returned meta data
+
+    * ``weight``: The number of searches in this request.
+    * ``unit``: The unit in which to interpret ``weight``. Always "ops".
+    * ``searches``: The number of searches in this request.
+    * ``hits``: The total number of hits of all searches.
+    * ``timed_out``: ``True`` if any of the searches has timed out.
+    * ``took``: Value of the ``took`` property of the multi search response.
+    * ``took-percentiles``: Percentiles of the ``took`` property of the individual searches (keys are percentiles with "_" as decimal
+      separator, e.g. "99_9"). Not present if all searches have failed.
+    * ``success``: ``True`` if all searches have succeeded.
+    * ``success-count``: The number of successful searches.
+    * ``error-count``: The number of failed searches.
+    """
+    RESPONSE_PROPERTIES = ["took", "responses.took", "responses.timed_out", "responses.hits.total", "responses.status",
+                           "responses.error.type", "responses.error.reason"]
+    TOOK_PERCENTILES = [50, 90, 99, 100]
+
+    def __call__(self, es, params):
+        searches = mandatory(params, "searches", self)
+        request_params = dict(params.get("request-params", {}))
+        response_filter = filter_path(params, MultiSearch.RESPONSE_PROPERTIES)
+        if response_filter and "filter_path" not in request_params:
+            request_params["filter_path"] = response_filter
+        # elasticsearch-py's msearch() would serialize the body line by line so we send the pre-serialized body as is
+        r = es.transport.perform_request("POST", "/_msearch", params=request_params, body=mandatory(params, "body", self),
+                                         headers={"content-type": "application/x-ndjson"})
+        hits = 0
+        timed_out = False
+        took = []
+        error_details = set()
+        error_count = 0
+        for response in r["responses"]:
+            if "error" in response:
+                error_count += 1
+                error = response["error"]
+                error_details.add((response.get("status"), error.get("reason") if isinstance(error, dict) else error))
+                continue
+            took.append(response["took"])
+            timed_out = timed_out or response["timed_out"]
+            total = response["hits"]["total"]
+            # Elasticsearch 7.0 returns an object
+            hits += total["value"] if isinstance(total, dict) else total
+
+        meta_data = {
+            "weight": searches,
+            "unit": "ops",
+            "searches": searches,
+            "hits": hits,
+            "timed_out": timed_out,
+            "took": r.get("took"),
+            "success": error_count == 0,
+            "success-count": searches - error_count,
+            "error-count": error_count
+        }
+        if took:
+            took.sort()
+            meta_data["took-percentiles"] = {
+                str(float(p)).replace(".", "_"): metrics.InMemoryMetricsStore.percentile_value(took, p) for p in self.TOOK_PERCENTILES
+            }
+        if error_count > 0:
+            meta_data["error-type"] = "msearch"
+            meta_data["error-description"] = ", ".join(
+                "HTTP status: %s, message: %s" % (status, reason) if reason else "HTTP status: %s" % status
+                for status, reason in sorted(error_details, key=str))
+        return meta_data
+
+    def __repr__(self, *args, **kwargs):
+        return "msearch"
+
+
+class SlicedScroll(Runner):
+    """
+    Runs a scroll query that is split into multiple slices and retrieves all slices in parallel, one thread per slice.
+
+    It expects at least the following keys in the `params` hash:
+
+    * `index`: The index or indices against which to issue the query.
+    * `type`: See `index`
+    * `cache`: True iff the request cache should be used.
+    * `body`: Query body
+    * `slices`: Number of slices.
+    * `pages`: Number of pages to retrieve at most per slice or "all" to retrieve all pages.
+
+    The following keys are optional:
+
+    * `results-per-page`: Number of results to retrieve per page.
+    * `request-params`: Additional request parameters for the initial search request.
+
+    Returned meta data
+
+    * ``weight``: The total number of retrieved pages across all slices.
+    * ``unit``: The unit in which to interpret ``weight``. Always "pages".
+    * ``pages``: Total number of pages that have been retrieved.
+    * ``hits``: Total number of hits that have been retrieved.
+    * ``took``: Sum of the ``took`` values of all responses.
+    * ``timed_out``: ``True`` if any of the responses has timed out.
+    * ``hits-per-second``: Total number of retrieved hits divided by the time it took to retrieve all slices.
+    * ``slices``: A list with the meta data ``slice`` (the slice id), ``pages``, ``hits``, ``took``, ``timed_out`` and
+      ``hits-per-second`` of each slice.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.scroll_ids = {}
+        self.es = None
+
+    def __call__(self, es, params):
+        slices = mandatory(params, "slices", self)
+        self.es = es
+        # stops the remaining slices early if retrieving one of them has failed
+        failed = threading.Event()
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=slices) as pool:
+            futures = [pool.submit(self.scroll_slice, es, params, slice_id, slices, failed) for slice_id in range(slices)]
+            slice_stats = [f.result() for f in futures]
+        duration = time.perf_counter() - start
+
+        pages = sum(s["pages"] for s in slice_stats)
+        hits = sum(s["hits"] for s in slice_stats)
+        return {
+            "weight": pages,
+            "pages": pages,
+            "hits": hits,
+            "unit": "pages",
+            "timed_out": any(s["timed_out"] for s in slice_stats),
+            "took": sum(s["took"] for s in slice_stats),
+            "hits-per-second": hits / duration if duration > 0 else 0,
+            "slices": slice_stats
+        }
+
+    def scroll_slice(self, es, params, slice_id, slices, failed):
+        request_params = params.get("request-params", {})
+        body = mandatory(params, "body", self)
+        if slices > 1:
+            # all slices share the same body (note that Elasticsearch does not allow a slice clause with only one slice)
+            body = dict(body)
+            body["slice"] = {"id": slice_id, "max": slices}
+        # explicitly convert to int to provoke an error otherwise
+        total_pages = sys.maxsize if params["pages"] == "all" else int(params["pages"])
+        hits = 0
+        retrieved_pages = 0
+        timed_out = False
+        took = 0
+        start = time.perf_counter()
+        try:
+            for page in range(total_pages):
+                if failed.is_set():
+                    break
+                if page == 0:
+                    r = es.search(
+                        index=params.get("index", "_all"),
+                        doc_type=params.get("type"),
+                        body=body,
+                        sort="_doc",
+                        scroll="10s",
+                        size=params.get("results-per-page"),
+                        request_cache=params.get("cache"),
+                        **request_params
+                    )
+                else:
+                    r = es.transport.perform_request("GET", "/_search/scroll",
+                                                     params={"scroll_id": self.scroll_ids[slice_id], "scroll": "10s"})
+                # Elasticsearch may return a different scroll id for subsequent pages
+                if r.get("_scroll_id"):
+                    self.scroll_ids[slice_id] = r["_scroll_id"]
+                hit_count = len(r["hits"]["hits"])
+                timed_out = timed_out or r["timed_out"]
+                took += r["took"]
+                hits += hit_count
+                retrieved_pages += 1
+                if hit_count == 0 or slice_id not in self.scroll_ids:
+                    break
+        except BaseException:
+            failed.set()
+            raise
+        duration = time.perf_counter() - start
+        return {
+            "slice": slice_id,
+            "pages": retrieved_pages,
+            "hits": hits,
+            "took": took,
+            "timed_out": timed_out,
+            "hits-per-second": hits / duration if duration > 0 else 0
+        }
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.es:
+            for scroll_id in self.scroll_ids.values():
+                try:
+                    self.es.transport.perform_request("DELETE", "/_search/scroll/%s" % scroll_id)
+                except BaseException:
+                    self.logger.exception("Could not clear scroll [%s]. This will lead to excessive resource usage in Elasticsearch and "
+                                          "will skew your benchmark results.", scroll_id)
+        self.scroll_ids = {}
+        self.es = None
+        return False
+
+    def __repr__(self, *args, **kwargs):
+        return "sliced-scroll"
+
+
 class ClusterHealth(Runner):
     """
     Get cluster health
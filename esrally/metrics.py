@@ -1,10 +1,15 @@
+import array
 import collections
+import heapq
 import logging
 import math
+import operator
 import pickle
+import queue
 import random
 import statistics
 import sys
+import threading
 import time
 import zlib
 from enum import Enum, IntEnum
@@ -47,6 +52,12 @@ class EsClient:
         import elasticsearch.helpers
         self.guarded(elasticsearch.helpers.bulk, self._client, items, index=index, doc_type=doc_type)
 
+    def bulk(self, index, doc_type, body):
+        return self.guarded(self._client.bulk, body=body, index=index, doc_type=doc_type)
+
+    def serialize(self, doc):
+        return self._client.transport.serializer.dumps(doc)
+
     def index(self, index, doc_type, item):
         self.guarded(self._client.index, index=index, doc_type=doc_type, body=item)
 
@@ -218,6 +229,8 @@ def metrics_store(cfg, read_only=True, track=None, challenge=None, car=None, met
 def metrics_store_class(cfg):
     if cfg.opts("reporting", "datastore.type") == "elasticsearch":
         return EsMetricsStore
+    elif convert.to_bool(cfg.opts("reporting", "datastore.histogram", mandatory=False, default_value=False)):
+        return HistogramMetricsStore
     else:
         return InMemoryMetricsStore
 
@@ -663,7 +676,7 @@ class MetricsStore:
         :param lap The lap to query. Optional. By default, all laps are considered.
         :return: A list of all values for the given metric.
         """
-        return self._get(name, task, operation_type, sample_type, lap, lambda doc: doc["value"])
+        return self._get(name, task, operation_type, sample_type, lap, operator.itemgetter("value"))
 
     def get_raw(self, name, task=None, operation_type=None, sample_type=None, lap=None, mapper=lambda doc: doc):
         """
@@ -767,11 +780,217 @@ class MetricsStore:
         return percentiles[median] if percentiles else None
 
 
+class BulkWriter:
+    """
+    Writes metrics documents with several background threads to an Elasticsearch metrics store. Documents are buffered in a bounded
+    queue. If the metrics store cannot keep up, ``add`` blocks until there is room in the queue again (backpressure) instead of
+    consuming an unbounded amount of memory.
+
+    Bulk requests that are rejected as a whole with HTTP status 429 or 503 are retried by ``EsClient``. Individual documents that have been
+    rejected with HTTP status 429 are retried with exponential backoff.
+    """
+    STOP = "stop"
+    ACTION = "{\"index\":{}}\n"
+
+    def __init__(self, client, index, doc_type, bulk_docs=5000, bulk_bytes=5 * 1024 * 1024, clients=2, queue_size=100000,
+                 max_retries=10):
+        """
+        :param client: An ``EsClient`` instance.
+        :param index: The name of the metrics index.
+        :param doc_type: The document type of the metrics documents.
+        :param bulk_docs: The maximum number of documents per bulk request.
+        :param bulk_bytes: The maximum size of a bulk request in bytes. As the size is determined on the serialized string, it is exact
+               only for ASCII documents.
+        :param clients: The number of bulk requests that may be in-flight concurrently.
+        :param queue_size: The maximum number of documents that are buffered until ``add`` blocks.
+        :param max_retries: The maximum number of times a document that has been rejected with HTTP status 429 is retried.
+        """
+        self.client = client
+        self.index = index
+        self.doc_type = doc_type
+        self.bulk_docs = bulk_docs
+        self.bulk_bytes = bulk_bytes
+        self.max_retries = max_retries
+        self.q = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.failure = None
+        # number of documents that have been dropped after a failure
+        self.dropped = 0
+        self.stop_watch = time.StopWatch()
+        self.stop_watch.start()
+        self._reset_stats()
+        self.logger = logging.getLogger(__name__)
+        self.workers = [threading.Thread(target=self.run, name="metrics-bulk-writer-%d" % i, daemon=True) for i in range(clients)]
+        for w in self.workers:
+            w.start()
+
+    def _reset_stats(self):
+        self.docs = 0
+        self.bytes = 0
+        self.requests = 0
+        self.retries = 0
+        self.max_lag = 0
+        self.start = self.stop_watch.split_time()
+
+    def add(self, doc, counted=True):
+        """
+        Adds a document. Blocks if too many documents are waiting to be written.
+
+        :param doc: The document to write.
+        :param counted: Whether the document should be considered in ``stats``.
+        :raises RallyError: If documents could not be written since the last call to ``add`` or ``flush``.
+        """
+        self._check_failure()
+        self.q.put((self.stop_watch.split_time(), doc, counted))
+
+    def flush(self):
+        """
+        Blocks until all documents that have been added so far are written.
+
+        :raises RallyError: If documents could not be written since the last call to ``add`` or ``flush``.
+        """
+        self.q.join()
+        self._check_failure()
+
+    def _check_failure(self):
+        with self.lock:
+            failure = self.failure
+            dropped = self.dropped
+            self.failure = None
+            self.dropped = 0
+        if failure:
+            raise exceptions.RallyError("Could not write metrics to the metrics store. Dropped [%d] further documents." %
+                                        dropped) from failure
+
+    def stats(self, reset=True):
+        """
+        :param reset: Whether statistics should be reset after they have been returned.
+        :return: A dict with statistics about documents that have been written since the last reset or ``None`` if no documents have
+                 been written.
+        """
+        with self.lock:
+            if self.docs == 0:
+                return None
+            duration = self.stop_watch.split_time() - self.start
+            result = {
+                "docs": self.docs,
+                "bytes": self.bytes,
+                "requests": self.requests,
+                "retries": self.retries,
+                "throughput": self.docs / duration if duration > 0 else None,
+                "max_lag": self.max_lag
+            }
+            if reset:
+                self._reset_stats()
+            return result
+
+    def close(self):
+        for _ in self.workers:
+            self.q.put(BulkWriter.STOP)
+        for w in self.workers:
+            w.join()
+
+    def run(self):
+        stop = False
+        while not stop:
+            batch = []
+            item = self.q.get()
+            # gather what's available without waiting; this keeps latency low if there is little to do
+            while True:
+                if item is BulkWriter.STOP:
+                    stop = True
+                    self.q.task_done()
+                    break
+                batch.append(item)
+                if len(batch) >= self.bulk_docs:
+                    break
+                try:
+                    item = self.q.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    if self.failure is None:
+                        self._write(batch)
+                    else:
+                        self.logger.warning("Dropping [%d] metrics documents as writing earlier documents has failed.", len(batch))
+                        with self.lock:
+                            self.dropped += len(batch)
+                except BaseException as e:
+                    self.logger.exception("Could not write metrics documents.")
+                    with self.lock:
+                        if self.failure is None:
+                            self.failure = e
+                finally:
+                    for _ in batch:
+                        self.q.task_done()
+
+    def _write(self, batch):
+        lines = []
+        size = 0
+        docs = 0
+        oldest = None
+        for enqueued, doc, counted in batch:
+            line = self.client.serialize(doc)
+            lines.append((line, counted))
+            size += len(BulkWriter.ACTION) + len(line) + 1
+            if counted:
+                docs += 1
+                oldest = enqueued if oldest is None else min(oldest, enqueued)
+            if size >= self.bulk_bytes:
+                self._bulk(lines)
+                lines = []
+                size = 0
+        if lines:
+            self._bulk(lines)
+        if docs > 0:
+            with self.lock:
+                self.docs += docs
+                self.max_lag = max(self.max_lag, self.stop_watch.split_time() - oldest)
+
+    def _bulk(self, lines):
+        """
+        :param lines: A list of (serialized document, counted) pairs. Only counted documents are considered in ``stats``.
+        """
+        attempt = 0
+        while True:
+            body = "".join("%s%s\n" % (BulkWriter.ACTION, line) for line, _ in lines)
+            response = self.client.bulk(index=self.index, doc_type=self.doc_type, body=body)
+            counted_bytes = sum(len(BulkWriter.ACTION) + len(line) + 1 for line, counted in lines if counted)
+            if counted_bytes > 0:
+                with self.lock:
+                    self.requests += 1
+                    self.bytes += counted_bytes
+            if not response.get("errors"):
+                return
+            rejected = []
+            for (line, counted), item in zip(lines, response["items"]):
+                status = item["index"]["status"]
+                if status == 429:
+                    rejected.append((line, counted))
+                elif status > 299:
+                    raise exceptions.RallyError("Could not index metrics document (status [%s]): %s" % (status, item["index"].get("error")))
+            if not rejected:
+                return
+            attempt += 1
+            if attempt > self.max_retries:
+                raise exceptions.RallyError("Metrics store rejected [%d] documents after [%d] retries." % (len(rejected), self.max_retries))
+            time_to_sleep = min(2 ** (attempt - 1) * 0.1, 10) + random.random() * 0.1
+            self.logger.debug("Metrics store rejected [%d] documents in attempt [%d/%d]. Sleeping for [%f] seconds.",
+                              len(rejected), attempt, self.max_retries, time_to_sleep)
+            with self.lock:
+                self.retries += sum(1 for _, counted in rejected if counted)
+            time.sleep(time_to_sleep)
+            lines = rejected
+
+
 class EsMetricsStore(MetricsStore):
     """
     A metrics store backed by Elasticsearch.
     """
     METRICS_DOC_TYPE = "metrics"
+    # metrics about the background writer itself
+    WRITER_STATS_METRICS = ["metrics_store_indexing_throughput", "metrics_store_indexing_lag"]
 
     def __init__(self,
                  cfg,
@@ -793,6 +1012,12 @@ class EsMetricsStore(MetricsStore):
         self._client = client_factory_class(cfg).create()
         self._index_template_provider = index_template_provider_class(cfg)
         self._docs = None
+        self._background = convert.to_bool(cfg.opts("reporting", "datastore.bulk.background", mandatory=False, default_value=False))
+        self._bulk_docs = int(cfg.opts("reporting", "datastore.bulk.docs", mandatory=False, default_value=5000))
+        self._bulk_bytes = int(cfg.opts("reporting", "datastore.bulk.bytes", mandatory=False, default_value=5 * 1024 * 1024))
+        self._bulk_clients = int(cfg.opts("reporting", "datastore.bulk.clients", mandatory=False, default_value=2))
+        self._bulk_queue_size = int(cfg.opts("reporting", "datastore.bulk.queue_size", mandatory=False, default_value=100000))
+        self._writer = None
 
     def open(self, trial_id=None, trial_timestamp=None, track_name=None, challenge_name=None, car_name=None, ctx=None, create=False):
         self._docs = []
@@ -806,6 +1031,10 @@ class EsMetricsStore(MetricsStore):
                 self._client.create_index(index=self._index)
         # ensure we can search immediately after opening
         self._client.refresh(index=self._index)
+        if self._background:
+            self._close_writer()
+            self._writer = BulkWriter(self._client, self._index, EsMetricsStore.METRICS_DOC_TYPE, bulk_docs=self._bulk_docs,
+                                      bulk_bytes=self._bulk_bytes, clients=self._bulk_clients, queue_size=self._bulk_queue_size)
 
     def index_name(self):
         ts = time.from_is8601(self._trial_timestamp)
@@ -815,7 +1044,10 @@ class EsMetricsStore(MetricsStore):
         return self._index_template_provider.metrics_template()
 
     def flush(self, refresh=True):
-        if self._docs:
+        if self._writer:
+            self._writer.flush()
+            self._put_writer_stats()
+        elif self._docs:
             self._client.bulk_index(index=self._index, doc_type=EsMetricsStore.METRICS_DOC_TYPE, items=self._docs)
             self.logger.info("Successfully added %d metrics documents for trial timestamp=[%s], track=[%s], challenge=[%s], car=[%s].",
                              len(self._docs), self._trial_timestamp, self._track, self._challenge, self._car)
@@ -824,8 +1056,37 @@ class EsMetricsStore(MetricsStore):
         if refresh:
             self._client.refresh(index=self._index)
 
+    def _put_writer_stats(self):
+        stats = self._writer.stats()
+        # we can only store metrics while a lap is in progress
+        if stats and self.opened and self.lap is not None:
+            meta_data = {
+                "docs": stats["docs"],
+                "bytes": stats["bytes"],
+                "bulk-requests": stats["requests"],
+                "retries": stats["retries"]
+            }
+            if stats["throughput"] is not None:
+                self.put_value_cluster_level("metrics_store_indexing_throughput", stats["throughput"], "docs/s", meta_data=meta_data)
+            self.put_value_cluster_level("metrics_store_indexing_lag", convert.seconds_to_ms(stats["max_lag"]), "ms",
+                                         meta_data=meta_data)
+            self._writer.flush()
+
+    def close(self):
+        super().close()
+        self._close_writer()
+
+    def _close_writer(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
     def _add(self, doc):
-        self._docs.append(doc)
+        if self._writer:
+            # the writer must not measure itself
+            self._writer.add(doc, counted=doc["name"] not in EsMetricsStore.WRITER_STATS_METRICS)
+        else:
+            self._docs.append(doc)
 
     def _get(self, name, task, operation_type, sample_type, lap, mapper):
         query = {
@@ -986,14 +1247,29 @@ class InMemoryMetricsStore(MetricsStore):
         """
         super().__init__(cfg=cfg, clock=clock, meta_info=meta_info, lap=lap)
         self.docs = []
+        # (name, task, operation-type, sample-type, lap) -> (sequence numbers, docs) of all matching docs in insertion order
+        self.postings = {}
+        # name -> all keys in postings for this metric name
+        self.keys_by_name = {}
 
     def __del__(self):
         """
         Deletes the metrics store instance.
         """
         del self.docs
+        del self.postings
+        del self.keys_by_name
 
     def _add(self, doc):
+        key = (doc["name"], doc.get("task"), doc.get("operation-type"), doc.get("sample-type"), doc.get("lap"))
+        postings = self.postings.get(key)
+        if postings is None:
+            postings = (array.array("Q"), [])
+            self.postings[key] = postings
+            self.keys_by_name.setdefault(doc["name"], []).append(key)
+        seqs, docs = postings
+        seqs.append(len(self.docs))
+        docs.append(doc)
         self.docs.append(doc)
 
     def flush(self, refresh=True):
@@ -1003,6 +1279,8 @@ class InMemoryMetricsStore(MetricsStore):
         docs = self.docs
         if clear:
             self.docs = []
+            self.postings = {}
+            self.keys_by_name = {}
         compressed = zlib.compress(pickle.dumps(docs))
         self.logger.debug("Compression changed size of metric store from [%d] bytes to [%d] bytes",
                          sys.getsizeof(docs, -1), sys.getsizeof(compressed, -1))
@@ -1044,13 +1322,10 @@ class InMemoryMetricsStore(MetricsStore):
     def get_error_rate(self, task, operation_type=None, sample_type=None, lap=None):
         error = 0
         total_count = 0
-        for doc in self.docs:
-            # we can use any request metrics record (i.e. service time or latency)
-            if doc["name"] == "service_time" and doc["task"] == task and \
-                    (operation_type is None or doc["operation-type"] == operation_type.name) and \
-                    (sample_type is None or doc["sample-type"] == sample_type.name.lower()) and \
-                    (lap is None or doc["lap"] == lap):
-                total_count += 1
+        # we can use any request metrics record (i.e. service time or latency)
+        for _, docs in self._postings("service_time", task, operation_type, sample_type, lap):
+            total_count += len(docs)
+            for doc in docs:
                 if doc["meta"]["success"] is False:
                     error += 1
         if total_count > 0:
@@ -1072,20 +1347,307 @@ class InMemoryMetricsStore(MetricsStore):
         else:
             return None
 
-    def _get(self, name, task, operation_type, sample_type, lap, mapper):
-        return [mapper(doc)
-                for doc in self.docs
-                if doc["name"] == name and
-                (task is None or doc["task"] == task) and
-                (operation_type is None or doc["operation-type"] == operation_type.name) and
-                (sample_type is None or doc["sample-type"] == sample_type.name.lower()) and
-                (lap is None or doc["lap"] == lap)
+    def get_count(self, name, task=None, operation_type=None, sample_type=None, lap=None):
+        return sum(len(docs) for _, docs in self._postings(name, task, operation_type, sample_type, lap))
+
+    def _postings(self, name, task, operation_type, sample_type, lap):
+        """
+        :return: A list of (sequence numbers, docs) pairs of all postings that match the provided criteria.
+        """
+        return [self.postings[key] for key in self._matching_keys(self.keys_by_name, name, task, operation_type, sample_type, lap)]
+
+    @staticmethod
+    def _matching_keys(keys_by_name, name, task, operation_type, sample_type, lap):
+        """
+        :param keys_by_name: A dict of metric name to all (name, task, operation-type, sample-type, lap) keys for this metric name.
+        :return: A list of all keys for the provided metric name that match the provided criteria.
+        """
+        operation_type_name = operation_type.name if operation_type is not None else None
+        sample_type_name = sample_type.name.lower() if sample_type is not None else None
+        return [key
+                for key in keys_by_name.get(name, [])
+                if (task is None or key[1] == task) and
+                (operation_type is None or key[2] == operation_type_name) and
+                (sample_type is None or key[3] == sample_type_name) and
+                (lap is None or key[4] == lap)
                 ]
 
+    def _get(self, name, task, operation_type, sample_type, lap, mapper):
+        postings = self._postings(name, task, operation_type, sample_type, lap)
+        if len(postings) == 1:
+            return list(map(mapper, postings[0][1]))
+        else:
+            # restore insertion order across all matching postings; sequence numbers are unique so docs are never compared
+            return list(map(mapper, map(operator.itemgetter(1), heapq.merge(*[zip(seqs, docs) for seqs, docs in postings]))))
+
     def __str__(self):
         return "in-memory metrics store"
 
 
+class HdrHistogram:
+    """
+    A histogram with log-linear buckets in the spirit of HdrHistogram. Each power of two range is divided into ``10 ** significant_digits``
+    equally sized buckets. Values are represented by the midpoint of their bucket so the relative error of any percentile value is at most
+    ``1 / (2 * 10 ** significant_digits)`` (i.e. 0.05% with the default of three significant digits). The count, minimum, maximum, sum and
+    mean are exact.
+
+    Memory usage and query time only depend on the number of distinct buckets, not on the number of recorded values.
+    """
+
+    def __init__(self, significant_digits=3):
+        if significant_digits < 1 or significant_digits > 5:
+            raise exceptions.SystemSetupError("The number of significant digits must be between 1 and 5 but was [%s]." % significant_digits)
+        self.significant_digits = significant_digits
+        self.sub_buckets = 10 ** significant_digits
+        # bucket index -> count; we track positive and negative values separately and count zeroes explicitly
+        self.positive = {}
+        self.negative = {}
+        self.zeroes = 0
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        mantissa, exponent = math.frexp(value)
+        # the mantissa is in [0.5, 1)
+        return exponent * self.sub_buckets + int((mantissa - 0.5) * 2 * self.sub_buckets)
+
+    def _value(self, index):
+        exponent, sub_bucket = divmod(index, self.sub_buckets)
+        # midpoint of the bucket
+        return math.ldexp(0.5 + (sub_bucket + 0.5) / (2 * self.sub_buckets), exponent)
+
+    def record(self, value):
+        if value > 0:
+            idx = self._index(value)
+            self.positive[idx] = self.positive.get(idx, 0) + 1
+        elif value < 0:
+            idx = self._index(-value)
+            self.negative[idx] = self.negative.get(idx, 0) + 1
+        else:
+            self.zeroes += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.sub_buckets != self.sub_buckets:
+            raise exceptions.RallyAssertionError("Cannot merge histograms with different precision.")
+        for idx, c in other.positive.items():
+            self.positive[idx] = self.positive.get(idx, 0) + c
+        for idx, c in other.negative.items():
+            self.negative[idx] = self.negative.get(idx, 0) + c
+        self.zeroes += other.zeroes
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count > 0 else None
+
+    def _buckets(self):
+        # all buckets in ascending order of their values as pairs of (value, count)
+        for idx in sorted(self.negative.keys(), reverse=True):
+            yield -self._value(idx), self.negative[idx]
+        if self.zeroes > 0:
+            yield 0, self.zeroes
+        for idx in sorted(self.positive.keys()):
+            yield self._value(idx), self.positive[idx]
+
+    def _values_at_ranks(self, ranks):
+        result = {}
+        pending = sorted(set(ranks))
+        i = 0
+        seen = 0
+        for value, c in self._buckets():
+            seen += c
+            # all ranks in [seen - c, seen) fall into this bucket
+            while i < len(pending) and pending[i] < seen:
+                rank = pending[i]
+                # the smallest and the largest value are known exactly
+                if rank == 0:
+                    result[rank] = self.min
+                elif rank == self.count - 1:
+                    result[rank] = self.max
+                else:
+                    result[rank] = min(max(value, self.min), self.max)
+                i += 1
+            if i == len(pending):
+                break
+        return result
+
+    def percentiles(self, percentiles):
+        """
+        Determines percentile values with the same interpolation as ``InMemoryMetricsStore.percentile_value``.
+
+        :param percentiles: A list of percentiles between [0, 100].
+        :return: A list with the value for each percentile in the same order.
+        """
+        if self.count == 0:
+            return [None for _ in percentiles]
+        ranks = []
+        for percentile in percentiles:
+            rank = float(percentile) / 100.0 * (self.count - 1)
+            ranks.append(rank)
+        values = self._values_at_ranks([math.floor(r) for r in ranks] + [math.ceil(r) for r in ranks])
+        result = []
+        for rank in ranks:
+            lower_score = values[math.floor(rank)]
+            if rank == int(rank):
+                result.append(lower_score)
+            else:
+                higher_score = values[math.ceil(rank)]
+                result.append(lower_score + (higher_score - lower_score) * (rank - math.floor(rank)))
+        return result
+
+
+class HistogramMetricsStore(InMemoryMetricsStore):
+    """
+    An in-memory metrics store that records request metrics (see ``REQUEST_METRICS``) in histograms per metric name, task, operation type,
+    sample type and lap instead of keeping all raw documents. Percentiles and statistics of request metrics are answered from these
+    histograms and their memory usage only depends on the number of distinct histogram buckets, not on the number of requests. See
+    ``HdrHistogram`` for the error bound of percentile values. All other metrics are stored as raw documents.
+
+    As raw request metrics documents are not retained, ``get`` and ``get_raw`` do not return any values for request metrics.
+    """
+    # these metrics are recorded for every single request
+    REQUEST_METRICS = ["latency", "service_time", "schedule_lag"]
+
+    def __init__(self, cfg, clock=time.Clock, meta_info=None, lap=None):
+        super().__init__(cfg=cfg, clock=clock, meta_info=meta_info, lap=lap)
+        self.significant_digits = int(cfg.opts("reporting", "datastore.histogram.significant_digits", mandatory=False, default_value=3))
+        # (name, task, operation-type, sample-type, lap) -> histogram of all values
+        self.histograms = {}
+        # (name, task, operation-type, sample-type, lap) -> number of values of failed requests
+        self.errors = {}
+        # (name, task, operation-type, sample-type, lap) -> unit
+        self.units = {}
+        # name -> all keys in histograms for this metric name
+        self.histogram_keys_by_name = {}
+
+    def _add(self, doc):
+        if doc["name"] in HistogramMetricsStore.REQUEST_METRICS:
+            key = (doc["name"], doc.get("task"), doc.get("operation-type"), doc.get("sample-type"), doc.get("lap"))
+            self._histogram_for(key, doc.get("unit")).record(doc["value"])
+            meta = doc.get("meta")
+            if meta and meta.get("success") is False:
+                self.errors[key] += 1
+        else:
+            super()._add(doc)
+
+    def _histogram_for(self, key, unit):
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = HdrHistogram(self.significant_digits)
+            self.histograms[key] = histogram
+            self.errors[key] = 0
+            self.units[key] = unit
+            self.histogram_keys_by_name.setdefault(key[0], []).append(key)
+        return histogram
+
+    def to_externalizable(self, clear=False):
+        docs = self.docs
+        request_metrics = [(key, h, self.errors[key], self.units[key]) for key, h in self.histograms.items()]
+        if clear:
+            self.docs = []
+            self.postings = {}
+            self.keys_by_name = {}
+            self.histograms = {}
+            self.errors = {}
+            self.units = {}
+            self.histogram_keys_by_name = {}
+        compressed = zlib.compress(pickle.dumps((docs, request_metrics)))
+        self.logger.debug("Compression changed size of metric store from [%d] bytes to [%d] bytes",
+                          sys.getsizeof(docs, -1) + sys.getsizeof(request_metrics, -1), sys.getsizeof(compressed, -1))
+        return compressed
+
+    def bulk_add(self, memento):
+        if memento:
+            self.logger.debug("Restoring in-memory representation of metrics store.")
+            docs, request_metrics = pickle.loads(zlib.decompress(memento))
+            for doc in docs:
+                self._add(doc)
+            for key, histogram, errors, unit in request_metrics:
+                self._histogram_for(key, unit).merge(histogram)
+                self.errors[key] += errors
+
+    def _histogram_keys(self, name, task, operation_type, sample_type, lap):
+        return self._matching_keys(self.histogram_keys_by_name, name, task, operation_type, sample_type, lap)
+
+    def histogram(self, name, task=None, operation_type=None, sample_type=None, lap=None):
+        """
+        :return: A histogram of all values that match the provided criteria or ``None`` if there are no matching values.
+        """
+        result = None
+        for key in self._histogram_keys(name, task, operation_type, sample_type, lap):
+            if result is None:
+                result = HdrHistogram(self.significant_digits)
+            result.merge(self.histograms[key])
+        return result
+
+    def get_unit(self, name, task=None):
+        if name in HistogramMetricsStore.REQUEST_METRICS:
+            keys = self._histogram_keys(name, task, None, None, None)
+            return self.units[keys[0]] if keys else None
+        else:
+            return super().get_unit(name, task)
+
+    def get_count(self, name, task=None, operation_type=None, sample_type=None, lap=None):
+        if name in HistogramMetricsStore.REQUEST_METRICS:
+            return sum(self.histograms[key].count for key in self._histogram_keys(name, task, operation_type, sample_type, lap))
+        else:
+            return super().get_count(name, task, operation_type, sample_type, lap)
+
+    def get_error_rate(self, task, operation_type=None, sample_type=None, lap=None):
+        errors = 0
+        total_count = 0
+        for key in self._histogram_keys("service_time", task, operation_type, sample_type, lap):
+            errors += self.errors[key]
+            total_count += self.histograms[key].count
+        if total_count > 0:
+            return errors / total_count
+        else:
+            return 0.0
+
+    def get_percentiles(self, name, task=None, operation_type=None, sample_type=None, lap=None, percentiles=None):
+        if percentiles is None:
+            percentiles = [99, 99.9, 100]
+        if name not in HistogramMetricsStore.REQUEST_METRICS:
+            return super().get_percentiles(name, task, operation_type, sample_type, lap, percentiles)
+        result = collections.OrderedDict()
+        histogram = self.histogram(name, task, operation_type, sample_type, lap)
+        if histogram:
+            for percentile, value in zip(percentiles, histogram.percentiles(percentiles)):
+                result[percentile] = value
+        return result
+
+    def get_stats(self, name, task=None, operation_type=None, sample_type=SampleType.Normal, lap=None):
+        if name not in HistogramMetricsStore.REQUEST_METRICS:
+            return super().get_stats(name, task, operation_type, sample_type, lap)
+        histogram = self.histogram(name, task, operation_type, sample_type, lap)
+        if histogram:
+            return {
+                "count": histogram.count,
+                "min": histogram.min,
+                "max": histogram.max,
+                "avg": histogram.mean,
+                "sum": histogram.sum
+            }
+        else:
+            return None
+
+    def __str__(self):
+        return "in-memory metrics store with histograms"
+
+
 def race_store(cfg):
     """
     Creates a proper race store based on the current configuration.
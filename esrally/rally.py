@@ -96,6 +96,21 @@ def create_arg_parser():
         help="Output file name (default: stdout).",
         default=None)
 
+    convert_parser = subparsers.add_parser("convert-corpus", help="Convert a document corpus to the seekable framed format")
+    convert_parser.add_argument(
+        "--input-path",
+        required=True,
+        help="Path to the document corpus. It may be uncompressed or compressed with bz2 or gzip.")
+    convert_parser.add_argument(
+        "--output-path",
+        help="Path of the framed corpus (default: path of the uncompressed corpus with the suffix \"%s\")." % io.FRAMED_FILE_SUFFIX,
+        default=None)
+    convert_parser.add_argument(
+        "--lines-per-frame",
+        type=positive_number,
+        help="Number of lines in each frame (default: %d)." % io.DEFAULT_LINES_PER_FRAME,
+        default=io.DEFAULT_LINES_PER_FRAME)
+
     compare_parser = subparsers.add_parser("compare", help="Compare two races")
     compare_parser.add_argument(
         "--baseline",
@@ -217,6 +232,23 @@ def create_arg_parser():
             "--load-driver-hosts",
             help="Define a comma-separated list of hosts which should generate load (default: localhost).",
             default="localhost")
+        p.add_argument(
+            "--load-generator-mode",
+            choices=["process", "asyncio"],
+            help="Either run each client in its own process ('process') or run multiple clients as coroutines within one process "
+                 "('asyncio') (default: process).",
+            default="process")
+        p.add_argument(
+            "--timing-mode",
+            choices=["sleep", "precise"],
+            help="Either sleep until a throttled request is due ('sleep') or sleep until shortly before and busy-wait for the rest of "
+                 "the time ('precise') (default: sleep).",
+            default="sleep")
+        p.add_argument(
+            "--clients-per-load-generator",
+            type=positive_number,
+            help="The maximum number of clients that are run within one process if the load generator mode is 'asyncio' (default: 100).",
+            default=100)
         p.add_argument(
             "--laps",
             type=positive_number,
@@ -454,6 +486,8 @@ def dispatch_sub_command(cfg, sub_command):
             race(cfg)
         elif sub_command == "generate":
             generate(cfg)
+        elif sub_command == "convert-corpus":
+            track.convert_corpus(cfg)
         else:
             raise exceptions.SystemSetupError("Unknown subcommand [%s]" % sub_command)
         return True
@@ -572,6 +606,10 @@ def main():
     if sub_command == "compare":
         cfg.add(config.Scope.applicationOverride, "reporting", "baseline.timestamp", args.baseline)
         cfg.add(config.Scope.applicationOverride, "reporting", "contender.timestamp", args.contender)
+    if sub_command == "convert-corpus":
+        cfg.add(config.Scope.applicationOverride, "corpus", "input.path", args.input_path)
+        cfg.add(config.Scope.applicationOverride, "corpus", "output.path", args.output_path)
+        cfg.add(config.Scope.applicationOverride, "corpus", "lines_per_frame", args.lines_per_frame)
     if sub_command == "generate":
         cfg.add(config.Scope.applicationOverride, "generator", "chart.type", args.chart_type)
         cfg.add(config.Scope.applicationOverride, "generator", "output.path", args.output_path)
@@ -589,6 +627,9 @@ def main():
     cfg.add(config.Scope.applicationOverride, "driver", "profiling", args.enable_driver_profiling)
     cfg.add(config.Scope.applicationOverride, "driver", "on.error", args.on_error)
     cfg.add(config.Scope.applicationOverride, "driver", "load_driver_hosts", opts.csv_to_list(args.load_driver_hosts))
+    cfg.add(config.Scope.applicationOverride, "driver", "load_generator.mode", args.load_generator_mode)
+    cfg.add(config.Scope.applicationOverride, "driver", "load_generator.clients", args.clients_per_load_generator)
+    cfg.add(config.Scope.applicationOverride, "driver", "timing.mode", args.timing_mode)
     if sub_command != "list":
         # Also needed by mechanic (-> telemetry) - duplicate by module?
         target_hosts = opts.TargetHosts(args.target_hosts)
@@ -143,7 +143,8 @@ class StatsCalculator:
                         self.summary_stats("throughput", t),
                         self.single_latency(t),
                         self.single_latency(t, metric_name="service_time"),
-                        self.error_rate(t)
+                        self.error_rate(t),
+                        self.single_latency(t, metric_name="schedule_lag")
                     )
         self.logger.debug("Gathering node startup time metrics.")
         startup_times = self.store.get_raw("node_startup_time")
@@ -351,6 +352,9 @@ class Stats:
                     if "service_time" in item:
                         all_results.append(
                             {"task": item["task"], "operation": item["operation"], "name": "service_time", "value": item["service_time"]})
+                    if "schedule_lag" in item:
+                        all_results.append(
+                            {"task": item["task"], "operation": item["operation"], "name": "schedule_lag", "value": item["schedule_lag"]})
                     if "error_rate" in item:
                         all_results.append(
                             {"task": item["task"], "operation": item["operation"], "name": "error_rate",
@@ -388,15 +392,19 @@ class Stats:
     def v(self, d, k, default=None):
         return d.get(k, default) if d else default
 
-    def add_op_metrics(self, task, operation, throughput, latency, service_time, error_rate):
-        self.op_metrics.append({
+    def add_op_metrics(self, task, operation, throughput, latency, service_time, error_rate, schedule_lag=None):
+        op_metrics = {
             "task": task,
             "operation": operation,
             "throughput": throughput,
             "latency": latency,
             "service_time": service_time,
             "error_rate": error_rate
-        })
+        }
+        # only throttled tasks have a schedule lag
+        if schedule_lag:
+            op_metrics["schedule_lag"] = schedule_lag
+        self.op_metrics.append(op_metrics)
 
     def add_node_metrics(self, node, startup_time):
         self.node_metrics.append({
@@ -466,6 +474,7 @@ class SummaryReporter:
             metrics_table.extend(self.report_throughput(record, task))
             metrics_table.extend(self.report_latency(record, task))
             metrics_table.extend(self.report_service_time(record, task))
+            metrics_table.extend(self.report_schedule_lag(record, task))
             metrics_table.extend(self.report_error_rate(record, task))
             self.add_warnings(warnings, record, task)
 
@@ -506,6 +515,10 @@ class SummaryReporter:
     def report_service_time(self, values, task):
         return self.report_percentiles("service time", task, values["service_time"])
 
+    def report_schedule_lag(self, values, task):
+        # not present for unthrottled tasks and for results of earlier versions of Rally
+        return self.report_percentiles("schedule lag", task, values.get("schedule_lag"))
+
     def report_percentiles(self, name, task, value):
         lines = []
         if value:
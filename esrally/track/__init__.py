@@ -1,4 +1,5 @@
-from .loader import list_tracks, load_track, load_track_plugins, track_repo, prepare_track, operation_parameters, set_absolute_data_path
+from .loader import list_tracks, load_track, load_track_plugins, track_repo, prepare_track, operation_parameters, set_absolute_data_path, \
+    convert_corpus
 
 # expose the complete track API
 from .track import *
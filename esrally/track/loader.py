@@ -113,13 +113,17 @@ def set_absolute_data_path(cfg, t):
     :param t: The track to modify.
     """
 
-    def first_existing(root_dirs, f):
+    def first_existing(root_dirs, f, exists=os.path.exists):
         for root_dir in root_dirs:
             p = os.path.join(root_dir, f)
-            if os.path.exists(p):
+            if exists(p):
                 return p
         return None
 
+    def document_file_exists(p):
+        # it is sufficient if the corpus is available in the framed format
+        return os.path.exists(p) or io.read_frame_index(io.framed_file_path(p)) is not None
+
     for corpus in t.corpora:
         data_root = data_dir(cfg, t.name, corpus.name)
         for document_set in corpus.documents:
@@ -127,7 +131,7 @@ def set_absolute_data_path(cfg, t):
             if document_set.document_archive:
                 document_set.document_archive = first_existing(data_root, document_set.document_archive)
             if document_set.document_file:
-                document_set.document_file = first_existing(data_root, document_set.document_file)
+                document_set.document_file = first_existing(data_root, document_set.document_file, exists=document_file_exists)
 
 
 def is_simple_track_mode(cfg):
@@ -254,10 +258,19 @@ def prepare_track(t, cfg):
     logger = logging.getLogger(__name__)
     offline = cfg.opts("system", "offline.mode")
     test_mode = cfg.opts("track", "test.mode.enabled")
+    offset_table_stride = cfg.opts("track", "offset_table.stride", mandatory=False, default_value=None)
+    if offset_table_stride is not None:
+        offset_table_stride = int(offset_table_stride)
+    decompression_workers = int(cfg.opts("track", "decompression.workers", mandatory=False, default_value=os.cpu_count() or 1))
+    streaming_decompression = convert.to_bool(cfg.opts("track", "decompression.streaming", mandatory=False, default_value=False))
+    corpus_format = cfg.opts("track", "corpus.format", mandatory=False, default_value="plain")
+    if corpus_format not in ["plain", "framed"]:
+        raise exceptions.SystemSetupError("Unknown corpus format [%s]. Possible values are: plain, framed." % corpus_format)
     for corpus in used_corpora(t, cfg):
         data_root = data_dir(cfg, t.name, corpus.name)
         logger.info("Resolved data root directory for document corpus [%s] in track [%s] to %s.", corpus.name, t.name, data_root)
-        prep = DocumentSetPreparator(t.name, offline, test_mode)
+        prep = DocumentSetPreparator(t.name, offline, test_mode, offset_table_stride, decompression_workers, streaming_decompression,
+                                     framed=corpus_format == "framed")
 
         for document_set in corpus.documents:
             if document_set.is_bulk:
@@ -268,20 +281,74 @@ def prepare_track(t, cfg):
                     prep.prepare_document_set(document_set, data_root[1])
 
 
+def convert_corpus(cfg):
+    """
+    Converts a document corpus to the framed format so the load driver can read it without decompressing it to disk first.
+
+    :param cfg: The config object.
+    """
+    input_path = io.normalize_path(cfg.opts("corpus", "input.path"))
+    output_path = cfg.opts("corpus", "output.path", mandatory=False, default_value=None)
+    lines_per_frame = int(cfg.opts("corpus", "lines_per_frame", mandatory=False, default_value=io.DEFAULT_LINES_PER_FRAME))
+    if not os.path.isfile(input_path):
+        raise exceptions.SystemSetupError("Cannot convert [%s] because it does not exist." % input_path)
+    if output_path:
+        output_path = io.normalize_path(output_path)
+    else:
+        path_without_extension, extension = io.splitext(input_path)
+        output_path = io.framed_file_path(path_without_extension if extension in io.COMPRESSED_STREAM_FORMATS else input_path)
+
+    console.info("Converting [%s] to [%s] ... " % (input_path, output_path), end="", flush=True, logger=logging.getLogger(__name__))
+    lines = io.convert_to_framed(input_path, output_path, lines_per_frame)
+    console.println("[OK]")
+    console.info("Wrote [%d] lines to [%s]. Place it next to the corpus file in the track's data directory to use it." %
+                 (lines, output_path))
+
+
 class DocumentSetPreparator:
-    def __init__(self, track_name, offline, test_mode):
+    def __init__(self, track_name, offline, test_mode, offset_table_stride=None, decompression_workers=1, streaming_decompression=False,
+                 framed=False):
         self.track_name = track_name
         self.offline = offline
         self.test_mode = test_mode
+        self.offset_table_stride = offset_table_stride
+        self.decompression_workers = decompression_workers
+        self.streaming_decompression = streaming_decompression
+        self.framed = framed
         self.logger = logging.getLogger(__name__)
 
+    def can_decompress_while_downloading(self, archive_path, documents_path):
+        path_without_extension, extension = io.splitext(archive_path)
+        return self.streaming_decompression and not self.framed and extension in io.COMPRESSED_STREAM_FORMATS and \
+            path_without_extension == documents_path
+
+    def is_framed_file_available(self, documents_path, uncompressed_size, number_of_lines):
+        index = io.read_frame_index(io.framed_file_path(documents_path))
+        if index is None:
+            return False
+        _, lines, size, _ = index
+        if (uncompressed_size is not None and size != uncompressed_size) or (number_of_lines is not None and lines != number_of_lines):
+            self.logger.warning("Ignoring [%s] because it contains [%d] lines ([%d] bytes) but [%s] lines ([%s] bytes) are expected.",
+                                io.framed_file_path(documents_path), lines, size, number_of_lines, uncompressed_size)
+            return False
+        return True
+
+    def convert(self, archive_path, documents_path, number_of_lines):
+        framed_path = io.framed_file_path(documents_path)
+        console.info("Converting track data from [%s] to [%s] ... " % (archive_path, framed_path), end='', flush=True, logger=self.logger)
+        lines_read = io.convert_to_framed(archive_path, framed_path)
+        console.println("[OK]")
+        if number_of_lines is not None and lines_read != number_of_lines:
+            raise exceptions.DataError("Data in [%s] for track [%s] are invalid. Expected [%d] lines but got [%d]."
+                                       % (archive_path, self.track_name, number_of_lines, lines_read))
+
     def is_locally_available(self, file_name):
         return os.path.isfile(file_name)
 
     def has_expected_size(self, file_name, expected_size):
         return expected_size is None or os.path.getsize(file_name) == expected_size
 
-    def decompress(self, archive_path, documents_path, uncompressed_size):
+    def decompress(self, archive_path, documents_path, uncompressed_size, number_of_lines=None):
         if uncompressed_size:
             console.info("Decompressing track data from [%s] to [%s] (resulting size: %.2f GB) ... " %
                          (archive_path, documents_path, convert.bytes_to_gb(uncompressed_size)),
@@ -290,8 +357,13 @@ class DocumentSetPreparator:
             console.info("Decompressing track data from [%s] to [%s] ... " % (archive_path, documents_path), end='',
                          flush=True, logger=self.logger)
 
-        io.decompress(archive_path, io.dirname(archive_path))
+        # the file offset table is built in the same pass
+        lines_read = io.decompress(archive_path, io.dirname(archive_path), workers=self.decompression_workers, offset_table=True,
+                                   offset_table_stride=self.offset_table_stride)
         console.println("[OK]")
+        self.check_decompressed(archive_path, documents_path, uncompressed_size, number_of_lines, lines_read)
+
+    def check_decompressed(self, archive_path, documents_path, uncompressed_size, number_of_lines, lines_read):
         if not os.path.isfile(documents_path):
             raise exceptions.DataError("Decompressing [%s] did not create [%s]. Please check with the track author if the compressed "
                                        "archive has been created correctly." % (archive_path, documents_path))
@@ -300,8 +372,27 @@ class DocumentSetPreparator:
         if uncompressed_size is not None and extracted_bytes != uncompressed_size:
             raise exceptions.DataError("[%s] is corrupt. Extracted [%d] bytes but [%d] bytes are expected." %
                                        (documents_path, extracted_bytes, uncompressed_size))
+        self.check_number_of_lines(documents_path, number_of_lines, lines_read)
 
-    def download(self, base_url, target_path, size_in_bytes, detail_on_missing_root_url):
+    def download_and_decompress(self, base_url, archive_path, documents_path, size_in_bytes, uncompressed_size, number_of_lines,
+                                detail_on_missing_root_url):
+        decompressor = io.StreamingDecompressor(archive_path, io.dirname(archive_path), offset_table=True,
+                                                offset_table_stride=self.offset_table_stride)
+        self.logger.info("Decompressing [%s] to [%s] while downloading.", archive_path, documents_path)
+        try:
+            self.download(base_url, archive_path, size_in_bytes, detail_on_missing_root_url, chunk_consumer=decompressor)
+        except BaseException:
+            decompressor.abort()
+            raise
+        try:
+            lines_read = decompressor.finish()
+        except RuntimeError:
+            self.logger.exception("Could not decompress [%s] while downloading.", archive_path)
+            raise exceptions.DataError("Could not decompress [%s]. Please check with the track author if the compressed archive has been "
+                                       "created correctly." % archive_path)
+        self.check_decompressed(archive_path, documents_path, uncompressed_size, number_of_lines, lines_read)
+
+    def download(self, base_url, target_path, size_in_bytes, detail_on_missing_root_url, chunk_consumer=None):
         file_name = os.path.basename(target_path)
 
         if not base_url:
@@ -321,7 +412,7 @@ class DocumentSetPreparator:
 
             # we want to have a bit more accurate download progress as these files are typically very large
             progress = net.Progress("[INFO] Downloading data for track %s" % self.track_name, accuracy=1)
-            net.download(data_url, target_path, size_in_bytes, progress_indicator=progress)
+            net.download(data_url, target_path, size_in_bytes, progress_indicator=progress, chunk_consumer=chunk_consumer)
             progress.finish()
             self.logger.info("Downloaded data from [%s] to [%s].", data_url, target_path)
         except urllib.error.HTTPError as e:
@@ -350,12 +441,15 @@ class DocumentSetPreparator:
                                        (target_path, actual_size, size_in_bytes))
 
     def create_file_offset_table(self, document_file_path, expected_number_of_lines):
-        # just rebuild the file every time for the time being. Later on, we might check the data file fingerprint to avoid it
-        lines_read = io.prepare_file_offset_table(document_file_path)
-        if lines_read and lines_read != expected_number_of_lines:
+        # the file offset table is only rebuilt if the fingerprint of the data file has changed
+        lines_read = io.prepare_file_offset_table(document_file_path, stride=self.offset_table_stride)
+        self.check_number_of_lines(document_file_path, expected_number_of_lines, lines_read)
+
+    def check_number_of_lines(self, document_file_path, expected_number_of_lines, lines_read):
+        if lines_read and expected_number_of_lines is not None and lines_read != expected_number_of_lines:
             io.remove_file_offset_table(document_file_path)
             raise exceptions.DataError("Data in [%s] for track [%s] are invalid. Expected [%d] lines but got [%d]."
-                                       % (document_file_path, track, expected_number_of_lines, lines_read))
+                                       % (document_file_path, self.track_name, expected_number_of_lines, lines_read))
 
     def prepare_document_set(self, document_set, data_root):
         """
@@ -379,10 +473,16 @@ class DocumentSetPreparator:
             if self.is_locally_available(doc_path) and \
                     self.has_expected_size(doc_path, document_set.uncompressed_size_in_bytes):
                 break
+            elif self.is_framed_file_available(doc_path, document_set.uncompressed_size_in_bytes, document_set.number_of_lines):
+                # framed files are seekable on their own and need no file offset table
+                return
             elif document_set.has_compressed_corpus() and \
                     self.is_locally_available(archive_path) and \
                     self.has_expected_size(archive_path, document_set.compressed_size_in_bytes):
-                self.decompress(archive_path, doc_path, document_set.uncompressed_size_in_bytes)
+                if self.framed:
+                    self.convert(archive_path, doc_path, document_set.number_of_lines)
+                else:
+                    self.decompress(archive_path, doc_path, document_set.uncompressed_size_in_bytes, document_set.number_of_lines)
             else:
                 if document_set.has_compressed_corpus():
                     target_path = archive_path
@@ -400,7 +500,11 @@ class DocumentSetPreparator:
                 else:
                     msg = "%s is missing" % target_path
 
-                self.download(document_set.base_url, target_path, expected_size, msg)
+                if target_path == archive_path and self.can_decompress_while_downloading(archive_path, doc_path):
+                    self.download_and_decompress(document_set.base_url, archive_path, doc_path, expected_size,
+                                                 document_set.uncompressed_size_in_bytes, document_set.number_of_lines, msg)
+                else:
+                    self.download(document_set.base_url, target_path, expected_size, msg)
 
         self.create_file_offset_table(doc_path, document_set.number_of_lines)
 
@@ -435,9 +539,15 @@ class DocumentSetPreparator:
                     raise exceptions.DataError("%s is present but does not have the expected size of %s bytes." %
                                                (doc_path, str(document_set.uncompressed_size_in_bytes)))
 
+            if self.is_framed_file_available(doc_path, document_set.uncompressed_size_in_bytes, document_set.number_of_lines):
+                return True
+
             if document_set.has_compressed_corpus() and self.is_locally_available(archive_path):
                 if self.has_expected_size(archive_path, document_set.compressed_size_in_bytes):
-                    self.decompress(archive_path, doc_path, document_set.uncompressed_size_in_bytes)
+                    if self.framed:
+                        self.convert(archive_path, doc_path, document_set.number_of_lines)
+                    else:
+                        self.decompress(archive_path, doc_path, document_set.uncompressed_size_in_bytes, document_set.number_of_lines)
                 else:
                     # treat this is an error because if the file is present but the size does not match, something is really fishy.
                     # It is likely that the user is currently creating a new track and did not specify the file size correctly.
@@ -1,7 +1,20 @@
+import bisect
+import calendar
+import copy
+import gzip
+import hashlib
+import json
 import logging
+import os
+import queue
 import random
+import threading
 import time
+import weakref
 import math
+import string
+import struct
+import tempfile
 import types
 import operator
 from enum import Enum
@@ -330,6 +343,11 @@ class SearchParamSource(ParamSource):
             self.query_params["pages"] = pages
         if results_per_page:
             self.query_params["results-per-page"] = results_per_page
+        filter_response = params.get("filter-response", False)
+        if not isinstance(filter_response, bool):
+            raise exceptions.InvalidSyntax("'filter-response' must be a boolean but was [%s]" % filter_response)
+        if filter_response:
+            self.query_params["filter-response"] = True
 
         self.query_body_params = []
         if query_body_params:
@@ -350,6 +368,48 @@ class SearchParamSource(ParamSource):
 
                     self.query_body_params.append((query_body_path, data))
 
+        self.body_template = None
+        serialize_body = params.get("serialize-body", False)
+        if not isinstance(serialize_body, bool):
+            raise exceptions.InvalidSyntax("'serialize-body' must be a boolean but was [%s]" % serialize_body)
+        if serialize_body and query_body is not None:
+            self.body_template = self.compile_body(query_body, self.query_body_params)
+            if not self.query_body_params:
+                # without any slots the template consists of the complete body
+                fragments, _ = self.body_template
+                self.query_params["body"] = fragments[0]
+
+    @staticmethod
+    def serialize(v):
+        # same representation as elasticsearch-py's JSONSerializer
+        return json.dumps(v, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def compile_body(self, body, body_params):
+        """
+        Serializes the query body once into a template. Each body parameter is represented by a slot between two fragments of the
+        template. All choices for a slot are serialized upfront as well so rendering a body is just joining bytes.
+
+        :return: A tuple of the template fragments and a list of serialized choices for each slot.
+        """
+        body = copy.deepcopy(body)
+        markers = []
+        for slot, (path, _) in enumerate(body_params):
+            marker = "\u0000rally-slot-%d\u0000" % slot
+            self.set_in_dict(body, path, marker)
+            markers.append(self.serialize(marker))
+        serialized = self.serialize(body)
+        # slots may occur in a different order in the serialized body than in the body parameters
+        slots = sorted(range(len(markers)), key=lambda slot: serialized.index(markers[slot]))
+        fragments = []
+        start = 0
+        for slot in slots:
+            end = serialized.index(markers[slot], start)
+            fragments.append(serialized[start:end])
+            start = end + len(markers[slot])
+        fragments.append(serialized[start:])
+        choices = [[self.serialize(v) for v in body_params[slot][1]] for slot in slots]
+        return fragments, choices
+
     def get_from_dict(self, d, path):
         v = d
         for k in path:
@@ -365,13 +425,78 @@ class SearchParamSource(ParamSource):
         v[path[-1]] = val
 
     def params(self, choice=random.choice):
-        if self.query_body_params:
+        if self.body_template and self.query_body_params:
+            fragments, choices = self.body_template
+            body = [fragments[0]]
+            for fragment, data in zip(fragments[1:], choices):
+                body.append(choice(data))
+                body.append(fragment)
+            self.query_params["body"] = b"".join(body)
+        elif self.query_body_params:
             # needs to replace params first
             for path, data in self.query_body_params:
                 self.set_in_dict(self.query_params["body"], path, choice(data))
         return self.query_params
 
 
+class SlicedScrollParamSource(SearchParamSource):
+    """
+    Creates the parameters for a scroll query that is split into ``slices`` slices which are retrieved in parallel. In addition to the
+    parameters of a search, it supports:
+
+    * ``slices`` (mandatory): The number of slices.
+    * ``pages`` (optional, defaults to "all"): The maximum number of pages to retrieve per slice.
+    * ``results-per-page`` (optional): The number of documents to retrieve per page.
+    """
+    def __init__(self, track, params, **kwargs):
+        super().__init__(track, params, **kwargs)
+        slices = params.get("slices")
+        if not isinstance(slices, int) or isinstance(slices, bool) or slices < 1:
+            raise exceptions.InvalidSyntax("'slices' must be a positive integer but was [%s]" % slices)
+        if self.body_template:
+            raise exceptions.InvalidSyntax("'serialize-body' is not supported for operation type 'sliced-scroll'")
+        self.query_params["slices"] = slices
+        if "pages" not in self.query_params:
+            self.query_params["pages"] = "all"
+
+
+class MultiSearchParamSource(ParamSource):
+    """
+    Creates the parameters for a multi search request that contains ``searches`` searches. Each search is created by a
+    ``SearchParamSource`` with the same parameters so ``body-params`` are chosen separately for each search in the request.
+    """
+    def __init__(self, track, params, **kwargs):
+        super().__init__(track, params, **kwargs)
+        searches = params.get("searches")
+        if not isinstance(searches, int) or isinstance(searches, bool) or searches < 1:
+            raise exceptions.InvalidSyntax("'searches' must be a positive integer but was [%s]" % searches)
+        if "pages" in params or "results-per-page" in params:
+            raise exceptions.InvalidSyntax("Scroll queries are not supported for operation type 'msearch'")
+        self.searches = searches
+        self.search_param_source = SearchParamSource(track, params, **kwargs)
+        self.msearch_params = {
+            "searches": searches,
+            "request-params": params.get("request-params", {})
+        }
+        if self.search_param_source.query_params.get("filter-response"):
+            self.msearch_params["filter-response"] = True
+
+    def params(self, choice=random.choice):
+        lines = []
+        for _ in range(self.searches):
+            # the search parameter source reuses its parameters so we serialize each search immediately
+            search = self.search_param_source.params(choice=choice)
+            header = {"index": search["index"], "request_cache": search["cache"]}
+            if search["type"]:
+                header["type"] = search["type"]
+            lines.append(SearchParamSource.serialize(header))
+            body = search["body"]
+            lines.append(body if isinstance(body, bytes) else SearchParamSource.serialize(body))
+        lines.append(b"")
+        self.msearch_params["body"] = b"\n".join(lines)
+        return self.msearch_params
+
+
 class IndexIdConflict(Enum):
     """
     Determines which id conflicts to simulate during indexing.
@@ -425,26 +550,70 @@ class BulkIndexParamSource(ParamSource):
 
         self.pipeline = params.get("pipeline", None)
         try:
-            self.bulk_size = int(params["bulk-size"])
-            if self.bulk_size <= 0:
-                raise exceptions.InvalidSyntax("'bulk-size' must be positive but was %d" % self.bulk_size)
+            self.bulk_size_bytes = params.get("bulk-size-bytes")
+            if self.bulk_size_bytes is not None:
+                self.bulk_size_bytes = int(self.bulk_size_bytes)
+                if self.bulk_size_bytes <= 0:
+                    raise exceptions.InvalidSyntax("'bulk-size-bytes' must be positive but was %d" % self.bulk_size_bytes)
+        except ValueError:
+            raise exceptions.InvalidSyntax("'bulk-size-bytes' must be numeric")
+
+        try:
+            self.bulk_size = params["bulk-size"] if self.bulk_size_bytes is None else params.get("bulk-size")
+            # with 'bulk-size-bytes' the number of documents per bulk is optional
+            if self.bulk_size is not None:
+                self.bulk_size = int(self.bulk_size)
+                if self.bulk_size <= 0:
+                    raise exceptions.InvalidSyntax("'bulk-size' must be positive but was %d" % self.bulk_size)
         except KeyError:
             raise exceptions.InvalidSyntax("Mandatory parameter 'bulk-size' is missing")
         except ValueError:
             raise exceptions.InvalidSyntax("'bulk-size' must be numeric")
 
         try:
-            self.batch_size = int(params.get("batch-size", self.bulk_size))
+            # without 'bulk-size' we read one bulk at a time
+            self.batch_size = int(params.get("batch-size", self.bulk_size if self.bulk_size is not None else 1))
             if self.batch_size <= 0:
                 raise exceptions.InvalidSyntax("'batch-size' must be positive but was %d" % self.batch_size)
-            if self.batch_size < self.bulk_size:
-                raise exceptions.InvalidSyntax("'batch-size' must be greater than or equal to 'bulk-size'")
-            if self.batch_size % self.bulk_size != 0:
-                raise exceptions.InvalidSyntax("'batch-size' must be a multiple of 'bulk-size'")
+            if self.bulk_size is not None:
+                if self.batch_size < self.bulk_size:
+                    raise exceptions.InvalidSyntax("'batch-size' must be greater than or equal to 'bulk-size'")
+                if self.batch_size % self.bulk_size != 0:
+                    raise exceptions.InvalidSyntax("'batch-size' must be a multiple of 'bulk-size'")
         except ValueError:
             raise exceptions.InvalidSyntax("'batch-size' must be numeric")
 
         self.ingest_percentage = self.float_param(params, name="ingest-percentage", default_value=100, min_value=0, max_value=100)
+        self.zero_copy = params.get("zero-copy", False)
+        if not isinstance(self.zero_copy, bool):
+            raise exceptions.InvalidSyntax("'zero-copy' must be a boolean but was [%s]" % self.zero_copy)
+
+        try:
+            self.prefetch = int(params.get("prefetch", 0))
+            if self.prefetch < 0:
+                raise exceptions.InvalidSyntax("'prefetch' must be non-negative but was %d" % self.prefetch)
+        except ValueError:
+            raise exceptions.InvalidSyntax("'prefetch' must be numeric")
+
+        try:
+            retry_rejected = int(params.get("retry-rejected", 0))
+            if retry_rejected < 0:
+                raise exceptions.InvalidSyntax("'retry-rejected' must be non-negative but was %d" % retry_rejected)
+        except ValueError:
+            raise exceptions.InvalidSyntax("'retry-rejected' must be numeric")
+        for key in ["retry-initial-backoff", "retry-max-backoff"]:
+            try:
+                if key in params and float(params[key]) <= 0:
+                    raise exceptions.InvalidSyntax("'%s' must be positive but was %s" % (key, params[key]))
+            except (TypeError, ValueError):
+                raise exceptions.InvalidSyntax("'%s' must be numeric" % key)
+
+        self.bulk_pack = params.get("bulk-pack", False)
+        if not isinstance(self.bulk_pack, bool):
+            raise exceptions.InvalidSyntax("'bulk-pack' must be a boolean but was [%s]" % self.bulk_pack)
+        self.precompress = params.get("precompress", False)
+        if not isinstance(self.precompress, bool):
+            raise exceptions.InvalidSyntax("'precompress' must be a boolean but was [%s]" % self.precompress)
 
     def float_param(self, params, name, default_value, min_value, max_value, min_operator=operator.le):
         try:
@@ -480,7 +649,8 @@ class BulkIndexParamSource(ParamSource):
     def partition(self, partition_index, total_partitions):
         return PartitionBulkIndexParamSource(self.corpora, partition_index, total_partitions, self.batch_size, self.bulk_size,
                                              self.ingest_percentage, self.id_conflicts, self.conflict_probability, self.on_conflict,
-                                             self.recency, self.pipeline, self._params)
+                                             self.recency, self.pipeline, self._params, self.zero_copy, self.prefetch,
+                                             self.bulk_pack, self.precompress, self.bulk_size_bytes)
 
     def params(self):
         raise exceptions.RallyError("Do not use a BulkIndexParamSource without partitioning")
@@ -491,14 +661,16 @@ class BulkIndexParamSource(ParamSource):
 
 class PartitionBulkIndexParamSource:
     def __init__(self, corpora, partition_index, total_partitions, batch_size, bulk_size, ingest_percentage,
-                 id_conflicts, conflict_probability, on_conflict, recency, pipeline=None, original_params=None):
+                 id_conflicts, conflict_probability, on_conflict, recency, pipeline=None, original_params=None, zero_copy=False,
+                 prefetch=0, bulk_pack=False, precompress=False, bulk_size_bytes=None):
         """
 
         :param corpora: Specification of affected document corpora.
         :param partition_index: The current partition index.  Must be in the range [0, `total_partitions`).
         :param total_partitions: The total number of partitions (i.e. clients) for bulk index operations.
         :param batch_size: The number of documents to read in one go.
-        :param bulk_size: The size of bulk index operations (number of documents per bulk).
+        :param bulk_size: The size of bulk index operations (number of documents per bulk). May be ``None`` if ``bulk_size_bytes`` is
+                          provided.
         :param ingest_percentage: A number between (0.0, 100.0] that defines how much of the whole corpus should be ingested.
         :param id_conflicts: The type of id conflicts.
         :param conflict_probability: A number between (0.0, 100.0] that defines the probability that a document is replaced by another one.
@@ -507,18 +679,47 @@ class PartitionBulkIndexParamSource:
                         May be None.
         :param pipeline: The name of the ingest pipeline to run.
         :param original_params: The original dict passed to the parent parameter source.
+        :param zero_copy: Whether bulk bodies should be passed as raw bytes from a memory-mapped file for document sets that already
+                          contain an action and meta-data line.
+        :param prefetch: The number of bulk requests to prepare ahead in a background thread. ``0`` disables prefetching.
+        :param bulk_pack: Whether bulk request bodies should be read from a bulk pack file. If no bulk pack exists for this partition
+                          yet, it is written while the bulk requests are generated as usual.
+        :param precompress: Whether bulk request bodies should be gzip-compressed when they are generated (and thus only once if they
+                            are stored in a bulk pack).
+        :param bulk_size_bytes: If provided, a bulk is complete as soon as the size of its documents (including action and meta-data
+                                lines that are contained in the document file) reaches this number of bytes.
         """
         self.corpora = corpora
         self.partition_index = partition_index
         self.total_partitions = total_partitions
         self.batch_size = batch_size
         self.bulk_size = bulk_size
+        self.bulk_size_bytes = bulk_size_bytes
         self.ingest_percentage = ingest_percentage
         self.id_conflicts = id_conflicts
         self.pipeline = pipeline
-        self.internal_params = bulk_data_based(total_partitions, partition_index, corpora, batch_size,
-                                               bulk_size, id_conflicts, conflict_probability, on_conflict, recency,
-                                               pipeline, original_params)
+        self.create_reader = create_zero_copy_reader if zero_copy else create_default_reader
+        self.all_bulks = None
+        create_reader = self.create_reader
+        if bulk_pack:
+            pack_path = bulk_pack_path(corpora, partition_index, total_partitions, bulk_size, id_conflicts, conflict_probability,
+                                       on_conflict, recency, zero_copy, precompress, bulk_size_bytes)
+            readers = create_bulk_pack_readers(pack_path, total_partitions, partition_index, corpora, batch_size, bulk_size,
+                                               id_conflicts, conflict_probability, on_conflict, recency, create_reader, precompress,
+                                               bulk_size_bytes)
+            self.internal_params = bulk_generator(readers, partition_index, pipeline, original_params)
+        elif precompress or bulk_size_bytes:
+            readers = chain(*create_readers(total_partitions, partition_index, corpora, batch_size, bulk_size, id_conflicts,
+                                            conflict_probability, on_conflict, recency, create_reader, bulk_size_bytes))
+            if precompress:
+                readers = compress_bulks(readers)
+            self.internal_params = bulk_generator(readers, partition_index, pipeline, original_params)
+        else:
+            self.internal_params = bulk_data_based(total_partitions, partition_index, corpora, batch_size,
+                                                   bulk_size, id_conflicts, conflict_probability, on_conflict, recency,
+                                                   pipeline, original_params, create_reader=create_reader)
+        if prefetch > 0:
+            self.internal_params = BulkPrefetcher(self.internal_params, prefetch)
 
     def partition(self, partition_index, total_partitions):
         raise exceptions.RallyError("Cannot partition a PartitionBulkIndexParamSource further")
@@ -526,15 +727,356 @@ class PartitionBulkIndexParamSource:
     def params(self):
         return next(self.internal_params)
 
+    def close(self):
+        """
+        Releases all resources (open files, a prefetching thread and prepared bulk requests) before all bulks have been generated.
+        """
+        self.internal_params.close()
+
     def size(self):
-        all_bulks = number_of_bulks(self.corpora, self.partition_index, self.total_partitions, self.bulk_size)
-        return math.ceil((all_bulks * self.ingest_percentage) / 100)
+        # counting bulks by size requires to read all documents so we do that only once
+        if self.all_bulks is None:
+            self.all_bulks = number_of_bulks(self.corpora, self.partition_index, self.total_partitions, self.bulk_size,
+                                             self.bulk_size_bytes, self.batch_size, self.create_reader)
+        return math.ceil((self.all_bulks * self.ingest_percentage) / 100)
+
+
+class BulkPrefetcher:
+    """
+    Prepares bulk requests in a background thread so reading and assembling the next bulk bodies is not on the critical path between
+    two bulk requests. At most ``depth`` bulk requests are prepared ahead.
+
+    Each returned parameter dict is enriched with:
+
+    * ``prefetch-queue-depth``: The number of prepared bulk requests that were available when the request has been taken.
+    * ``prefetch-stall-time``: The time in milliseconds that the client had to wait for the bulk request to be prepared.
+    """
+    # marks the end of the underlying bulk generator
+    _END = object()
+
+    def __init__(self, bulks, depth):
+        """
+        :param bulks: An iterator of bulk request parameters.
+        :param depth: The maximum number of bulk requests to prepare ahead. Must be positive.
+        """
+        self.bulks = bulks
+        self.queue = queue.Queue(maxsize=depth)
+        self.stopped = threading.Event()
+        self.thread = None
+        self.exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.exhausted:
+            raise StopIteration()
+        if self.thread is None:
+            self.start()
+        queue_depth = self.queue.qsize()
+        start = time.perf_counter()
+        bulk, error = self.queue.get()
+        stall_time = time.perf_counter() - start
+        if bulk is BulkPrefetcher._END:
+            self.exhausted = True
+            raise StopIteration()
+        if error is not None:
+            self.exhausted = True
+            raise error
+        bulk["prefetch-queue-depth"] = queue_depth
+        bulk["prefetch-stall-time"] = stall_time * 1000
+        return bulk
+
+    def start(self):
+        # the producer must not reference this object, otherwise it would never be garbage-collected (and thus never stopped).
+        self.thread = threading.Thread(target=BulkPrefetcher._produce, args=(self.bulks, self.queue, self.stopped),
+                                       name="bulk-prefetcher", daemon=True)
+        # only a safety net if the prefetcher is not closed explicitly
+        weakref.finalize(self, self.stopped.set)
+        self.thread.start()
+
+    def close(self):
+        """
+        Stops the producer thread, closes the underlying bulk iterator and discards all prepared bulk requests.
+        """
+        self.exhausted = True
+        self.stopped.set()
+        if self.thread is None:
+            close_iterable(self.bulks)
+        else:
+            # the producer notices within its put timeout (or after it has prepared the current bulk) and closes the bulk iterator
+            self.thread.join()
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+    @staticmethod
+    def _produce(bulks, q, stopped):
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        try:
+            for bulk in bulks:
+                if not put((bulk, None)):
+                    return
+            put((BulkPrefetcher._END, None))
+        except BaseException as e:
+            put((None, e))
+        finally:
+            # closes the underlying file handles
+            close_iterable(bulks)
+
+
+BULK_PACK_MAGIC = b"RLYPCK01"
+# magic, number of bulks, number of documents
+BULK_PACK_HEADER = struct.Struct("<8sQQ")
+# body size in bytes, number of documents, index name length, type name length; followed by index name, type name and body
+BULK_PACK_RECORD_HEADER = struct.Struct("<QIHH")
+# marks a missing type name
+BULK_PACK_NO_TYPE = 0xFFFF
+# zlib's default trade-off between speed and compression ratio
+BULK_COMPRESSION_LEVEL = 6
+
+
+def bulk_pack_path(corpora, partition_index, total_partitions, bulk_size, id_conflicts, conflict_probability, on_conflict, recency,
+                   zero_copy, precompress=False, bulk_size_bytes=None):
+    """
+    Determines the path of the bulk pack for the given partition. The file name is derived from everything that influences the bulk
+    request bodies so a changed document file or changed bulk parameters never reuse a stale bulk pack.
+
+    :return: The path of the bulk pack file. It is placed in a ``bulk-packs`` directory next to the first document file.
+    """
+    key = hashlib.sha1()
+    key.update(repr((partition_index, total_partitions, bulk_size, id_conflicts.name, conflict_probability, on_conflict, recency,
+                     zero_copy, precompress, bulk_size_bytes)).encode("utf-8"))
+    document_files = []
+    for corpus in corpora:
+        for docs in corpus.documents:
+            data_file = io.framed_file_path(docs.document_file) if io.has_framed_file_only(docs.document_file) else docs.document_file
+            size, digest = io.fingerprint(data_file)
+            key.update(repr((docs.target_index, docs.target_type, docs.number_of_documents, docs.includes_action_and_meta_data,
+                             size)).encode("utf-8"))
+            key.update(digest)
+            document_files.append(docs.document_file)
+    if not document_files:
+        raise exceptions.RallyAssertionError("Cannot create a bulk pack without document files.")
+    return os.path.join(os.path.dirname(document_files[0]), "bulk-packs",
+                        "%s-%d-of-%d.pack" % (key.hexdigest(), partition_index + 1, total_partitions))
+
+
+def read_bulk_pack_header(pack_path):
+    """
+    :param pack_path: Path to a bulk pack file.
+    :return: A tuple of the number of bulks and documents in the bulk pack or ``None`` if there is no (valid) bulk pack.
+    """
+    try:
+        with open(pack_path, mode="rb") as f:
+            header = f.read(BULK_PACK_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) != BULK_PACK_HEADER.size or not header.startswith(BULK_PACK_MAGIC):
+        return None
+    _, bulks, docs = BULK_PACK_HEADER.unpack(header)
+    return bulks, docs
+
+
+def create_bulk_pack_readers(pack_path, num_clients, client_index, corpora, batch_size, bulk_size, id_conflicts, conflict_probability,
+                             on_conflict, recency, create_reader, precompress=False, bulk_size_bytes=None):
+    """
+    Reads bulks from the bulk pack at ``pack_path`` if it exists. Otherwise bulks are generated from the document files and written to
+    the bulk pack at the same time.
+
+    :return: An iterable that provides the same tuples of index, type and batch as the chained document readers.
+    """
+    logger = logging.getLogger(__name__)
+    header = read_bulk_pack_header(pack_path)
+    if header:
+        bulks, docs = header
+        logger.info("Reading [%d] bulks with [%d] docs from bulk pack [%s].", bulks, docs, pack_path)
+        return chain(BulkPackReader(pack_path))
+    else:
+        logger.info("Bulk pack [%s] does not exist yet. Writing it while generating bulks.", pack_path)
+        readers = create_readers(num_clients, client_index, corpora, batch_size, bulk_size, id_conflicts, conflict_probability,
+                                 on_conflict, recency, create_reader, bulk_size_bytes)
+        readers = chain(*readers)
+        if precompress:
+            readers = compress_bulks(readers)
+        expected_bulks = number_of_bulks(corpora, client_index, num_clients, bulk_size, bulk_size_bytes, batch_size, create_reader)
+        return write_through(readers, BulkPackWriter(pack_path), expected_bulks)
+
+
+def serialize_bulk(bulk):
+    """
+    :param bulk: A bulk request body, either as a list of lines or as ``bytes``.
+    :return: The bulk request body as ``bytes`` exactly as the Elasticsearch client would send it.
+    """
+    if isinstance(bulk, bytes):
+        return bulk
+    return ("\n".join(bulk) + "\n").encode("utf-8")
+
+
+def compress_bulks(readers, compresslevel=BULK_COMPRESSION_LEVEL):
+    """
+    gzip-compresses the body of every bulk so it can be sent with ``Content-Encoding: gzip`` without compressing it at request time.
+
+    :param readers: An iterable of tuples of index, type and batch.
+    :param compresslevel: The gzip compression level.
+    """
+    for index, type, batch in readers:
+        yield index, type, [(docs_in_bulk, gzip.compress(serialize_bulk(bulk), compresslevel)) for docs_in_bulk, bulk in batch]
 
 
-def number_of_bulks(corpora, partition_index, total_partitions, bulk_size):
+def write_through(readers, writer, expected_bulks):
     """
+    Writes every bulk to a bulk pack and replaces its body with the exact bytes that have been written. The bulk pack is only
+    published if all bulks have been generated (i.e. not if ``ingest-percentage`` is less than 100 or the benchmark is aborted).
+
+    :param readers: An iterable of tuples of index, type and batch.
+    :param writer: A ``BulkPackWriter``.
+    :param expected_bulks: The number of bulks of a complete bulk pack.
+    """
+    writer.open()
+    try:
+        for index, type, batch in readers:
+            batch = [(docs_in_bulk, writer.write(index, type, docs_in_bulk, bulk)) for docs_in_bulk, bulk in batch]
+            # Rally stops requesting bulks after the last one so we cannot wait until the readers are exhausted.
+            if writer.bulks == expected_bulks:
+                writer.close()
+            yield index, type, batch
+    finally:
+        # runs as soon as the parameter source is closed, i.e. also if the task ends before all bulks have been generated
+        writer.abort()
+        close_iterable(readers)
+
+
+class BulkPackWriter:
+    """
+    Writes a bulk pack file. A bulk pack contains the exact request body of each bulk request of one client as a length-prefixed byte
+    blob together with the number of documents, the target index and the target type.
+
+    The bulk pack is written to a uniquely named temporary file in the same directory first and only renamed to its final name on
+    ``close()``. Hence, concurrent benchmarks that write the same bulk pack never write to the same file and readers only ever see
+    complete bulk packs.
+    """
+    def __init__(self, pack_path):
+        self.pack_path = pack_path
+        self.tmp_path = None
+        self.f = None
+        self.bulks = 0
+        self.docs = 0
+
+    def open(self):
+        pack_dir, pack_name = os.path.split(self.pack_path)
+        io.ensure_dir(pack_dir)
+        fd, self.tmp_path = tempfile.mkstemp(prefix="%s." % pack_name, suffix=".tmp", dir=pack_dir)
+        self.f = os.fdopen(fd, mode="wb")
+        # written again with the correct values when the bulk pack is complete
+        self.f.write(BULK_PACK_HEADER.pack(b"\0" * len(BULK_PACK_MAGIC), 0, 0))
+        return self
+
+    def write(self, index, type, docs_in_bulk, bulk):
+        """
+        :param bulk: The bulk request body, either as a list of lines or as ``bytes``.
+        :return: The bulk request body as ``bytes`` exactly as it has been written to the bulk pack.
+        """
+        bulk = serialize_bulk(bulk)
+        index_name = index.encode("utf-8")
+        type_name = type.encode("utf-8") if type is not None else b""
+        self.f.write(BULK_PACK_RECORD_HEADER.pack(len(bulk), docs_in_bulk, len(index_name),
+                                                  len(type_name) if type is not None else BULK_PACK_NO_TYPE))
+        self.f.write(index_name)
+        self.f.write(type_name)
+        self.f.write(bulk)
+        self.bulks += 1
+        self.docs += docs_in_bulk
+        return bulk
+
+    def close(self):
+        self.f.seek(0)
+        self.f.write(BULK_PACK_HEADER.pack(BULK_PACK_MAGIC, self.bulks, self.docs))
+        self.f.close()
+        self.f = None
+        os.replace(self.tmp_path, self.pack_path)
+        logging.getLogger(__name__).info("Wrote [%d] bulks with [%d] docs to bulk pack [%s].", self.bulks, self.docs, self.pack_path)
+
+    def abort(self):
+        # the bulk pack is already complete
+        if self.f is None:
+            return
+        self.f.close()
+        self.f = None
+        os.remove(self.tmp_path)
+
+
+class BulkPackReader:
+    """
+    Reads bulks from a memory-mapped bulk pack file. Each bulk is returned as a single ``bytes`` object that is sent as is.
+    """
+    def __init__(self, pack_path):
+        self.pack_path = pack_path
+        self.source = None
+        self.pos = 0
+        self.remaining_bulks = 0
+        # index and type names repeat for all bulks so we decode them only once
+        self.names = {}
+
+    def __enter__(self):
+        self.source = io.MmapSource(self.pack_path).open()
+        magic, self.remaining_bulks, _ = BULK_PACK_HEADER.unpack_from(self.source.mm, 0)
+        if magic != BULK_PACK_MAGIC:
+            raise exceptions.DataError("[%s] is not a valid bulk pack." % self.pack_path)
+        self.pos = BULK_PACK_HEADER.size
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.remaining_bulks == 0:
+            raise StopIteration()
+        self.remaining_bulks -= 1
+        mm = self.source.mm
+        body_size, docs_in_bulk, index_size, type_size = BULK_PACK_RECORD_HEADER.unpack_from(mm, self.pos)
+        pos = self.pos + BULK_PACK_RECORD_HEADER.size
+        if type_size == BULK_PACK_NO_TYPE:
+            names_end = pos + index_size
+        else:
+            names_end = pos + index_size + type_size
+        names = mm[pos:names_end]
+        try:
+            index, type = self.names[names]
+        except KeyError:
+            index = names[:index_size].decode("utf-8")
+            type = names[index_size:].decode("utf-8") if type_size != BULK_PACK_NO_TYPE else None
+            self.names[names] = index, type
+        self.pos = names_end + body_size
+        return index, type, [(docs_in_bulk, mm[names_end:self.pos])]
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.source.close()
+        self.source = None
+        return False
+
+    def __str__(self):
+        return self.pack_path
+
+
+def number_of_bulks(corpora, partition_index, total_partitions, bulk_size, bulk_size_bytes=None, batch_size=None,
+                    create_reader=None):
+    """
+    :param bulk_size_bytes: If provided, bulks are cut by size and ``batch_size`` and ``create_reader`` are mandatory.
     :return: The number of bulk operations that the given client will issue.
     """
+    if bulk_size_bytes is not None:
+        return number_of_bulks_by_size(corpora, partition_index, total_partitions, bulk_size, bulk_size_bytes, batch_size, create_reader)
     bulks = 0
     for corpus in corpora:
         for docs in corpus.documents:
@@ -547,16 +1089,121 @@ def number_of_bulks(corpora, partition_index, total_partitions, bulk_size):
     return bulks
 
 
-def build_conflicting_ids(conflicts, docs_to_index, offset, shuffle=random.shuffle):
+def number_of_bulks_by_size(corpora, partition_index, total_partitions, bulk_size, bulk_size_bytes, batch_size, create_reader):
+    """
+    Determines the exact number of bulks if bulks are cut by size by reading all documents of the given client with the same reader that
+    is used for bulk indexing. Action and meta-data lines that are not contained in the document files do not count towards the size of
+    a bulk so we can skip id conflict generation here.
+
+    :return: The number of bulk operations that the given client will issue.
+    """
+    logger = logging.getLogger(__name__)
+    start = time.perf_counter()
+    bulks = 0
+    for _, _, batch in chain(*create_readers(total_partitions, partition_index, corpora, batch_size, bulk_size,
+                                             IndexIdConflict.NoConflicts, None, None, None, create_reader, bulk_size_bytes)):
+        bulks += len(batch)
+    end = time.perf_counter()
+    logger.info("Counting [%d] bulks of [%d] bytes took [%f] s.", bulks, bulk_size_bytes, end - start)
+    return bulks
+
+
+def build_conflicting_ids(conflicts, docs_to_index, offset, key=None):
+    """
+    Creates the document ids for a client lazily, i.e. in constant memory regardless of the number of documents.
+
+    :param conflicts: The type of id conflicts.
+    :param docs_to_index: The number of documents that the client will index.
+    :param offset: The id of the first document. Each client indexes its own range so we don't get uncontrolled conflicts across clients.
+    :param key: The key of the permutation for random conflicts. Optional. By default a random key is chosen.
+    :return: A sequence of document ids or ``None`` if no id conflicts should be simulated.
+    """
     if conflicts is None or conflicts == IndexIdConflict.NoConflicts:
         return None
-    all_ids = [0] * docs_to_index
-    for i in range(docs_to_index):
-        # always consider the offset as each client will index its own range and we don't want uncontrolled conflicts across clients
-        all_ids[i] = "%10d" % (offset + i)
     if conflicts == IndexIdConflict.RandomConflicts:
-        shuffle(all_ids)
-    return all_ids
+        return PermutedIds(docs_to_index, offset, key if key is not None else random.getrandbits(64))
+    return SequentialIds(docs_to_index, offset)
+
+
+class SequentialIds:
+    """
+    The sequence of ids ``offset``, ``offset + 1``, ... , ``offset + n - 1``. Ids are calculated on access.
+    """
+    def __init__(self, n, offset):
+        self.n = n
+        self.offset = offset
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, index):
+        return "%10d" % (self.offset + self._index(index))
+
+    def _index(self, index):
+        if index < 0:
+            index += self.n
+        if not 0 <= index < self.n:
+            raise IndexError("index [%d] out of range" % index)
+        return index
+
+
+class PermutedIds(SequentialIds):
+    """
+    A pseudo-random permutation of the ids in ``SequentialIds``. Ids are calculated on access with a keyed Feistel network. As a Feistel
+    network is a bijection on the domain [0, 4^k) we get a bijection on [0, n) by applying it repeatedly until the result is in range
+    (cycle-walking). As n > 4^k / 4, this needs less than four iterations on average.
+    """
+    ROUNDS = 4
+    MASK64 = 0xFFFFFFFFFFFFFFFF
+
+    def __init__(self, n, offset, key):
+        super().__init__(n, offset)
+        self.half_bits = max(1, ((n - 1).bit_length() + 1) // 2)
+        self.half_mask = (1 << self.half_bits) - 1
+        # derive a different key for each round
+        self.round_keys = []
+        k = key & PermutedIds.MASK64
+        for _ in range(PermutedIds.ROUNDS):
+            k = PermutedIds._mix(k + 0x9E3779B97F4A7C15)
+            self.round_keys.append(k)
+
+    @staticmethod
+    def _mix(z):
+        # finalizer of splitmix64
+        z &= PermutedIds.MASK64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & PermutedIds.MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & PermutedIds.MASK64
+        return z ^ (z >> 31)
+
+    def _permute(self, x):
+        half_bits = self.half_bits
+        half_mask = self.half_mask
+        shift = 64 - half_bits
+        left = x >> half_bits
+        right = x & half_mask
+        for round_key in self.round_keys:
+            # multiplicative hashing: the high bits of the product depend on all bits of the input
+            left, right = right, left ^ ((((right ^ round_key) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> shift)
+        return (left << half_bits) | right
+
+    def __getitem__(self, index):
+        x = self._index(index)
+        while True:
+            x = self._permute(x)
+            if x < self.n:
+                return "%10d" % (self.offset + x)
+
+
+def close_iterable(iterable):
+    """
+    Closes the provided iterable if it supports it (e.g. a generator). This releases resources like open files immediately if the iterable
+    is not consumed until the end instead of only when it is garbage-collected.
+
+    :param iterable: An iterable. May be ``None``.
+    """
+    close = getattr(iterable, "close", None)
+    if close is not None:
+        close()
 
 
 def chain(*iterables):
@@ -574,8 +1221,8 @@ def chain(*iterables):
 
 
 def create_default_reader(docs, offset, num_lines, num_docs, batch_size, bulk_size, id_conflicts, conflict_probability,
-                          on_conflict, recency):
-    source = Slice(io.FileSource, offset, num_lines)
+                          on_conflict, recency, bulk_size_bytes=None):
+    source = Slice(io.data_file_source, offset, num_lines)
 
     if docs.includes_action_and_meta_data:
         am_handler = SourceActionMetaData(source)
@@ -584,11 +1231,23 @@ def create_default_reader(docs, offset, num_lines, num_docs, batch_size, bulk_si
                                             build_conflicting_ids(id_conflicts, num_docs, offset), conflict_probability,
                                             on_conflict, recency)
 
-    return IndexDataReader(docs.document_file, batch_size, bulk_size, source, am_handler, docs.target_index, docs.target_type)
+    return IndexDataReader(docs.document_file, batch_size, bulk_size, source, am_handler, docs.target_index, docs.target_type,
+                           bulk_size_bytes)
+
+
+def create_zero_copy_reader(docs, offset, num_lines, num_docs, batch_size, bulk_size, id_conflicts, conflict_probability,
+                            on_conflict, recency, bulk_size_bytes=None):
+    # we can only pass the file contents through as is if they already contain an action and meta-data line (and are not compressed)
+    if docs.includes_action_and_meta_data and not io.has_framed_file_only(docs.document_file):
+        return MmapIndexDataReader(docs.document_file, batch_size, bulk_size, io.MmapSource, offset, num_lines, docs.target_index,
+                                   docs.target_type, bulk_size_bytes)
+    else:
+        return create_default_reader(docs, offset, num_lines, num_docs, batch_size, bulk_size, id_conflicts, conflict_probability,
+                                     on_conflict, recency, bulk_size_bytes)
 
 
 def create_readers(num_clients, client_index, corpora, batch_size, bulk_size, id_conflicts, conflict_probability, on_conflict, recency,
-                   create_reader):
+                   create_reader, bulk_size_bytes=None):
     logger = logging.getLogger(__name__)
     readers = []
     for corpus in corpora:
@@ -599,7 +1258,7 @@ def create_readers(num_clients, client_index, corpora, batch_size, bulk_size, id
                 logger.info("Task-relative client at index [%d] will bulk index [%d] docs starting from line offset [%d] for [%s/%s] "
                             "from corpus [%s]." % (client_index, num_docs, offset, docs.target_index, docs.target_type, corpus.name))
                 readers.append(create_reader(docs, offset, num_lines, num_docs, batch_size, bulk_size, id_conflicts, conflict_probability,
-                                             on_conflict, recency))
+                                             on_conflict, recency, bulk_size_bytes))
             else:
                 logger.info("Task-relative client at index [%d] skips [%s] (no documents to read).", client_index, corpus.name)
     return readers
@@ -632,29 +1291,36 @@ def bounds(total_docs, client_index, num_clients, includes_action_and_meta_data)
 
 
 def bulk_generator(readers, client_index, pipeline, original_params):
-    bulk_id = 0
-    for index, type, batch in readers:
-        # each batch can contain of one or more bulks
-        for docs_in_bulk, bulk in batch:
-            bulk_id += 1
-            bulk_params = {
-                "index": index,
-                "type": type,
-                # For our implementation it's always present. Either the original source file already contains this line or the generator
-                # has added it.
-                "action-metadata-present": True,
-                "body": bulk,
-                # This is not always equal to the bulk_size we get as parameter. The last bulk may be less than the bulk size.
-                "bulk-size": docs_in_bulk,
-                # a globally unique id for this bulk
-                "bulk-id": "%d-%d" % (client_index, bulk_id)
-            }
-            if pipeline:
-                bulk_params["pipeline"] = pipeline
-
-            params = original_params.copy()
-            params.update(bulk_params)
-            yield params
+    try:
+        bulk_id = 0
+        for index, type, batch in readers:
+            # each batch can contain of one or more bulks
+            for docs_in_bulk, bulk in batch:
+                bulk_id += 1
+                bulk_params = {
+                    "index": index,
+                    "type": type,
+                    # For our implementation it's always present. Either the original source file already contains this line or the
+                    # generator has added it.
+                    "action-metadata-present": True,
+                    "body": bulk,
+                    # This is not always equal to the bulk_size we get as parameter. The last bulk may be less than the bulk size.
+                    "bulk-size": docs_in_bulk,
+                    # a globally unique id for this bulk
+                    "bulk-id": "%d-%d" % (client_index, bulk_id)
+                }
+                if pipeline:
+                    bulk_params["pipeline"] = pipeline
+                # bulks that are cut by size know their size already (the runner determines the size of raw bodies on its own)
+                if isinstance(bulk, SizedBulk):
+                    bulk_params["bulk-size-bytes"] = bulk.size_bytes
+
+                params = original_params.copy()
+                params.update(bulk_params)
+                yield params
+    finally:
+        # releases open files immediately if not all bulks are requested
+        close_iterable(readers)
 
 
 def bulk_data_based(num_clients, client_index, corpora, batch_size, bulk_size, id_conflicts, conflict_probability, on_conflict, recency,
@@ -758,14 +1424,17 @@ class Slice:
         self.offset = offset
         self.number_of_lines = number_of_lines
         self.current_line = 0
+        self.binary = False
+        self.bytes_read = 0
 
     def open(self, file_name, mode):
         logger = logging.getLogger(__name__)
+        self.binary = "b" in mode
         self.source = self.source_class(file_name, mode).open()
         # skip offset number of lines
         logger.info("Skipping %d lines in [%s].", self.offset, file_name)
         start = time.perf_counter()
-        io.skip_lines(file_name, self.source, self.offset)
+        self.source.skip_lines(self.offset)
         end = time.perf_counter()
         logger.info("Skipping %d lines took %f s.", self.offset, end - start)
         return self
@@ -785,21 +1454,42 @@ class Slice:
             line = self.source.readline()
             if len(line) == 0:
                 raise StopIteration()
-            return line.strip()
+            line = line.strip()
+            if self.binary:
+                # lines are sent stripped and terminated by a newline
+                self.bytes_read += len(line) + 1
+                return line.decode("utf-8")
+            return line
 
     def __str__(self):
         return "%s[%d;%d]" % (self.source, self.offset, self.offset + self.number_of_lines)
 
 
+class SizedBulk(list):
+    """
+    The lines of a bulk request body together with the size of the body in bytes (including newlines).
+    """
+    __slots__ = ("size_bytes",)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.size_bytes = 0
+
+
 class IndexDataReader:
     """
     Reads a file in bulks into an array and also adds a meta-data line before each document if necessary.
 
     This implementation also supports batching. This means that you can specify batch_size = N * bulk_size, where N is any natural
     number >= 1. This makes file reading more efficient for small bulk sizes.
+
+    If ``bulk_size_bytes`` is provided, a bulk is complete as soon as the size of its lines that are read from the file reaches
+    ``bulk_size_bytes`` (or it contains ``bulk_size`` documents if that is not ``None``). The file is then read in binary mode so sizes
+    are measured in bytes (including newlines) without encoding lines again and bulks are cut at the same lines as in
+    ``MmapIndexDataReader``. Each bulk is returned as a ``SizedBulk`` that also knows the size of all of its lines.
     """
 
-    def __init__(self, data_file, batch_size, bulk_size, file_source, action_metadata, index_name, type_name):
+    def __init__(self, data_file, batch_size, bulk_size, file_source, action_metadata, index_name, type_name, bulk_size_bytes=None):
         self.data_file = data_file
         self.batch_size = batch_size
         self.bulk_size = bulk_size
@@ -807,9 +1497,12 @@ class IndexDataReader:
         self.action_metadata = action_metadata
         self.index_name = index_name
         self.type_name = type_name
+        self.bulk_size_bytes = bulk_size_bytes
+        # generated action and meta-data lines contain only ASCII characters apart from the index and type name
+        self.generated_line_overhead = sum(len(name.encode("utf-8")) - len(name) for name in (index_name, type_name) if name)
 
     def __enter__(self):
-        self.file_source.open(self.data_file, 'rt')
+        self.file_source.open(self.data_file, 'rb' if self.bulk_size_bytes else 'rt')
         return self
 
     def __iter__(self):
@@ -836,7 +1529,10 @@ class IndexDataReader:
 
     def read_bulk(self):
         docs_in_bulk = 0
-        current_bulk = []
+        bulk_size_bytes = self.bulk_size_bytes
+        current_bulk = SizedBulk() if bulk_size_bytes else []
+        bytes_read_before = self.file_source.bytes_read if bulk_size_bytes else 0
+        generated_bytes = 0
         for action_metadata_item, document in zip(self.action_metadata, self.file_source):
             if action_metadata_item:
                 action_type, action_metadata_line = action_metadata_item
@@ -845,11 +1541,21 @@ class IndexDataReader:
                     current_bulk.append("{\"doc\":%s}" % document)
                 else:
                     current_bulk.append(document)
+                if bulk_size_bytes and action_type != "source":
+                    generated_bytes += len(action_metadata_line) + self.generated_line_overhead + 1
+                    if action_type == "update":
+                        # the update wrapper around the document
+                        generated_bytes += len("{\"doc\":}")
             else:
                 current_bulk.append(document)
             docs_in_bulk += 1
             if docs_in_bulk == self.bulk_size:
                 break
+            # generated action and meta-data lines do not count so the bulk boundaries do not depend on (random) id conflicts
+            if bulk_size_bytes and self.file_source.bytes_read - bytes_read_before >= bulk_size_bytes:
+                break
+        if bulk_size_bytes:
+            current_bulk.size_bytes = self.file_source.bytes_read - bytes_read_before + generated_bytes
         return docs_in_bulk, current_bulk
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -857,8 +1563,451 @@ class IndexDataReader:
         return False
 
 
+class MmapIndexDataReader:
+    """
+    Reads bulks from a memory-mapped file that already contains an action and meta-data line for each document. Each bulk is returned as
+    a single ``bytes`` object that is sent as is, i.e. lines are neither decoded nor stripped nor joined.
+
+    Like ``IndexDataReader`` this implementation supports batching and cutting bulks by size.
+    """
+
+    def __init__(self, data_file, batch_size, bulk_size, source_class, offset, number_of_lines, index_name, type_name,
+                 bulk_size_bytes=None):
+        self.data_file = data_file
+        self.batch_size = batch_size
+        self.bulk_size = bulk_size
+        self.source_class = source_class
+        self.source = None
+        self.offset = offset
+        self.number_of_lines = number_of_lines
+        self.remaining_lines = number_of_lines
+        self.index_name = index_name
+        self.type_name = type_name
+        self.bulk_size_bytes = bulk_size_bytes
+
+    def __enter__(self):
+        logger = logging.getLogger(__name__)
+        self.source = self.source_class(self.data_file, "rb").open()
+        logger.info("Skipping %d lines in [%s].", self.offset, self.data_file)
+        start = time.perf_counter()
+        io.skip_lines(self.data_file, self.source, self.offset)
+        end = time.perf_counter()
+        logger.info("Skipping %d lines took %f s.", self.offset, end - start)
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        Returns N bulk bodies (where N is bulk_size / batch_size)
+        """
+        batch = []
+        docs_in_batch = 0
+        while docs_in_batch < self.batch_size:
+            docs_in_bulk, bulk = self.read_bulk()
+            if docs_in_bulk == 0:
+                break
+            docs_in_batch += docs_in_bulk
+            batch.append((docs_in_bulk, bulk))
+        if docs_in_batch == 0:
+            raise StopIteration()
+        return self.index_name, self.type_name, batch
+
+    def read_bulk(self):
+        # two lines per document: action and meta-data line and the document itself
+        max_lines = self.remaining_lines if self.bulk_size is None else min(2 * self.bulk_size, self.remaining_lines)
+        lines, bulk = self.source.read_lines(max_lines, max_bytes=self.bulk_size_bytes, lines_per_record=2)
+        self.remaining_lines -= lines
+        return lines // 2, bulk
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.source.close()
+        self.source = None
+        return False
+
+    def __str__(self):
+        return "%s[%d;%d]" % (self.data_file, self.offset, self.offset + self.number_of_lines)
+
+
+class SyntheticBulkParamSource(ParamSource):
+    """
+    Generates bulk requests with synthetic documents based on a declarative field schema instead of reading them from a document corpus.
+
+    All value pools (keyword values, the text vocabulary and their cumulative weights) are computed once upfront from ``seed`` so all
+    clients draw from the same pools. Documents are generated column-wise, i.e. values for a field are drawn for a whole bulk in one go
+    before they are merged into the (pre-compiled) document template.
+    """
+    def __init__(self, track, params, **kwargs):
+        super().__init__(track, params, **kwargs)
+        if len(track.indices) == 1:
+            default_index = track.indices[0].name
+            default_type = track.indices[0].types[0] if len(track.indices[0].types) == 1 else None
+        else:
+            default_index = None
+            default_type = None
+
+        self.index_name = params.get("index", default_index)
+        if not self.index_name:
+            raise exceptions.InvalidSyntax("'index' is mandatory")
+        self.type_name = params.get("type", default_type)
+        self.pipeline = params.get("pipeline", None)
+
+        try:
+            self.bulk_size = int(params["bulk-size"])
+            if self.bulk_size <= 0:
+                raise exceptions.InvalidSyntax("'bulk-size' must be positive but was %d" % self.bulk_size)
+        except KeyError:
+            raise exceptions.InvalidSyntax("Mandatory parameter 'bulk-size' is missing")
+        except ValueError:
+            raise exceptions.InvalidSyntax("'bulk-size' must be numeric")
+
+        try:
+            self.documents = params.get("documents")
+            if self.documents is not None:
+                self.documents = int(self.documents)
+                if self.documents <= 0:
+                    raise exceptions.InvalidSyntax("'documents' must be positive but was %d" % self.documents)
+        except ValueError:
+            raise exceptions.InvalidSyntax("'documents' must be numeric")
+
+        self.seed = params.get("seed", 0)
+        fields = params.get("fields")
+        if not fields or not isinstance(fields, dict):
+            raise exceptions.InvalidSyntax("'fields' is mandatory and must define at least one field")
+        self.schema = SyntheticDocumentSchema(fields, random.Random(self.seed))
+
+    def partition(self, partition_index, total_partitions):
+        if self.documents is None:
+            docs = None
+        else:
+            _, docs, _ = bounds(self.documents, partition_index, total_partitions, includes_action_and_meta_data=False)
+        # derive a separate, reproducible random sequence per client
+        rand = random.Random("%s-%d-%d" % (self.seed, partition_index, total_partitions))
+        reader = SyntheticDataReader(self.schema, rand, docs, self.bulk_size, self.index_name, self.type_name)
+        return PartitionSyntheticBulkParamSource(reader, partition_index, docs, self.bulk_size, self.pipeline, self._params)
+
+    def params(self):
+        raise exceptions.RallyError("Do not use a SyntheticBulkParamSource without partitioning")
+
+    def size(self):
+        raise exceptions.RallyError("Do not use a SyntheticBulkParamSource without partitioning")
+
+
+class PartitionSyntheticBulkParamSource:
+    def __init__(self, reader, partition_index, docs, bulk_size, pipeline=None, original_params=None):
+        """
+
+        :param reader: A ``SyntheticDataReader`` for this partition.
+        :param partition_index: The current partition index.
+        :param docs: The number of documents that this partition generates. ``None`` generates documents indefinitely.
+        :param bulk_size: The size of bulk index operations (number of documents per bulk).
+        :param pipeline: The name of the ingest pipeline to run.
+        :param original_params: The original dict passed to the parent parameter source.
+        """
+        self.docs = docs
+        self.bulk_size = bulk_size
+        self.internal_params = bulk_generator(reader, partition_index, pipeline, original_params)
+
+    def partition(self, partition_index, total_partitions):
+        raise exceptions.RallyError("Cannot partition a PartitionSyntheticBulkParamSource further")
+
+    def params(self):
+        return next(self.internal_params)
+
+    def size(self):
+        if self.docs is None:
+            return None
+        return math.ceil(self.docs / self.bulk_size)
+
+
+class SyntheticDataReader:
+    """
+    Generates synthetic documents in bulks. Like ``IndexDataReader`` it returns one bulk (including an action and meta-data line per
+    document) per iteration.
+    """
+    def __init__(self, schema, rand, docs, bulk_size, index_name, type_name):
+        """
+        :param schema: The ``SyntheticDocumentSchema`` of the generated documents.
+        :param rand: A ``random.Random`` instance that is used to draw values.
+        :param docs: The total number of documents to generate. ``None`` generates documents indefinitely.
+        :param bulk_size: The number of documents per bulk.
+        :param index_name: The name of the target index.
+        :param type_name: The name of the target type. May be ``None``.
+        """
+        self.schema = schema
+        self.rand = rand
+        self.docs_left = docs
+        self.bulk_size = bulk_size
+        self.index_name = index_name
+        self.type_name = type_name
+        if type_name:
+            self.action_metadata_line = '{"index": {"_index": "%s", "_type": "%s"}}' % (index_name, type_name)
+        else:
+            self.action_metadata_line = '{"index": {"_index": "%s"}}' % index_name
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        docs_in_bulk = self.bulk_size if self.docs_left is None else min(self.bulk_size, self.docs_left)
+        if docs_in_bulk <= 0:
+            raise StopIteration()
+        if self.docs_left is not None:
+            self.docs_left -= docs_in_bulk
+        bulk = [self.action_metadata_line] * (2 * docs_in_bulk)
+        bulk[1::2] = self.schema.generate(self.rand.random, docs_in_bulk)
+        return self.index_name, self.type_name, [(docs_in_bulk, bulk)]
+
+
+def random_words(rand, count, min_length=3, max_length=10):
+    """
+    :param rand: A ``random.Random`` instance.
+    :param count: The number of words to generate.
+    :param min_length: The minimum length of a word.
+    :param max_length: The maximum length of a word.
+    :return: A list of ``count`` distinct, random lower-case words.
+    """
+    words = []
+    seen = set()
+    while len(words) < count:
+        word = "".join(rand.choice(string.ascii_lowercase) for _ in range(rand.randint(min_length, max_length)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+class ValuePool:
+    """
+    A precomputed pool of serialized values. Values are either drawn uniformly or, with a positive ``skew``, following a Zipf distribution
+    where the value at position ``i`` is drawn with a probability proportional to ``1 / (i + 1) ** skew``.
+    """
+    def __init__(self, values, skew=0):
+        """
+        :param values: A non-empty list of serialized values.
+        :param skew: The exponent of the Zipf distribution. ``0`` draws values uniformly.
+        """
+        self.values = values
+        if skew > 0:
+            self.cum_weights = []
+            total = 0
+            for rank in range(1, len(values) + 1):
+                total += 1 / rank ** skew
+                self.cum_weights.append(total)
+        else:
+            self.cum_weights = None
+
+    def sample(self, rand, n):
+        values = self.values
+        if self.cum_weights is None:
+            size = len(values)
+            return [values[int(rand() * size)] for _ in range(n)]
+        else:
+            cum_weights = self.cum_weights
+            total = cum_weights[-1]
+            # restrict the upper bound so floating point rounding can never yield an index past the end
+            hi = len(values) - 1
+            return [values[bisect.bisect(cum_weights, rand() * total, 0, hi)] for _ in range(n)]
+
+
+def _int_field_param(name, spec, key, default_value=None, min_value=None):
+    try:
+        value = int(spec.get(key, default_value))
+    except (TypeError, ValueError):
+        raise exceptions.InvalidSyntax("'%s' of field [%s] must be numeric" % (key, name))
+    if min_value is not None and value < min_value:
+        raise exceptions.InvalidSyntax("'%s' of field [%s] must be at least %d but was %d" % (key, name, min_value, value))
+    return value
+
+
+def _float_field_param(name, spec, key, default_value=None, min_value=None):
+    try:
+        value = float(spec.get(key, default_value))
+    except (TypeError, ValueError):
+        raise exceptions.InvalidSyntax("'%s' of field [%s] must be numeric" % (key, name))
+    if min_value is not None and value < min_value:
+        raise exceptions.InvalidSyntax("'%s' of field [%s] must be at least %s but was %s" % (key, name, min_value, value))
+    return value
+
+
+class KeywordField:
+    def __init__(self, name, spec, rand):
+        values = spec.get("values")
+        if values is None:
+            values = random_words(rand, _int_field_param(name, spec, "cardinality", default_value=1000, min_value=1))
+        elif not isinstance(values, list) or len(values) == 0:
+            raise exceptions.InvalidSyntax("'values' of field [%s] must be a non-empty list" % name)
+        self.pool = ValuePool([json.dumps(v) for v in values], _float_field_param(name, spec, "skew", default_value=0, min_value=0))
+
+    def sample(self, rand, n):
+        return self.pool.sample(rand, n)
+
+
+class IntegerField:
+    def __init__(self, name, spec, rand):
+        self.min = _int_field_param(name, spec, "min", default_value=0)
+        self.max = _int_field_param(name, spec, "max", default_value=2 ** 31 - 1)
+        if self.max < self.min:
+            raise exceptions.InvalidSyntax("'max' of field [%s] must be greater than or equal to 'min'" % name)
+
+    def sample(self, rand, n):
+        lower = self.min
+        span = self.max - self.min + 1
+        return [str(lower + int(rand() * span)) for _ in range(n)]
+
+
+class FloatField:
+    def __init__(self, name, spec, rand):
+        self.min = _float_field_param(name, spec, "min", default_value=0)
+        self.max = _float_field_param(name, spec, "max", default_value=1)
+        if self.max < self.min:
+            raise exceptions.InvalidSyntax("'max' of field [%s] must be greater than or equal to 'min'" % name)
+        decimals = spec.get("decimals")
+        self.format = repr if decimals is None else ("%%.%df" % _int_field_param(name, spec, "decimals", min_value=0)).__mod__
+
+    def sample(self, rand, n):
+        lower = self.min
+        span = self.max - self.min
+        fmt = self.format
+        return [fmt(lower + rand() * span) for _ in range(n)]
+
+
+class DateField:
+    INPUT_FORMATS = ["%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d"]
+    OUTPUT_FORMATS = ["iso8601", "epoch_millis", "epoch_second"]
+    SECONDS_PER_DAY = 24 * 60 * 60
+
+    def __init__(self, name, spec, rand):
+        self.start = DateField.parse(name, spec, "start", "2018-01-01")
+        self.end = DateField.parse(name, spec, "end", "2019-01-01")
+        if self.end < self.start:
+            raise exceptions.InvalidSyntax("'end' of field [%s] must not be before 'start'" % name)
+        self.format = spec.get("format", "iso8601")
+        if self.format not in DateField.OUTPUT_FORMATS:
+            raise exceptions.InvalidSyntax("Unknown 'format' [%s] of field [%s]. Supported formats are %s." %
+                                           (self.format, name, DateField.OUTPUT_FORMATS))
+        if self.format == "iso8601":
+            # formatting the date part is by far the most expensive step so we precompute it for each day in the range
+            self.first_day = self.start - self.start % DateField.SECONDS_PER_DAY
+            self.days = [time.strftime('"%Y-%m-%dT', time.gmtime(day))
+                         for day in range(self.first_day, self.end + 1, DateField.SECONDS_PER_DAY)]
+
+    @staticmethod
+    def parse(name, spec, key, default_value):
+        value = spec.get(key, default_value)
+        for date_format in DateField.INPUT_FORMATS:
+            try:
+                return calendar.timegm(time.strptime(value, date_format))
+            except (TypeError, ValueError):
+                pass
+        raise exceptions.InvalidSyntax("'%s' of field [%s] must be a date in one of the formats %s but was [%s]" %
+                                       (key, name, DateField.INPUT_FORMATS, value))
+
+    def sample(self, rand, n):
+        lower = self.start
+        span = self.end - self.start
+        if self.format == "epoch_millis":
+            return [str(int((lower + rand() * span) * 1000)) for _ in range(n)]
+        elif self.format == "epoch_second":
+            return [str(lower + int(rand() * span)) for _ in range(n)]
+        else:
+            days = self.days
+            lower -= self.first_day
+            dates = []
+            for _ in range(n):
+                day, seconds = divmod(lower + int(rand() * span), DateField.SECONDS_PER_DAY)
+                minutes, seconds = divmod(seconds, 60)
+                dates.append('%s%02d:%02d:%02dZ"' % (days[day], minutes // 60, minutes % 60, seconds))
+            return dates
+
+
+class TextField:
+    def __init__(self, name, spec, rand):
+        vocabulary = spec.get("vocabulary")
+        if vocabulary is None:
+            vocabulary = random_words(rand, _int_field_param(name, spec, "vocabulary-size", default_value=10000, min_value=1))
+        elif not isinstance(vocabulary, list) or len(vocabulary) == 0:
+            raise exceptions.InvalidSyntax("'vocabulary' of field [%s] must be a non-empty list" % name)
+        # store words JSON-escaped so they can be joined without serializing each text separately
+        self.words = ValuePool([json.dumps(str(w))[1:-1] for w in vocabulary],
+                               _float_field_param(name, spec, "skew", default_value=1, min_value=0))
+        self.min_words = _int_field_param(name, spec, "min-words", default_value=5, min_value=1)
+        self.max_words = _int_field_param(name, spec, "max-words", default_value=20, min_value=1)
+        if self.max_words < self.min_words:
+            raise exceptions.InvalidSyntax("'max-words' of field [%s] must be greater than or equal to 'min-words'" % name)
+
+    def sample(self, rand, n):
+        lower = self.min_words
+        span = self.max_words - self.min_words + 1
+        lengths = [lower + int(rand() * span) for _ in range(n)]
+        words = self.words.sample(rand, sum(lengths))
+        texts = []
+        start = 0
+        for length in lengths:
+            end = start + length
+            texts.append('"%s"' % " ".join(words[start:end]))
+            start = end
+        return texts
+
+
+class SyntheticDocumentSchema:
+    """
+    Declarative schema of synthetic documents. The schema is a dict of field names to field specifications, e.g.::
+
+        {
+          "status": {"type": "keyword", "cardinality": 20, "skew": 1.2},
+          "size": {"type": "long", "min": 0, "max": 65536},
+          "@timestamp": {"type": "date", "start": "2018-01-01", "end": "2018-12-31"},
+          "message": {"type": "text", "vocabulary-size": 5000, "min-words": 3, "max-words": 12}
+        }
+    """
+    FIELD_TYPES = {
+        "keyword": KeywordField,
+        "text": TextField,
+        "date": DateField,
+        "long": IntegerField,
+        "integer": IntegerField,
+        "short": IntegerField,
+        "byte": IntegerField,
+        "double": FloatField,
+        "float": FloatField
+    }
+
+    def __init__(self, fields, rand):
+        """
+        :param fields: A dict of field names to field specifications.
+        :param rand: A ``random.Random`` instance to build the value pools.
+        """
+        self.fields = []
+        template_fields = []
+        for name, spec in fields.items():
+            if not isinstance(spec, dict):
+                raise exceptions.InvalidSyntax("Field [%s] in 'fields' must be an object but was [%s]" % (name, spec))
+            field_type = spec.get("type")
+            try:
+                field_class = SyntheticDocumentSchema.FIELD_TYPES[field_type]
+            except KeyError:
+                raise exceptions.InvalidSyntax("Unknown type [%s] of field [%s] in 'fields'. Supported types are %s." %
+                                               (field_type, name, sorted(SyntheticDocumentSchema.FIELD_TYPES.keys())))
+            self.fields.append(field_class(name, spec, rand))
+            template_fields.append("%s: %%s" % json.dumps(name).replace("%", "%%"))
+        self.template = "{" + ", ".join(template_fields) + "}"
+
+    def generate(self, rand, n):
+        """
+        :param rand: A function returning random numbers in the range [0.0, 1.0).
+        :param n: The number of documents to generate.
+        :return: A list of ``n`` serialized documents.
+        """
+        template = self.template
+        return [template % row for row in zip(*[field.sample(rand, n) for field in self.fields])]
+
+
 register_param_source_for_operation(track.OperationType.Bulk, BulkIndexParamSource)
 register_param_source_for_operation(track.OperationType.Search, SearchParamSource)
+register_param_source_for_operation(track.OperationType.SlicedScroll, SlicedScrollParamSource)
+register_param_source_for_operation(track.OperationType.MultiSearch, MultiSearchParamSource)
 register_param_source_for_operation(track.OperationType.CreateIndex, CreateIndexParamSource)
 register_param_source_for_operation(track.OperationType.DeleteIndex, DeleteIndexParamSource)
 register_param_source_for_operation(track.OperationType.CreateIndexTemplate, CreateIndexTemplateParamSource)
@@ -866,3 +2015,4 @@ register_param_source_for_operation(track.OperationType.DeleteIndexTemplate, Del
 
 # Also register by name, so users can use it too
 register_param_source_for_name("file-reader", BulkIndexParamSource)
+register_param_source_for_name("synthetic-bulk", SyntheticBulkParamSource)
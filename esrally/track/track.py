@@ -401,6 +401,8 @@ class OperationType(Enum):
     Search = 3
     Bulk = 4
     RawRequest = 5
+    SlicedScroll = 6
+    MultiSearch = 7
     # administrative actions
     ForceMerge = 1001
     ClusterHealth = 1002
@@ -440,6 +442,10 @@ class OperationType(Enum):
             return OperationType.Bulk
         elif v == "raw-request":
             return OperationType.RawRequest
+        elif v == "sliced-scroll":
+            return OperationType.SlicedScroll
+        elif v == "msearch":
+            return OperationType.MultiSearch
         elif v == "put-pipeline":
             return OperationType.PutPipeline
         elif v == "refresh":
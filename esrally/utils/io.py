@@ -1,11 +1,21 @@
+import array
+import collections
+import concurrent.futures
 import os
 import errno
+import hashlib
 import re
+import struct
 import subprocess
+import sys
 import bz2
 import gzip
+import mmap
+import queue
+import threading
 import zipfile
 import tarfile
+import zlib
 
 from esrally.utils import console
 
@@ -21,13 +31,16 @@ class FileSource:
         self.f = None
 
     def open(self):
-        self.f = open(self.file_name, mode=self.mode, encoding=self.encoding)
+        self.f = open(self.file_name, mode=self.mode, encoding=self.encoding if "b" not in self.mode else None)
         # allow for chaining
         return self
 
     def seek(self, offset):
         self.f.seek(offset)
 
+    def skip_lines(self, number_of_lines_to_skip):
+        skip_lines(self.file_name, self, number_of_lines_to_skip)
+
     def read(self):
         return self.f.read()
 
@@ -50,6 +63,91 @@ class FileSource:
         return self.file_name
 
 
+class MmapSource:
+    """
+    MmapSource is a wrapper around a memory-mapped file. In contrast to ``FileSource`` it operates on raw bytes and is intended for
+    reading many lines at once without decoding them.
+    """
+    def __init__(self, file_name, mode="rb"):
+        self.file_name = file_name
+        self.mode = mode
+        self.f = None
+        self.mm = None
+        self.pos = 0
+
+    def open(self):
+        self.f = open(self.file_name, mode="rb")
+        # an empty file cannot be memory-mapped
+        if os.fstat(self.f.fileno()).st_size > 0:
+            self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.mm = b""
+        self.pos = 0
+        # allow for chaining
+        return self
+
+    def seek(self, offset):
+        self.pos = offset
+
+    def tell(self):
+        return self.pos
+
+    def readline(self):
+        end = self.mm.find(b"\n", self.pos)
+        end = len(self.mm) if end == -1 else end + 1
+        line = self.mm[self.pos:end]
+        self.pos = end
+        return line
+
+    def read_lines(self, number_of_lines, max_bytes=None, lines_per_record=1):
+        """
+        Reads up to ``number_of_lines`` lines starting at the current position with a single copy.
+
+        :param number_of_lines: The maximum number of lines to read.
+        :param max_bytes: If provided, stops reading as soon as at least this number of bytes have been read.
+        :param lines_per_record: Only stops after a multiple of this number of lines due to ``max_bytes``.
+        :return: A tuple of the number of lines read and the lines as one ``bytes`` object that always ends with a newline (unless it
+                 is empty).
+        """
+        start = self.pos
+        end = start
+        size = len(self.mm)
+        lines = 0
+        find = self.mm.find
+        while lines < number_of_lines and end < size:
+            end = find(b"\n", end)
+            if end == -1:
+                end = size
+            else:
+                end += 1
+            lines += 1
+            if max_bytes and end - start >= max_bytes and lines % lines_per_record == 0:
+                break
+        self.pos = end
+        data = self.mm[start:end]
+        if data and not data.endswith(b"\n"):
+            data += b"\n"
+        return lines, data
+
+    def close(self):
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+        self.mm = None
+        self.f.close()
+        self.f = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def __str__(self, *args, **kwargs):
+        return self.file_name
+
+
 class DictStringFileSourceFactory:
     """
     Factory that can create `StringAsFileSource` for tests. Based on the provided dict, it will create a proper `StringAsFileSource`.
@@ -71,9 +169,10 @@ class StringAsFileSource:
     def __init__(self, contents, mode):
         """
         :param contents: The file contents as an array of strings. Each item in the array should correspond to one line.
-        :param mode: The file mode. It is ignored in this implementation but kept to implement the same interface as ``FileSource``.
+        :param mode: The file mode. In binary mode lines are returned UTF-8 encoded.
         """
         self.contents = contents
+        self.binary = "b" in mode
         self.current_index = 0
         self.opened = False
 
@@ -86,17 +185,22 @@ class StringAsFileSource:
         if offset != 0:
             raise AssertionError("StringAsFileSource does not support random seeks")
 
+    def skip_lines(self, number_of_lines_to_skip):
+        for _ in range(number_of_lines_to_skip):
+            self.readline()
+
     def read(self):
         self._assert_opened()
-        return "\n".join(self.contents)
+        contents = "\n".join(self.contents)
+        return contents.encode("utf-8") if self.binary else contents
 
     def readline(self):
         self._assert_opened()
         if self.current_index >= len(self.contents):
-            return ""
+            return b"" if self.binary else ""
         line = self.contents[self.current_index]
         self.current_index += 1
-        return line
+        return line.encode("utf-8") if self.binary else line
 
     def close(self):
         self._assert_opened()
@@ -158,7 +262,7 @@ def compress(source_directory, archive_name):
     _zipdir(source_directory, archive)
 
 
-def decompress(zip_name, target_directory):
+def decompress(zip_name, target_directory, workers=1, offset_table=False, offset_table_stride=None):
     """
     Decompresses the provided archive to the target directory. The following file extensions are supported:
 
@@ -175,31 +279,244 @@ def decompress(zip_name, target_directory):
     :param zip_name: The full path name to the file that should be decompressed.
     :param target_directory: The directory to which files should be decompressed. May or may not exist prior to calling
     this function.
+    :param workers: The number of threads to use for decompression. Only ``bz2`` and ``gz`` files that consist of multiple compressed
+    streams (e.g. created by ``pbzip2`` or ``bgzip``) can be decompressed in parallel. Defaults to 1.
+    :param offset_table: Whether to build a file offset table for the decompressed file while decompressing. Only supported for ``bz2``
+    and ``gz`` files. Defaults to ``False``.
+    :param offset_table_stride: The stride of the file offset table. Optional. See ``#prepare_file_offset_table()``.
+    :return: The number of lines in the decompressed file if a file offset table has been built, otherwise ``None``.
     """
     path_without_extension, extension = splitext(zip_name)
     filename = basename(path_without_extension)
     if extension == ".zip":
         _do_decompress(target_directory, zipfile.ZipFile(zip_name))
-    elif extension == ".bz2":
-        _do_decompress_manually(target_directory, filename, bz2.open(zip_name))
-    elif extension == ".gz":
-        _do_decompress_manually(target_directory, filename, gzip.open(zip_name))
+    elif extension in COMPRESSED_STREAM_FORMATS:
+        target = DecompressionTarget("%s/%s" % (target_directory, filename), offset_table, offset_table_stride)
+        if workers <= 1 or not _do_decompress_in_parallel(zip_name, extension, target, workers):
+            _do_decompress_manually(_open_compressed_stream(zip_name, extension), target)
+        return target.lines
     elif extension in [".tar", ".tar.gz", ".tgz", ".tar.bz2"]:
         _do_decompress(target_directory, tarfile.open(zip_name))
     else:
         raise RuntimeError("Unsupported file extension [%s]. Cannot decompress [%s]" % (extension, zip_name))
 
 
-def _do_decompress_manually(target_directory, filename, compressed_file):
-    ensure_dir(target_directory)
+def _open_compressed_stream(zip_name, extension):
+    return bz2.open(zip_name) if extension == ".bz2" else gzip.open(zip_name)
+
+
+def _do_decompress_manually(compressed_file, target):
     try:
-        with open("%s/%s" % (target_directory, filename), 'wb') as new_file:
-            for data in iter(lambda: compressed_file.read(100 * 1024), b''):
-                new_file.write(data)
+        target.open()
+        for data in iter(lambda: compressed_file.read(DECOMPRESSION_CHUNK_SIZE), b''):
+            target.write(data)
+        target.close()
+    except BaseException:
+        target.close(success=False)
+        raise
     finally:
         compressed_file.close()
 
 
+# Compressed streams in a multi-stream file start with these signatures. For bz2 we include the magic number of the first block to
+# reduce false positives (bz2 blocks are not byte-aligned so we can only split at stream boundaries).
+COMPRESSED_STREAM_FORMATS = {
+    ".bz2": (re.compile(rb"BZh[1-9]1AY&SY"), bz2.BZ2Decompressor, (OSError, EOFError)),
+    ".gz": (re.compile(rb"\x1f\x8b\x08"), lambda: zlib.decompressobj(wbits=zlib.MAX_WBITS | 16), (zlib.error,))
+}
+DECOMPRESSION_CHUNK_SIZE = 1024 * 1024
+# Each worker holds one decompressed stream in memory. Larger streams are better decompressed sequentially.
+MAX_AVERAGE_PARALLEL_STREAM_BYTES = 4 * 1024 * 1024
+
+
+class DecompressionTarget:
+    """
+    The decompressed file. It optionally builds a file offset table while the decompressed data are written.
+    """
+    def __init__(self, path, offset_table=False, offset_table_stride=None):
+        self.path = path
+        self.offset_table = offset_table
+        self.offset_table_stride = offset_table_stride
+        self.f = None
+        self.builder = None
+        self.lines = None
+
+    def open(self):
+        ensure_dir(dirname(self.path))
+        self.f = open(self.path, mode="wb")
+        self.builder = OffsetTableBuilder(self.offset_table_stride) if self.offset_table else None
+
+    def write(self, data):
+        self.f.write(data)
+        if self.builder:
+            self.builder.update(data)
+
+    def close(self, success=True):
+        if self.f:
+            self.f.close()
+            self.f = None
+            if success and self.builder:
+                self.lines = self.builder.write(self.path)
+            self.builder = None
+
+
+def _decompress_stream(data, start, decompressor_factory, errors):
+    """
+    Decompresses a single compressed stream that starts at offset ``start`` in ``data``.
+
+    :return: A tuple of the start and end offset of the compressed stream and the decompressed data. The end offset and decompressed data
+             are ``None`` if there is no valid compressed stream at ``start``.
+    """
+    decompressor = decompressor_factory()
+    chunks = []
+    position = start
+    try:
+        while not decompressor.eof and position < len(data):
+            chunk = data[position:position + DECOMPRESSION_CHUNK_SIZE]
+            position += len(chunk)
+            chunks.append(decompressor.decompress(chunk))
+    except errors:
+        return start, None, None
+    if not decompressor.eof:
+        return start, None, None
+    return start, position - len(decompressor.unused_data), b"".join(chunks)
+
+
+def _do_decompress_in_parallel(zip_name, extension, target, workers):
+    """
+    Decompresses all compressed streams in the provided file in parallel.
+
+    :return: ``True`` iff the file could be decompressed in parallel. If ``False`` is returned, the file should be decompressed
+             sequentially.
+    """
+    signature, decompressor_factory, errors = COMPRESSED_STREAM_FORMATS[extension]
+    with open(zip_name, mode="rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # candidates; some of them may be false positives within a compressed stream
+            starts = [m.start() for m in signature.finditer(data)]
+            if len(starts) < 2 or starts[0] != 0 or size / len(starts) > MAX_AVERAGE_PARALLEL_STREAM_BYTES:
+                return False
+            target.open()
+            position = 0
+            completed = False
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                pending = collections.deque()
+                remaining = iter(starts)
+
+                def submit_next():
+                    candidate = next(remaining, None)
+                    if candidate is not None:
+                        pending.append(pool.submit(_decompress_stream, data, candidate, decompressor_factory, errors))
+
+                try:
+                    # limit the number of decompressed streams that are held in memory
+                    for _ in range(2 * workers):
+                        submit_next()
+                    while pending:
+                        start, end, decompressed = pending.popleft().result()
+                        submit_next()
+                        if start < position:
+                            # false positive within the previous stream
+                            continue
+                        if start > position or decompressed is None:
+                            # we've lost track of stream boundaries (e.g. trailing garbage)
+                            break
+                        target.write(decompressed)
+                        position = end
+                    completed = position == size
+                finally:
+                    for future in pending:
+                        future.cancel()
+                    target.close(success=completed)
+            return completed
+
+
+class StreamingDecompressor:
+    """
+    Decompresses a ``bz2`` or ``gz`` file while it is being written, e.g. while it is downloaded. Compressed data are passed by calling
+    this object and decompressed in a background thread.
+    """
+    def __init__(self, zip_name, target_directory, offset_table=False, offset_table_stride=None, queue_size=256):
+        """
+        :param zip_name: The full path name of the compressed file. Its extension determines the compression format.
+        :param target_directory: The directory to which the file should be decompressed.
+        :param offset_table: Whether to build a file offset table for the decompressed file. Defaults to ``False``.
+        :param offset_table_stride: The stride of the file offset table. Optional. See ``#prepare_file_offset_table()``.
+        :param queue_size: The maximum number of compressed chunks that are buffered before the caller is blocked.
+        """
+        path_without_extension, extension = splitext(zip_name)
+        if extension not in COMPRESSED_STREAM_FORMATS:
+            raise RuntimeError("Unsupported file extension [%s]. Cannot decompress [%s] while streaming" % (extension, zip_name))
+        self.zip_name = zip_name
+        self.extension = extension
+        self.target = DecompressionTarget("%s/%s" % (target_directory, basename(path_without_extension)), offset_table,
+                                          offset_table_stride)
+        self.chunks = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.aborted = False
+        self.thread = None
+
+    def start(self):
+        self.target.open()
+        self.thread = threading.Thread(target=self._decompress, name="streaming-decompressor", daemon=True)
+        self.thread.start()
+
+    def __call__(self, chunk):
+        if self.thread is None:
+            self.start()
+        if self.error is None and not self.aborted:
+            self.chunks.put(chunk)
+
+    def _decompress(self):
+        _, decompressor_factory, _ = COMPRESSED_STREAM_FORMATS[self.extension]
+        decompressor = decompressor_factory()
+        for chunk in iter(self.chunks.get, None):
+            # after an error we only drain the queue so the producer does not block
+            if self.error is None and not self.aborted:
+                try:
+                    # a chunk may contain the end of one compressed stream and the beginning of the next one
+                    while chunk:
+                        if decompressor.eof:
+                            decompressor = decompressor_factory()
+                        self.target.write(decompressor.decompress(chunk))
+                        chunk = decompressor.unused_data if decompressor.eof else None
+                except BaseException as e:
+                    self.error = e
+        if self.error is None and not self.aborted and not decompressor.eof:
+            self.error = EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+    def _stop(self):
+        if self.thread is None:
+            self.start()
+        self.chunks.put(None)
+        self.thread.join()
+        success = self.error is None and not self.aborted
+        self.target.close(success=success)
+        if not success and os.path.isfile(self.target.path):
+            os.remove(self.target.path)
+
+    def finish(self):
+        """
+        Waits until all data have been decompressed.
+
+        :return: The number of lines in the decompressed file if a file offset table has been built, otherwise ``None``.
+        """
+        self._stop()
+        if self.error is not None:
+            raise RuntimeError("Could not decompress [%s] while streaming" % self.zip_name) from self.error
+        return self.target.lines
+
+    def abort(self):
+        """
+        Stops decompression and removes the partially decompressed file.
+        """
+        self.aborted = True
+        self._stop()
+
+
 def _do_decompress(target_directory, compressed_file):
     try:
         compressed_file.extractall(path=target_directory)
@@ -258,32 +575,155 @@ def has_extension(file_name, extension):
     return ext == extension
 
 
-def prepare_file_offset_table(data_file_path):
+OFFSET_TABLE_MAGIC = b"RLYOFF01"
+# magic, stride, number of lines, data file size, data file fingerprint; padded to 64 bytes so offsets are 8-byte aligned
+OFFSET_TABLE_HEADER = struct.Struct("<8sQQQ20s12x")
+# corpora up to this size get an offset table entry for every line
+OFFSET_TABLE_SMALL_CORPUS_BYTES = 256 * 1024 * 1024
+OFFSET_TABLE_DEFAULT_STRIDE = 1000
+FINGERPRINT_BLOCK_SIZE = 1024 * 1024
+
+
+def fingerprint(data_file_path):
+    """
+    Calculates a cheap fingerprint of a file's contents based on its size and the first and last block of the file.
+
+    :param data_file_path: The path to a file that is readable by this process.
+    :return: A tuple of the file size in bytes and a 20 byte digest.
+    """
+    size = os.path.getsize(data_file_path)
+    digest = hashlib.sha1(str(size).encode("ascii"))
+    with open(data_file_path, mode="rb") as f:
+        digest.update(f.read(FINGERPRINT_BLOCK_SIZE))
+        if size > FINGERPRINT_BLOCK_SIZE:
+            f.seek(max(FINGERPRINT_BLOCK_SIZE, size - FINGERPRINT_BLOCK_SIZE))
+            digest.update(f.read())
+    return size, digest.digest()
+
+
+def _read_offset_table_header(offset_file_path):
+    try:
+        with open(offset_file_path, mode="rb") as f:
+            header = f.read(OFFSET_TABLE_HEADER.size)
+    except FileNotFoundError:
+        return None
+    # e.g. an offset table in the old text format
+    if len(header) != OFFSET_TABLE_HEADER.size or not header.startswith(OFFSET_TABLE_MAGIC):
+        return None
+    return OFFSET_TABLE_HEADER.unpack(header)
+
+
+def prepare_file_offset_table(data_file_path, stride=None):
     """
     Creates a file that contains a mapping from line numbers to file offsets for the provided path. This file is used internally by
     #skip_lines(data_file_path, data_file) to speed up line skipping.
 
+    The file consists of a fixed-size header and a table of little-endian uint64 file offsets for every ``stride``th line. The header
+    contains a fingerprint of the data file so the table is only rebuilt if the contents of the data file have changed.
+
     :param data_file_path: The path to a text file that is readable by this process.
+    :param stride: The number of lines between two entries in the offset table. Optional. By default, small files get an entry for every
+                   line and larger files for every 1000th line.
     :return The number of lines read or ``None`` if it did not have to build the file offset table.
     """
     offset_file_path = "%s.offset" % data_file_path
+    size, digest = fingerprint(data_file_path)
+    if stride is None:
+        stride = 1 if size <= OFFSET_TABLE_SMALL_CORPUS_BYTES else OFFSET_TABLE_DEFAULT_STRIDE
+    if stride <= 0:
+        raise ValueError("stride must be positive but was [%s]" % stride)
+    header = _read_offset_table_header(offset_file_path)
     # recreate only if necessary as this can be time-consuming
-    if not os.path.exists(offset_file_path) or os.path.getmtime(offset_file_path) < os.path.getmtime(data_file_path):
-        console.info("Preparing file offset table for [%s] ... " % data_file_path, end="", flush=True)
-        line_number = 0
-        with open(offset_file_path, mode="wt", encoding="utf-8") as offset_file:
-            with open(data_file_path, mode="rt", encoding="utf-8") as data_file:
-                while True:
-                    line = data_file.readline()
-                    if len(line) == 0:
-                        break
-                    line_number += 1
-                    if line_number % 50000 == 0:
-                        print("%d;%d" % (line_number, data_file.tell()), file=offset_file)
-        console.println("[OK]")
-        return line_number
-    else:
+    if header is not None and header[1] == stride and header[3] == size and header[4] == digest:
         return None
+    console.info("Preparing file offset table for [%s] ... " % data_file_path, end="", flush=True)
+    builder = OffsetTableBuilder(stride)
+    with open(data_file_path, mode="rb") as data_file:
+        for data in iter(lambda: data_file.read(FINGERPRINT_BLOCK_SIZE), b""):
+            builder.update(data)
+    line_number = builder.write(data_file_path, data_file_fingerprint=(size, digest))
+    console.println("[OK]")
+    return line_number
+
+
+class OffsetTableBuilder:
+    """
+    Builds a file offset table incrementally from the contents of a data file. This allows to build the file offset table while the
+    data file is written, e.g. during decompression.
+    """
+    def __init__(self, stride=None):
+        """
+        :param stride: The number of lines between two entries in the offset table. Optional. By default, small files get an entry for
+                       every line and larger files for every 1000th line.
+        """
+        if stride is not None and stride <= 0:
+            raise ValueError("stride must be positive but was [%s]" % stride)
+        self.fixed_stride = stride is not None
+        self.stride = stride if self.fixed_stride else 1
+        self.offsets = array.array("Q", [0])
+        self.lines = 0
+        self.position = 0
+        self.ends_with_newline = True
+
+    def update(self, data):
+        """
+        :param data: The next chunk of the data file as ``bytes``.
+        """
+        if not data:
+            return
+        stride = self.stride
+        newlines = data.count(b"\n")
+        # fast path: no table entry within this chunk
+        if self.lines // stride == (self.lines + newlines) // stride:
+            self.lines += newlines
+        else:
+            lines = self.lines
+            offsets = self.offsets
+            base = self.position + 1
+            pos = data.find(b"\n")
+            while pos >= 0:
+                lines += 1
+                if lines % stride == 0:
+                    offsets.append(base + pos)
+                pos = data.find(b"\n", pos + 1)
+            self.lines = lines
+        self.position += len(data)
+        self.ends_with_newline = data.endswith(b"\n")
+        if not self.fixed_stride and self.stride == 1 and self.position > OFFSET_TABLE_SMALL_CORPUS_BYTES:
+            # the data file is larger than we have anticipated; keep only every 1000th entry from now on
+            self.stride = OFFSET_TABLE_DEFAULT_STRIDE
+            self.offsets = self.offsets[::OFFSET_TABLE_DEFAULT_STRIDE]
+
+    def write(self, data_file_path, data_file_fingerprint=None):
+        """
+        Writes the file offset table for the provided data file. All contents of the data file must have been passed to ``#update()``.
+
+        :param data_file_path: The path to the data file.
+        :param data_file_fingerprint: The fingerprint of the data file if it is already known. Optional.
+        :return: The number of lines in the data file.
+        """
+        # the last line has no trailing newline
+        if not self.ends_with_newline:
+            self.lines += 1
+            self.ends_with_newline = True
+            if self.lines % self.stride == 0:
+                self.offsets.append(self.position)
+        size, digest = data_file_fingerprint if data_file_fingerprint else fingerprint(data_file_path)
+        if size != self.position:
+            raise ValueError("[%s] contains [%d] bytes but the offset table has been built for [%d] bytes" %
+                             (data_file_path, size, self.position))
+        offsets = self.offsets
+        if sys.byteorder != "little":
+            offsets = array.array("Q", offsets)
+            offsets.byteswap()
+        offset_file_path = "%s.offset" % data_file_path
+        tmp_file_path = "%s.tmp" % offset_file_path
+        with open(tmp_file_path, mode="wb") as offset_file:
+            offset_file.write(OFFSET_TABLE_HEADER.pack(OFFSET_TABLE_MAGIC, self.stride, self.lines, size, digest))
+            offsets.tofile(offset_file)
+        # readers never see a partially written offset table
+        os.replace(tmp_file_path, offset_file_path)
+        return self.lines
 
 
 def remove_file_offset_table(data_file_path):
@@ -297,6 +737,35 @@ def remove_file_offset_table(data_file_path):
     os.remove(offset_file_path)
 
 
+def file_offset(data_file_path, line_number):
+    """
+    Looks up the closest known file offset for the provided line number in the file offset table.
+
+    :param data_file_path: The full path to the data file.
+    :param line_number: A non-negative line number.
+    :return: A tuple of the line number and the file offset in bytes of the closest line at or before ``line_number``. If there is no
+             (valid) file offset table, ``(0, 0)`` is returned.
+    """
+    offset_file_path = "%s.offset" % data_file_path
+    try:
+        with open(offset_file_path, mode="rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as table:
+            if len(table) < OFFSET_TABLE_HEADER.size or table[:len(OFFSET_TABLE_MAGIC)] != OFFSET_TABLE_MAGIC:
+                return 0, 0
+            _, stride, number_of_lines, size, _ = OFFSET_TABLE_HEADER.unpack_from(table)
+            # the full fingerprint is checked when the table is prepared; here we only guard against obviously stale tables
+            if size != os.path.getsize(data_file_path):
+                return 0, 0
+            entries = (len(table) - OFFSET_TABLE_HEADER.size) // 8
+            index = min(line_number, number_of_lines) // stride
+            if index >= entries:
+                return 0, 0
+            offset, = struct.unpack_from("<Q", table, OFFSET_TABLE_HEADER.size + index * 8)
+            return index * stride, offset
+    except (FileNotFoundError, ValueError):
+        # ValueError: an empty file cannot be mapped
+        return 0, 0
+
+
 def skip_lines(data_file_path, data_file, number_of_lines_to_skip):
     """
     Skips the first `number_of_lines_to_skip` lines in `data_file` as a side effect.
@@ -308,19 +777,9 @@ def skip_lines(data_file_path, data_file, number_of_lines_to_skip):
     if number_of_lines_to_skip == 0:
         return
 
-    offset_file_path = "%s.offset" % data_file_path
-    offset = 0
-    remaining_lines = number_of_lines_to_skip
     # can we fast forward?
-    if os.path.exists(offset_file_path):
-        with open(offset_file_path, mode="rt", encoding="utf-8") as offsets:
-            for line in offsets:
-                line_number, offset_in_bytes = [int(i) for i in line.strip().split(";")]
-                if line_number <= number_of_lines_to_skip:
-                    offset = offset_in_bytes
-                    remaining_lines = number_of_lines_to_skip - line_number
-                else:
-                    break
+    line_number, offset = file_offset(data_file_path, number_of_lines_to_skip)
+    remaining_lines = number_of_lines_to_skip - line_number
     # fast forward to the last known file offset
     data_file.seek(offset)
     # forward the last remaining lines if needed
@@ -329,6 +788,246 @@ def skip_lines(data_file_path, data_file, number_of_lines_to_skip):
             data_file.readline()
 
 
+# A framed file is a multi-member gzip file (readable by any gzip tool) where each member ("frame") contains a fixed number of lines.
+# The frame index next to it maps frames to their compressed offset so readers can start decompressing at any frame.
+FRAMED_FILE_SUFFIX = ".fgz"
+FRAME_INDEX_SUFFIX = ".idx"
+FRAME_INDEX_MAGIC = b"RLYFRM01"
+# magic, lines per frame, number of lines, uncompressed size
+FRAME_INDEX_HEADER = struct.Struct("<8sQQQ")
+DEFAULT_LINES_PER_FRAME = 10000
+
+
+def framed_file_path(data_file_path):
+    """
+    :param data_file_path: The path to an (uncompressed) data file.
+    :return: The path to the framed file for this data file.
+    """
+    return "%s%s" % (data_file_path, FRAMED_FILE_SUFFIX)
+
+
+def has_framed_file_only(data_file_path):
+    """
+    :param data_file_path: The path to an (uncompressed) data file.
+    :return: ``True`` iff the data file itself does not exist but a complete framed file for it does.
+    """
+    return data_file_path is not None and not os.path.isfile(data_file_path) and \
+        read_frame_index(framed_file_path(data_file_path)) is not None
+
+
+def data_file_source(file_name, mode, encoding="utf-8"):
+    """
+    Creates a file source for a data file. If only the framed file is available, the returned source reads the framed file instead.
+
+    :param file_name: The path to an (uncompressed) data file.
+    :param mode: The file mode.
+    :param encoding: The encoding of the file.
+    :return: Either a ``FileSource`` or a ``FramedFileSource``.
+    """
+    if has_framed_file_only(file_name):
+        return FramedFileSource(framed_file_path(file_name), mode, encoding)
+    return FileSource(file_name, mode, encoding)
+
+
+def read_frame_index(framed_path):
+    """
+    :param framed_path: The path to a framed file.
+    :return: A tuple of lines per frame, number of lines, uncompressed size and the array of compressed frame offsets (including the end
+             offset of the last frame) or ``None`` if there is no valid frame index.
+    """
+    try:
+        with open("%s%s" % (framed_path, FRAME_INDEX_SUFFIX), mode="rb") as f:
+            header = f.read(FRAME_INDEX_HEADER.size)
+            if len(header) != FRAME_INDEX_HEADER.size or not header.startswith(FRAME_INDEX_MAGIC):
+                return None
+            _, lines_per_frame, number_of_lines, size = FRAME_INDEX_HEADER.unpack(header)
+            offsets = array.array("Q")
+            offsets.frombytes(f.read())
+    except FileNotFoundError:
+        return None
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    return lines_per_frame, number_of_lines, size, offsets
+
+
+class FramedFileWriter:
+    """
+    Writes lines into a framed file. The frame index is written when the writer is closed so a framed file is only considered complete
+    (see ``#read_frame_index()``) after it has been written successfully.
+    """
+    def __init__(self, framed_path, lines_per_frame=DEFAULT_LINES_PER_FRAME, compresslevel=6):
+        if lines_per_frame <= 0:
+            raise ValueError("lines_per_frame must be positive but was [%s]" % lines_per_frame)
+        self.framed_path = framed_path
+        self.lines_per_frame = lines_per_frame
+        self.compresslevel = compresslevel
+        self.f = None
+        self.frame = []
+        self.frame_lines = 0
+        self.lines = 0
+        self.size = 0
+        self.offsets = array.array("Q", [0])
+
+    def open(self):
+        # an index of a previous conversion must not describe the new data
+        index_path = "%s%s" % (self.framed_path, FRAME_INDEX_SUFFIX)
+        if os.path.isfile(index_path):
+            os.remove(index_path)
+        ensure_dir(dirname(self.framed_path))
+        self.f = open(self.framed_path, mode="wb")
+        return self
+
+    def write(self, data):
+        """
+        :param data: The next chunk of the data file as ``bytes``. Chunks do not need to end at a line boundary.
+        """
+        self.size += len(data)
+        while data:
+            needed = self.lines_per_frame - self.frame_lines
+            newlines = data.count(b"\n")
+            if newlines < needed:
+                self.frame.append(data)
+                self.frame_lines += newlines
+                return
+            pos = -1
+            for _ in range(needed):
+                pos = data.find(b"\n", pos + 1)
+            self.frame.append(data[:pos + 1])
+            self.frame_lines += needed
+            self._write_frame()
+            data = data[pos + 1:]
+
+    def _write_frame(self):
+        frame = b"".join(self.frame)
+        if frame:
+            self.f.write(gzip.compress(frame, compresslevel=self.compresslevel))
+            self.offsets.append(self.f.tell())
+            self.lines += self.frame_lines
+            # the last line has no trailing newline
+            if not frame.endswith(b"\n"):
+                self.lines += 1
+        self.frame = []
+        self.frame_lines = 0
+
+    def close(self):
+        """
+        Writes the last frame and the frame index.
+
+        :return: The number of lines in the framed file.
+        """
+        self._write_frame()
+        self.f.close()
+        self.f = None
+        offsets = self.offsets
+        if sys.byteorder != "little":
+            offsets = array.array("Q", offsets)
+            offsets.byteswap()
+        index_path = "%s%s" % (self.framed_path, FRAME_INDEX_SUFFIX)
+        tmp_index_path = "%s.tmp" % index_path
+        with open(tmp_index_path, mode="wb") as index_file:
+            index_file.write(FRAME_INDEX_HEADER.pack(FRAME_INDEX_MAGIC, self.lines_per_frame, self.lines, self.size))
+            offsets.tofile(index_file)
+        os.replace(tmp_index_path, index_path)
+        return self.lines
+
+    def abort(self):
+        if self.f:
+            self.f.close()
+            self.f = None
+        if os.path.isfile(self.framed_path):
+            os.remove(self.framed_path)
+
+
+def convert_to_framed(source_path, framed_path, lines_per_frame=DEFAULT_LINES_PER_FRAME, compresslevel=6):
+    """
+    Converts a data file to a framed file.
+
+    :param source_path: The path to the data file. It may either be uncompressed or compressed with ``bz2`` or ``gzip``.
+    :param framed_path: The path of the framed file to create.
+    :param lines_per_frame: The number of lines in each frame. Smaller frames allow for more precise seeks but compress worse.
+    :param compresslevel: The gzip compression level.
+    :return: The number of lines in the framed file.
+    """
+    _, extension = splitext(source_path)
+    source = _open_compressed_stream(source_path, extension) if extension in COMPRESSED_STREAM_FORMATS else open(source_path, mode="rb")
+    writer = FramedFileWriter(framed_path, lines_per_frame, compresslevel).open()
+    try:
+        with source:
+            for data in iter(lambda: source.read(DECOMPRESSION_CHUNK_SIZE), b""):
+                writer.write(data)
+        return writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+class FramedFileSource:
+    """
+    Reads a framed file. Like ``FileSource`` it returns decompressed lines but it can start reading at any line without decompressing
+    the preceding frames.
+    """
+    def __init__(self, file_name, mode, encoding="utf-8"):
+        self.file_name = file_name
+        self.mode = mode
+        self.encoding = encoding
+        self.index = None
+        self.raw = None
+        self.f = None
+
+    def open(self):
+        self.index = read_frame_index(self.file_name)
+        if self.index is None:
+            raise RuntimeError("[%s] has no valid frame index" % self.file_name)
+        self.raw = open(self.file_name, mode="rb")
+        self._start_at_frame(0)
+        # allow for chaining
+        return self
+
+    def _start_at_frame(self, frame):
+        if self.f:
+            self.f.close()
+        self.raw.seek(self.index[3][frame])
+        # reads all subsequent frames as well
+        self.f = gzip.open(self.raw, mode=self.mode, encoding=self.encoding if "t" in self.mode else None)
+
+    def skip_lines(self, number_of_lines_to_skip):
+        """
+        Skips the first ``number_of_lines_to_skip`` lines. Only the frame that contains the first line to read is decompressed.
+
+        :param number_of_lines_to_skip: A non-negative number of lines that should be skipped.
+        """
+        lines_per_frame, number_of_lines, _, offsets = self.index
+        # the last entry in offsets is the end of the file
+        frame = min(number_of_lines_to_skip // lines_per_frame, len(offsets) - 1)
+        self._start_at_frame(frame)
+        for _ in range(number_of_lines_to_skip - frame * lines_per_frame):
+            if not self.f.readline():
+                break
+
+    def readline(self):
+        return self.f.readline()
+
+    def read(self):
+        return self.f.read()
+
+    def close(self):
+        self.f.close()
+        self.f = None
+        self.raw.close()
+        self.raw = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def __str__(self, *args, **kwargs):
+        return self.file_name
+
+
 def get_size(start_path="."):
     total_size = 0
     for dirpath, dirnames, filenames in os.walk(start_path):
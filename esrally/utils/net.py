@@ -1,5 +1,9 @@
+import concurrent.futures
+import hashlib
+import json
 import logging
 import os
+import threading
 
 import certifi
 import urllib3
@@ -8,6 +12,16 @@ from esrally import exceptions
 
 __HTTP = None
 
+# upper bound of concurrent connections for a single download
+MAX_DOWNLOAD_SEGMENTS = 8
+# we only split a download if each segment has at least this size
+MIN_DOWNLOAD_SEGMENT_BYTES = 32 * 1024 * 1024
+# persist the progress of a segmented download whenever this many bytes have been downloaded
+PROGRESS_RECORD_INTERVAL_BYTES = 16 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 2 ** 16
+# how often we attempt to download the rest of a segment after the connection broke
+SEGMENT_ATTEMPTS = 3
+
 
 def init():
     logger = logging.getLogger(__name__)
@@ -15,10 +29,10 @@ def init():
     proxy_url = os.getenv("http_proxy")
     if proxy_url and len(proxy_url) > 0:
         logger.info("Rally connects via proxy URL [%s] to the Internet (picked up from the environment variable [http_proxy]).",  proxy_url)
-        __HTTP = urllib3.ProxyManager(proxy_url, cert_reqs='CERT_REQUIRED', ca_certs=certifi.where())
+        __HTTP = urllib3.ProxyManager(proxy_url, maxsize=MAX_DOWNLOAD_SEGMENTS, cert_reqs='CERT_REQUIRED', ca_certs=certifi.where())
     else:
         logger.info("Rally connects directly to the Internet (no proxy support).")
-        __HTTP = urllib3.PoolManager(cert_reqs='CERT_REQUIRED', ca_certs=certifi.where())
+        __HTTP = urllib3.PoolManager(maxsize=MAX_DOWNLOAD_SEGMENTS, cert_reqs='CERT_REQUIRED', ca_certs=certifi.where())
 
 
 class Progress:
@@ -42,18 +56,56 @@ class Progress:
         self.p.finish()
 
 
-def download(url, local_path, expected_size_in_bytes=None, progress_indicator=None):
+def download(url, local_path, expected_size_in_bytes=None, progress_indicator=None, chunk_consumer=None, segments=None, checksum=None):
     """
     Downloads a single file from a URL to the provided local path.
 
+    If the server supports HTTP range requests, the file is downloaded in multiple segments in parallel. The progress of such a download
+    is persisted next to the file so an interrupted download is resumed when this function is called again for the same URL.
+
     :param url: The remote URL specifying one file that should be downloaded. May be either a HTTP or HTTPS URL.
     :param local_path: The local file name of the file that should be downloaded.
     :param expected_size_in_bytes: The expected file size in bytes if known. It will be used to verify that all data have been downloaded.
     :param progress_indicator A callable that can be use to report progress to the user. It is expected to take two parameters 
     ``bytes_read`` and ``total_bytes``. If not provided, no progress is shown. Note that ``total_bytes`` is derived from 
     the ``Content-Length`` header and not from the parameter ``expected_size_in_bytes``.
+    :param chunk_consumer: A callable that is invoked with every downloaded chunk of data in order, e.g. to process the file while it is
+    downloaded. Optional. If provided, the file is downloaded with a single connection.
+    :param segments: The maximum number of segments that are downloaded in parallel. Optional. By default, Rally chooses the number of
+    segments based on the file size.
+    :param checksum: The expected checksum of the file in the format ``algorithm:hexdigest``, e.g. ``sha256:4a5b...``. Optional. The
+    algorithm can be any algorithm that is supported by ``hashlib``.
     """
     tmp_data_set_path = local_path + ".tmp"
+    remote_file = _probe(url)
+    if remote_file and remote_file.accepts_ranges and remote_file.size:
+        if expected_size_in_bytes is None:
+            expected_size_in_bytes = remote_file.size
+        if chunk_consumer:
+            segments = 1
+        elif segments is None:
+            segments = min(MAX_DOWNLOAD_SEGMENTS, max(1, remote_file.size // MIN_DOWNLOAD_SEGMENT_BYTES))
+        SegmentedDownload(url, tmp_data_set_path, remote_file, segments, progress_indicator, chunk_consumer).run()
+    else:
+        expected_size_in_bytes = _download_stream(url, tmp_data_set_path, expected_size_in_bytes, progress_indicator, chunk_consumer)
+
+    download_size = os.path.getsize(tmp_data_set_path)
+    if expected_size_in_bytes is not None and download_size != expected_size_in_bytes:
+        _remove_download(tmp_data_set_path)
+        raise exceptions.DataError("Download of [%s] is corrupt. Downloaded [%d] bytes but [%d] bytes are expected. Please retry." %
+                                   (local_path, download_size, expected_size_in_bytes))
+    if checksum:
+        algorithm, expected_digest = checksum.split(":", 1)
+        actual_digest = _digest(tmp_data_set_path, algorithm)
+        if actual_digest != expected_digest.lower():
+            _remove_download(tmp_data_set_path)
+            raise exceptions.DataError("Download of [%s] is corrupt. Expected %s checksum [%s] but got [%s]. Please retry." %
+                                       (local_path, algorithm, expected_digest, actual_digest))
+    os.rename(tmp_data_set_path, local_path)
+    _remove_download(SegmentedDownload.progress_record_path(tmp_data_set_path))
+
+
+def _download_stream(url, tmp_data_set_path, expected_size_in_bytes, progress_indicator, chunk_consumer):
     try:
         with __http().request("GET", url, preload_content=False, retries=10,
                               timeout=urllib3.Timeout(connect=45, read=240)) as r, open(tmp_data_set_path, "wb") as out_file:
@@ -67,26 +119,217 @@ def download(url, local_path, expected_size_in_bytes=None, progress_indicator=No
             except BaseException:
                 size_from_content_header = None
 
-            chunk_size = 2 ** 16
             bytes_read = 0
 
-            for chunk in r.stream(chunk_size):
+            for chunk in r.stream(DOWNLOAD_CHUNK_SIZE):
                 out_file.write(chunk)
+                if chunk_consumer:
+                    chunk_consumer(chunk)
                 bytes_read += len(chunk)
                 if progress_indicator and size_from_content_header:
                     progress_indicator(bytes_read, size_from_content_header)
     except BaseException:
-        if os.path.isfile(tmp_data_set_path):
-            os.remove(tmp_data_set_path)
+        _remove_download(tmp_data_set_path)
         raise
-    else:
-        download_size = os.path.getsize(tmp_data_set_path)
-        if expected_size_in_bytes is not None and download_size != expected_size_in_bytes:
-            if os.path.isfile(tmp_data_set_path):
-                os.remove(tmp_data_set_path)
-            raise exceptions.DataError("Download of [%s] is corrupt. Downloaded [%d] bytes but [%d] bytes are expected. Please retry." %
-                                       (local_path, download_size, expected_size_in_bytes))
-        os.rename(tmp_data_set_path, local_path)
+    return expected_size_in_bytes
+
+
+def _remove_download(path):
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def _digest(path, algorithm):
+    h = hashlib.new(algorithm)
+    with open(path, mode="rb") as f:
+        for data in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(data)
+    return h.hexdigest()
+
+
+class RemoteFile:
+    def __init__(self, size, accepts_ranges, validator):
+        """
+        :param size: The size of the remote file in bytes. May be ``None`` if unknown.
+        :param accepts_ranges: Whether the server supports range requests for this file.
+        :param validator: A string that changes when the remote file changes (based on ``ETag`` or ``Last-Modified``). May be ``None``.
+        """
+        self.size = size
+        self.accepts_ranges = accepts_ranges
+        self.validator = validator
+
+
+def _probe(url):
+    """
+    :return: A ``RemoteFile`` describing the resource at ``url`` or ``None`` if the server did not answer the ``HEAD`` request
+             successfully. In that case we just attempt a regular download which will also report any errors.
+    """
+    logger = logging.getLogger(__name__)
+    try:
+        r = __http().request("HEAD", url, retries=10, timeout=urllib3.Timeout(connect=45, read=240))
+    except urllib3.exceptions.HTTPError:
+        logger.exception("Could not probe [%s]. Downloading without range requests.", url)
+        return None
+    if r.status > 299:
+        return None
+    try:
+        size = int(r.headers.get("Content-Length"))
+    except (TypeError, ValueError):
+        size = None
+    accepts_ranges = r.headers.get("Accept-Ranges", "none").lower() == "bytes"
+    validator = r.headers.get("ETag") or r.headers.get("Last-Modified")
+    return RemoteFile(size, accepts_ranges, validator)
+
+
+def _request_range(url, byte_range):
+    return __http().request("GET", url, headers={"Range": byte_range}, preload_content=False, retries=10,
+                            timeout=urllib3.Timeout(connect=45, read=240))
+
+
+class SegmentedDownload:
+    """
+    Downloads a file in multiple segments in parallel using HTTP range requests. All segments are written to their position in a
+    preallocated file. The progress of each segment is persisted in a progress record so an interrupted download can be resumed.
+    """
+    def __init__(self, url, path, remote_file, segments, progress_indicator=None, chunk_consumer=None):
+        """
+        :param url: The URL to download.
+        :param path: The local path of the (temporary) download file.
+        :param remote_file: A ``RemoteFile`` describing the resource at ``url``.
+        :param segments: The number of segments to download in parallel.
+        :param progress_indicator: A callable that is invoked with the number of downloaded and total bytes. Optional.
+        :param chunk_consumer: A callable that is invoked with every chunk of data in order. Requires ``segments == 1``. Optional.
+        """
+        if chunk_consumer and segments != 1:
+            raise exceptions.RallyAssertionError("A chunk consumer requires a single download segment but got [%d]" % segments)
+        self.url = url
+        self.path = path
+        self.remote_file = remote_file
+        self.segments = segments
+        self.progress_indicator = progress_indicator
+        self.chunk_consumer = chunk_consumer
+        self.record_path = SegmentedDownload.progress_record_path(path)
+        self.lock = threading.Lock()
+        self.plan = None
+        self.unrecorded_bytes = 0
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def progress_record_path(path):
+        return "%s.progress" % path
+
+    def run(self):
+        self.plan = self._resume() or self._prepare()
+        if self.chunk_consumer:
+            self._replay()
+        completed = False
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.plan["segments"])) as pool:
+                for future in [pool.submit(self._download_segment, i) for i in range(len(self.plan["segments"]))]:
+                    future.result()
+            completed = True
+        finally:
+            if not completed:
+                with self.lock:
+                    self._record()
+                self.logger.info("Download of [%s] has been interrupted. It will be resumed on the next attempt.", self.url)
+
+    def _resume(self):
+        try:
+            with open(self.record_path, mode="rt", encoding="utf-8") as f:
+                plan = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if plan.get("url") != self.url or plan.get("size") != self.remote_file.size or \
+                plan.get("validator") != self.remote_file.validator or \
+                not os.path.isfile(self.path) or os.path.getsize(self.path) != self.remote_file.size or \
+                (self.chunk_consumer and len(plan["segments"]) != 1):
+            return None
+        self.logger.info("Resuming download of [%s] to [%s].", self.url, self.path)
+        return plan
+
+    def _prepare(self):
+        size = self.remote_file.size
+        segment_size = -(-size // self.segments)
+        plan = {
+            "url": self.url,
+            "size": size,
+            "validator": self.remote_file.validator,
+            # start, end (exclusive), downloaded bytes
+            "segments": [[start, min(start + segment_size, size), 0] for start in range(0, size, segment_size)]
+        }
+        with open(self.path, mode="wb") as f:
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+            except (AttributeError, OSError):
+                # not supported by the platform or the file system
+                f.truncate(size)
+        return plan
+
+    def _replay(self):
+        # the consumer needs to see the data that have been downloaded in a previous attempt
+        start, _, done = self.plan["segments"][0]
+        with open(self.path, mode="rb") as f:
+            f.seek(start)
+            while done > 0:
+                chunk = f.read(min(done, DOWNLOAD_CHUNK_SIZE))
+                done -= len(chunk)
+                self.chunk_consumer(chunk)
+
+    def _record(self):
+        tmp_record_path = "%s.tmp" % self.record_path
+        with open(tmp_record_path, mode="wt", encoding="utf-8") as f:
+            json.dump(self.plan, f)
+        os.replace(tmp_record_path, self.record_path)
+        self.unrecorded_bytes = 0
+
+    def _completed(self, segment, size):
+        with self.lock:
+            segment[2] += size
+            self.unrecorded_bytes += size
+            if self.unrecorded_bytes >= PROGRESS_RECORD_INTERVAL_BYTES:
+                self._record()
+            if self.progress_indicator:
+                self.progress_indicator(sum(s[2] for s in self.plan["segments"]), self.plan["size"])
+
+    def _download_segment(self, index):
+        segment = self.plan["segments"][index]
+        attempt = 1
+        while True:
+            try:
+                self._download_remaining(segment)
+                return
+            except (urllib3.exceptions.HTTPError, ConnectionError) as e:
+                if attempt >= SEGMENT_ATTEMPTS:
+                    raise
+                self.logger.warning("Could not download segment [%d] of [%s] (attempt %d of %d): %s. Retrying.", index, self.url,
+                                    attempt, SEGMENT_ATTEMPTS, e)
+                attempt += 1
+
+    def _download_remaining(self, segment):
+        start, end, done = segment
+        if start + done >= end:
+            return
+        byte_range = "bytes=%d-%d" % (start + done, end - 1)
+        with _request_range(self.url, byte_range) as r:
+            if r.status != 206:
+                raise urllib.error.HTTPError(self.url, r.status, "Expected a partial response for range [%s]" % byte_range, None, None)
+            # unbuffered so that all data that we record as downloaded are passed to the OS
+            with open(self.path, mode="r+b", buffering=0) as out_file:
+                out_file.seek(start + done)
+                remaining = end - start - done
+                for chunk in r.stream(DOWNLOAD_CHUNK_SIZE):
+                    chunk = chunk[:remaining]
+                    out_file.write(chunk)
+                    if self.chunk_consumer:
+                        self.chunk_consumer(chunk)
+                    remaining -= len(chunk)
+                    self._completed(segment, len(chunk))
+                    if remaining == 0:
+                        break
+            if remaining > 0:
+                raise urllib3.exceptions.ProtocolError("Connection closed after [%d] of [%d] bytes for range [%s]" %
+                                                       (end - start - remaining, end - start, byte_range))
 
 
 def retrieve_content_as_string(url):
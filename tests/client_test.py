@@ -258,3 +258,61 @@ class EsClientFactoryTests(TestCase):
         self.assertNotIn("client_key", f.client_options)
 
         self.assertDictEqual(original_client_options, client_options)
+
+
+class BytesPassThroughSerializerTests(TestCase):
+    def test_passes_bytes_through(self):
+        delegate = mock.Mock()
+        delegate.mimetype = "application/json"
+        delegate.dumps.return_value = '{"key":"value"}'
+        delegate.loads.return_value = {"key": "value"}
+        serializer = client.BytesPassThroughSerializer(delegate)
+
+        self.assertEqual("application/json", serializer.mimetype)
+        self.assertEqual(b'{"key":"value"}\n', serializer.dumps(b'{"key":"value"}\n'))
+        delegate.dumps.assert_not_called()
+        self.assertEqual('{"key":"value"}', serializer.dumps({"key": "value"}))
+        self.assertEqual({"key": "value"}, serializer.loads('{"key":"value"}'))
+
+    def test_returns_raw_responses_on_request(self):
+        delegate = mock.Mock()
+        delegate.mimetype = "application/json"
+        delegate.loads.return_value = {"key": "value"}
+        serializer = client.BytesPassThroughSerializer(delegate)
+
+        with serializer.raw_responses():
+            self.assertEqual('{"key":"value"}', serializer.loads('{"key":"value"}'))
+        delegate.loads.assert_not_called()
+        self.assertEqual({"key": "value"}, serializer.loads('{"key":"value"}'))
+
+
+class SerializerTests(TestCase):
+    def test_uses_default_serializer(self):
+        f = client.EsClientFactory(hosts=[{"host": "127.0.0.1", "port": 9200}], client_options={})
+        self.assertEqual("json", f.serializer)
+        self.assertNotIn("serializer", f.client_options)
+
+    def test_raises_error_on_unknown_serializer(self):
+        with self.assertRaisesRegex(exceptions.SystemSetupError, r"Unknown serializer \[simplejson\] in client-options"):
+            client.EsClientFactory(hosts=[{"host": "127.0.0.1", "port": 9200}], client_options={"serializer": "simplejson"})
+
+    @mock.patch("esrally.utils.console.warn")
+    def test_falls_back_to_default_serializer_if_orjson_is_missing(self, warn):
+        import elasticsearch
+        with mock.patch.dict("sys.modules", {"orjson": None}):
+            serializer = client.create_serializer("orjson")
+        self.assertIsInstance(serializer, elasticsearch.serializer.JSONSerializer)
+        warn.assert_called_once()
+
+    def test_orjson_serializer(self):
+        orjson = mock.Mock()
+        orjson.dumps.return_value = b'{"key":"value"}'
+        orjson.loads.return_value = {"key": "value"}
+        with mock.patch.dict("sys.modules", {"orjson": orjson}):
+            serializer = client.create_serializer("orjson")
+
+        self.assertIsInstance(serializer, client.OrjsonSerializer)
+        self.assertEqual("application/json", serializer.mimetype)
+        self.assertEqual('{"key":"value"}', serializer.dumps({"key": "value"}))
+        self.assertEqual('{"key":"value"}', serializer.dumps('{"key":"value"}'))
+        self.assertEqual({"key": "value"}, serializer.loads('{"key":"value"}'))
@@ -48,6 +48,15 @@ class DriverTestParamSourceWithProgress:
         return self._params
 
 
+class DriverTestParamSourceWithClose(DriverTestParamSource):
+    def __init__(self, track=None, params=None, **kwargs):
+        super().__init__(track, params, **kwargs)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
 class DriverTests(TestCase):
     def __init__(self, methodName='runTest'):
         super().__init__(methodName)
@@ -134,6 +143,28 @@ class DriverTests(TestCase):
         # Did we start all load generators? There is no specific mock assert for this...
         self.assertEqual(4, target.start_load_generator.call_count)
 
+    def test_assign_clients_to_async_load_generators(self):
+        self.cfg.add(config.Scope.applicationOverride, "driver", "load_generator.mode", "asyncio")
+        self.cfg.add(config.Scope.applicationOverride, "driver", "load_generator.clients", 3)
+        target = self.create_test_driver_target()
+        target.create_async_client.side_effect = ["load_generator_1", "load_generator_2"]
+        d = driver.Driver(target, self.cfg)
+
+        d.start_benchmark(t=self.track, lap=1, metrics_meta_info={})
+        d.after_track_prepared()
+
+        self.assertEqual(0, target.create_client.call_count)
+        target.create_async_client.assert_has_calls(calls=[
+            mock.call("localhost"),
+            mock.call("localhost"),
+        ])
+        # we still track one entry per client
+        self.assertEqual(["load_generator_1", "load_generator_1", "load_generator_1", "load_generator_2"], d.drivers)
+        target.start_async_load_generator.assert_has_calls(calls=[
+            mock.call("load_generator_1", [0, 1, 2], self.cfg, self.track, [d.allocations[0], d.allocations[1], d.allocations[2]]),
+            mock.call("load_generator_2", [3], self.cfg, self.track, [d.allocations[3]]),
+        ])
+
     def test_client_reaches_join_point_others_still_executing(self):
         target = self.create_test_driver_target()
         d = driver.Driver(target, self.cfg)
@@ -187,6 +218,26 @@ class DriverTests(TestCase):
         self.assertEqual(1, target.on_task_finished.call_count)
         self.assertEqual(4, target.drive_at.call_count)
 
+    def test_sample_watermarks_consider_active_clients_only(self):
+        d = driver.Driver(self.create_test_driver_target(), self.cfg)
+        index = track.Task("index", track.Operation("index", track.OperationType.Bulk))
+        search = track.Task("search", track.Operation("search", track.OperationType.Search))
+
+        def sample(client_id, task, absolute_time):
+            return driver.Sample(client_id, absolute_time, absolute_time - 1470838590, task, metrics.SampleType.Normal, None, -1, -1, 1,
+                                 "docs", 1, None)
+
+        d.most_recent_sample_per_client = {
+            0: sample(0, index, 1470838600),
+            1: sample(1, index, 1470838598),
+            2: sample(2, search, 1470838599),
+            3: sample(3, index, 1470838595)
+        }
+        # client 3 has already reached the join point
+        d.clients_completed_current_step = {3: (10, 1)}
+
+        self.assertEqual({index: 1470838598, search: 1470838599}, d.sample_watermarks())
+
 
 class ScheduleTestCase(TestCase):
     def assert_schedule(self, expected_schedule, schedule, eternal_schedule=False):
@@ -359,6 +410,71 @@ class AllocatorTests(TestCase):
         self.assertEqual([2, 0], final_join_point.clients_executing_completing_task)
 
 
+class SamplePostprocessorTests(TestCase):
+    def setUp(self):
+        self.metrics_store = mock.create_autospec(metrics.MetricsStore)
+        self.task = track.Task("index", track.Operation("index-op", track.OperationType.Bulk, meta_data={"op-meta": "a"}),
+                               meta_data={"task-meta": "b"})
+        self.postprocessor = driver.SamplePostprocessor(self.metrics_store, track_meta_data={"track-meta": "c"},
+                                                        challenge_meta_data=None)
+        self.postprocessor.start()
+
+    def tearDown(self):
+        self.postprocessor.stop()
+
+    def test_stores_metrics_of_all_samples(self):
+        self.postprocessor.add([
+            driver.Sample(0, 1470838595, 21, self.task, metrics.SampleType.Normal, {"success": True}, 10, 9, 5000, "docs", 1, 0.5),
+        ])
+        self.postprocessor.add([
+            driver.Sample(1, 1470838596, 22, self.task, metrics.SampleType.Normal, None, 12, 11, 5000, "docs", 2, 1.0),
+        ])
+        self.postprocessor.drain()
+
+        calls = self.metrics_store.put_value_cluster_level.call_args_list
+        names = [c[1]["name"] for c in calls]
+        self.assertEqual(2, names.count("latency"))
+        self.assertEqual(2, names.count("service_time"))
+        self.assertIn("throughput", names)
+
+        first_latency = calls[0][1]
+        self.assertEqual(10, first_latency["value"])
+        self.assertEqual({"track-meta": "c", "op-meta": "a", "task-meta": "b", "success": True}, first_latency["meta_data"])
+
+        second_latency = [c[1] for c in calls if c[1]["name"] == "latency"][1]
+        self.assertEqual({"track-meta": "c", "op-meta": "a", "task-meta": "b"}, second_latency["meta_data"])
+        self.assertEqual(0, self.metrics_store.flush.call_count)
+
+    def test_stores_schedule_lag_of_throttled_samples(self):
+        self.postprocessor.add([
+            driver.Sample(0, 1470838595, 21, self.task, metrics.SampleType.Normal, None, 10, 9, 5000, "docs", 1, 0.5, 0.25),
+            driver.Sample(0, 1470838596, 22, self.task, metrics.SampleType.Normal, None, 12, 11, 5000, "docs", 2, 1.0),
+        ])
+        self.postprocessor.drain()
+
+        schedule_lags = [c[1] for c in self.metrics_store.put_value_cluster_level.call_args_list if c[1]["name"] == "schedule_lag"]
+        self.assertEqual(1, len(schedule_lags))
+        self.assertEqual(0.25, schedule_lags[0]["value"])
+        self.assertEqual("ms", schedule_lags[0]["unit"])
+
+    def test_flushes_on_request(self):
+        self.postprocessor.add([
+            driver.Sample(0, 1470838595, 21, self.task, metrics.SampleType.Normal, {"success": True}, 10, 9, 5000, "docs", 1, 0.5),
+        ])
+        self.postprocessor.request_flush()
+        self.postprocessor.drain()
+
+        self.metrics_store.flush.assert_called_once_with(refresh=False)
+
+    def test_reports_failures(self):
+        self.metrics_store.put_value_cluster_level.side_effect = ValueError("unit test failure")
+        self.postprocessor.add([
+            driver.Sample(0, 1470838595, 21, self.task, metrics.SampleType.Normal, {"success": True}, 10, 9, 5000, "docs", 1, 0.5),
+        ])
+        with self.assertRaisesRegex(exceptions.RallyError, r"Could not post-process samples"):
+            self.postprocessor.drain()
+
+
 class MetricsAggregationTests(TestCase):
     def setUp(self):
         params.register_param_source_for_name("driver-test-param-source", DriverTestParamSource)
@@ -411,10 +527,121 @@ class MetricsAggregationTests(TestCase):
         self.assertEqual((1470838600, 26, metrics.SampleType.Normal, 6666.666666666667, "docs/s"), throughput[5])
         # self.assertEqual((1470838600.5, 26.5, metrics.SampleType.Normal, 10000), throughput[6])
 
+    def test_incremental_calculation_matches_reference_implementation(self):
+        import random
+        rnd = random.Random(42)
+        ops = [track.Operation("index", track.OperationType.Bulk, param_source="driver-test-param-source"),
+               track.Operation("search", track.OperationType.Search, param_source="driver-test-param-source")]
+
+        for _ in range(20):
+            calculator = driver.ThroughputCalculator()
+            reference = ReferenceThroughputCalculator()
+            t = {op: 1470838595.0 for op in ops}
+            for _ in range(rnd.randint(1, 6)):
+                samples = []
+                for _ in range(rnd.randint(1, 300)):
+                    op = rnd.choice(ops)
+                    # create ties once in a while
+                    t[op] += rnd.choice([0, 0.01, 0.25, 0.7])
+                    sample_type = metrics.SampleType.Warmup if t[op] < 1470838605 else metrics.SampleType.Normal
+                    samples.append(driver.Sample(rnd.randint(0, 3), t[op], t[op] - 1470838590, op, sample_type, None, -1, -1,
+                                                 rnd.choice([1, 1000, 5000, 0.5]), rnd.choice(["docs", "ops"]), 1, None))
+                # client samples arrive in an arbitrary order
+                rnd.shuffle(samples)
+                self.assertEqual(reference.calculate(samples), calculator.calculate(samples))
+
+    def test_watermarks_hold_back_samples_until_all_clients_have_caught_up(self):
+        op = track.Operation("index", track.OperationType.Bulk, param_source="driver-test-param-source")
+
+        def sample(client_id, t):
+            return driver.Sample(client_id, 1470838595 + t, 21 + t, op, metrics.SampleType.Normal, None, -1, -1, 1000, "docs", t, None)
+
+        # client 1 lags behind so its samples for the same points in time arrive after the ones of client 0
+        batches = [
+            ([sample(1, 0.5)], {op: 1470838595.5}),
+            ([sample(0, t) for t in [0.5, 1.0, 1.5, 2.0, 2.5, 3.0]], {op: 1470838595.5}),
+            ([sample(1, t) for t in [1.0, 1.5, 2.0, 2.5, 3.0]], {op: 1470838598.0}),
+            # all samples have arrived
+            ([], None)
+        ]
+        expected = self.calculate_global_throughput([s for samples, _ in batches for s in samples])[op]
+        self.assertEqual(3, len(expected))
+
+        calculator = driver.ThroughputCalculator()
+        throughput = []
+        for samples, watermarks in batches:
+            throughput.extend(calculator.calculate(samples, watermarks=watermarks).get(op, []))
+        self.assertEqual(expected, throughput)
+
+        # without watermarks buckets are finished before the samples of client 1 have arrived
+        calculator = driver.ThroughputCalculator()
+        throughput = []
+        for samples, _ in batches:
+            throughput.extend(calculator.calculate(samples).get(op, []))
+        self.assertNotEqual(expected, throughput)
+
     def calculate_global_throughput(self, samples):
         return driver.ThroughputCalculator().calculate(samples)
 
 
+class ReferenceThroughputCalculator:
+    """
+    The original (sample by sample) throughput calculation. Only used to verify the actual implementation.
+    """
+    class TaskStats:
+        def __init__(self, sample_type, start_time):
+            self.unprocessed = []
+            self.total_count = 0
+            self.interval = 0
+            self.bucket = 1
+            self.sample_type = sample_type
+            self.has_samples_in_sample_type = False
+            self.start_time = start_time
+
+    def __init__(self):
+        self.task_stats = {}
+
+    def calculate(self, samples):
+        samples_per_task = collections.OrderedDict()
+        for sample in samples:
+            samples_per_task.setdefault(sample.task, []).append(sample)
+
+        global_throughput = {}
+        for task, v in samples_per_task.items():
+            global_throughput[task] = []
+            unprocessed = self.task_stats[task].unprocessed if task in self.task_stats else []
+            current_samples = sorted(v + unprocessed, key=lambda s: s.absolute_time)
+            if task not in self.task_stats:
+                first_sample = current_samples[0]
+                self.task_stats[task] = ReferenceThroughputCalculator.TaskStats(first_sample.sample_type,
+                                                                                first_sample.absolute_time - first_sample.time_period)
+            current = self.task_stats[task]
+            count = current.total_count
+            for sample in current_samples:
+                if current.sample_type < sample.sample_type:
+                    current.sample_type = sample.sample_type
+                    current.has_samples_in_sample_type = False
+                count += sample.total_ops
+                current.interval = max(sample.absolute_time - current.start_time, current.interval)
+                if current.interval > 0 and current.interval >= current.bucket:
+                    current.unprocessed = []
+                    current.total_count = count
+                    current.has_samples_in_sample_type = True
+                    current.bucket = int(current.interval) + 1
+                    global_throughput[task].append((sample.absolute_time, sample.relative_time, current.sample_type,
+                                                    current.total_count / current.interval, "%s/s" % sample.total_ops_unit))
+                else:
+                    current.unprocessed.append(sample)
+            if current.interval > 0 and not current.has_samples_in_sample_type:
+                current.unprocessed = []
+                current.total_count = count
+                current.has_samples_in_sample_type = True
+                current.bucket = int(current.interval) + 1
+                global_throughput[task].append((sample.absolute_time, sample.relative_time, current.sample_type,
+                                                current.total_count / current.interval, "%s/s" % sample.total_ops_unit))
+        return global_throughput
+
+
 class SchedulerTests(ScheduleTestCase):
     def setUp(self):
         params.register_param_source_for_name("driver-test-param-source", DriverTestParamSource)
@@ -439,6 +666,20 @@ class SchedulerTests(ScheduleTestCase):
         ]
         self.assert_schedule(expected_schedule, schedule)
 
+    def test_closes_param_source_with_schedule(self):
+        task = track.Task("time-based", track.Operation("time-based", track.OperationType.Bulk.name, params={"body": ["a"]}),
+                          warmup_time_period=0, time_period=60, clients=1)
+        param_source = DriverTestParamSourceWithClose(self.test_track, {"body": ["a"]})
+
+        with mock.patch("esrally.track.operation_parameters") as operation_parameters:
+            operation_parameters.return_value = param_source
+            schedule = driver.schedule_for(self.test_track, task, 0)
+
+        self.assertEqual({"body": ["a"]}, next(schedule)[4])
+        self.assertFalse(param_source.closed)
+        schedule.close()
+        self.assertTrue(param_source.closed)
+
     def test_search_task_two_clients(self):
         task = track.Task("search", track.Operation("search", track.OperationType.Search.name, param_source="driver-test-param-source"),
                           warmup_iterations=1, iterations=5, clients=2, params={"target-throughput": 10, "clients": 2})
@@ -685,6 +926,91 @@ class ExecutorTests(TestCase):
                             msg="Expected sample size to be between %d and %d but was %d" % (lower_bound, upper_bound, sample_size))
             self.assertTrue(complete.is_set(), "Executor should auto-complete a task that terminates its parent")
 
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_execute_schedule_with_precise_timing_measures_schedule_lag(self, es):
+        es.bulk.return_value = {
+            "errors": False
+        }
+
+        params.register_param_source_for_name("driver-test-param-source", DriverTestParamSource)
+        test_track = track.Track(name="unittest", description="unittest track",
+                                 indices=None,
+                                 challenges=None)
+
+        task = track.Task("time-based", track.Operation("time-based", track.OperationType.Bulk.name, params={
+            "body": ["action_metadata_line", "index_line"],
+            "action-metadata-present": True,
+            "bulk-size": 1
+        },
+                                                        param_source="driver-test-param-source"),
+                          warmup_time_period=0, time_period=0.2, clients=1,
+                          params={"target-throughput": 100, "clients": 1})
+        schedule = driver.schedule_for(test_track, task, 0)
+        sampler = driver.Sampler(client_id=0, task=task, start_timestamp=0)
+
+        execute_schedule = driver.Executor(task, schedule, es, sampler, threading.Event(), threading.Event(), precise=True)
+        execute_schedule()
+
+        samples = sampler.samples
+
+        self.assertTrue(len(samples) > 1)
+        # the first request is due immediately and thus treated like an unthrottled one
+        for sample in samples[1:]:
+            self.assertIsNotNone(sample.schedule_lag_ms)
+            # we never start a request before it is due
+            self.assertGreaterEqual(sample.schedule_lag_ms, 0)
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_execute_schedule_unthrottled_has_no_schedule_lag(self, es):
+        es.bulk.return_value = {
+            "errors": False
+        }
+
+        params.register_param_source_for_name("driver-test-param-source", DriverTestParamSource)
+        test_track = track.Track(name="unittest", description="unittest track",
+                                 indices=None,
+                                 challenges=None)
+
+        task = track.Task("time-based", track.Operation("time-based", track.OperationType.Bulk.name, params={
+            "body": ["action_metadata_line", "index_line"],
+            "action-metadata-present": True,
+            "bulk-size": 1,
+            "size": 1
+        },
+                                                        param_source="driver-test-param-source"),
+                          warmup_time_period=0, clients=1)
+        schedule = driver.schedule_for(test_track, task, 0)
+        sampler = driver.Sampler(client_id=0, task=task, start_timestamp=0)
+
+        execute_schedule = driver.Executor(task, schedule, es, sampler, threading.Event(), threading.Event(), precise=True)
+        execute_schedule()
+
+        samples = sampler.samples
+
+        self.assertTrue(len(samples) > 0)
+        for sample in samples:
+            self.assertIsNone(sample.schedule_lag_ms)
+
+    def test_closes_schedule_when_completed_externally(self):
+        closed = []
+
+        def schedule():
+            try:
+                for _ in range(100):
+                    yield (0, metrics.SampleType.Normal, None, self.context_managed(mock.Mock()), None)
+            finally:
+                closed.append(True)
+
+        task = track.Task("no-op", track.Operation("no-op", track.OperationType.Bulk.name, params={}))
+        sampler = driver.Sampler(client_id=0, task=task, start_timestamp=0)
+        complete = threading.Event()
+        complete.set()
+        execute_schedule = driver.Executor(task, schedule(), None, sampler, threading.Event(), complete)
+        execute_schedule()
+
+        self.assertEqual(1, len(sampler.samples))
+        self.assertEqual([True], closed)
+
     @mock.patch("elasticsearch.Elasticsearch")
     def test_cancel_execute_schedule(self, es):
         es.bulk.return_value = {
@@ -846,6 +1172,251 @@ class ExecutorTests(TestCase):
             ctx.exception.args[0])
 
 
+class SamplerTests(TestCase):
+    def setUp(self):
+        self.task = track.Task("index", track.Operation("index", operation_type=track.OperationType.Bulk))
+
+    def test_does_not_drop_samples(self):
+        sampler = driver.Sampler(client_id=3, task=self.task, start_timestamp=time.perf_counter())
+        for i in range(20000):
+            sampler.add(metrics.SampleType.Normal, {"success": True}, 10.0, 8.0, 5000, "docs", float(i), i / 20000)
+
+        samples = sampler.samples
+        self.assertEqual(20000, len(samples))
+        self.assertEqual(0, len(sampler.samples))
+
+    def test_restores_samples(self):
+        sampler = driver.Sampler(client_id=3, task=self.task, start_timestamp=time.perf_counter())
+        sampler.add(metrics.SampleType.Warmup, {"success": True}, 10.0, 8.0, 5000, "docs", 1.5, None)
+        sampler.add(metrics.SampleType.Normal, {"success": False}, 12.5, 9.5, 0.5, "ops", 2.5, 0.75)
+
+        first, second = sampler.samples
+
+        self.assertEqual(3, first.client_id)
+        self.assertEqual(self.task, first.task)
+        self.assertEqual(metrics.SampleType.Warmup, first.sample_type)
+        self.assertEqual({"success": True}, first.request_meta_data)
+        self.assertEqual(10.0, first.latency_ms)
+        self.assertEqual(8.0, first.service_time_ms)
+        self.assertEqual(5000, first.total_ops)
+        self.assertIsInstance(first.total_ops, int)
+        self.assertEqual("docs", first.total_ops_unit)
+        self.assertEqual(1.5, first.time_period)
+        self.assertIsNone(first.percent_completed)
+
+        self.assertEqual(metrics.SampleType.Normal, second.sample_type)
+        self.assertEqual({"success": False}, second.request_meta_data)
+        self.assertEqual(0.5, second.total_ops)
+        self.assertEqual("ops", second.total_ops_unit)
+        self.assertEqual(0.75, second.percent_completed)
+        self.assertLessEqual(first.absolute_time, second.absolute_time)
+        self.assertLessEqual(first.relative_time, second.relative_time)
+
+    def test_swaps_buffers_on_drain(self):
+        sampler = driver.Sampler(client_id=0, task=self.task, start_timestamp=time.perf_counter())
+        sampler.add(metrics.SampleType.Normal, None, 10.0, 8.0, 1, "ops", 1.0, 0.5)
+        drained = sampler.drain()
+        self.assertEqual(1, len(drained))
+
+        # new samples go to the other buffer
+        sampler.add(metrics.SampleType.Normal, None, 10.0, 8.0, 1, "ops", 2.0, 0.6)
+        sampler.add(metrics.SampleType.Normal, None, 10.0, 8.0, 1, "ops", 3.0, 0.7)
+        self.assertEqual(1, len(drained))
+        self.assertEqual(2, len(sampler.drain()))
+
+
+class SampleEncodingTests(TestCase):
+    def test_encode_and_decode_samples(self):
+        task = track.Task("index", track.Operation("index", operation_type=track.OperationType.Bulk))
+        sampler = driver.Sampler(client_id=7, task=task, start_timestamp=time.perf_counter())
+        sampler.add(metrics.SampleType.Warmup, {"success": True, "bulk-size": 5000}, 10.25, 8.5, 5000, "docs", 1.5, None)
+        sampler.add(metrics.SampleType.Normal, None, 12.5, 9.5, 1, "ops", 2.5, 0.75)
+        sampler.add(metrics.SampleType.Normal, {"success": False, "error-type": "transport", "http-status": 429}, 20, 19, 0, "ops", 3.5,
+                    0.8)
+        buffer = sampler.drain()
+        original = buffer.to_samples()
+
+        encoded = driver.encode_samples(buffer)
+        self.assertIsInstance(encoded, bytes)
+        decoded = driver.decode_samples(encoded)
+
+        self.assertEqual(len(original), len(decoded))
+        for expected, actual in zip(original, decoded):
+            self.assertEqual(7, actual.client_id)
+            self.assertEqual(task, actual.task)
+            self.assertAlmostEqual(expected.absolute_time, actual.absolute_time, places=6)
+            self.assertAlmostEqual(expected.relative_time, actual.relative_time, places=6)
+            self.assertAlmostEqual(expected.time_period, actual.time_period, places=6)
+            self.assertEqual(expected.sample_type, actual.sample_type)
+            self.assertEqual(expected.request_meta_data, actual.request_meta_data)
+            self.assertEqual(expected.latency_ms, actual.latency_ms)
+            self.assertEqual(expected.service_time_ms, actual.service_time_ms)
+            self.assertEqual(expected.total_ops, actual.total_ops)
+            self.assertEqual(expected.total_ops_unit, actual.total_ops_unit)
+            self.assertEqual(expected.percent_completed, actual.percent_completed)
+
+    def test_encode_and_decode_schedule_lag(self):
+        task = track.Task("index", track.Operation("index", operation_type=track.OperationType.Bulk))
+        sampler = driver.Sampler(client_id=7, task=task, start_timestamp=time.perf_counter())
+        sampler.add(metrics.SampleType.Normal, None, 12.5, 9.5, 1, "ops", 2.5, 0.75, 0.125)
+        sampler.add(metrics.SampleType.Normal, None, 12.5, 9.5, 1, "ops", 3.5, 0.8)
+
+        first, second = driver.decode_samples(driver.encode_samples(sampler.drain()))
+
+        self.assertEqual(0.125, first.schedule_lag_ms)
+        self.assertIsNone(second.schedule_lag_ms)
+
+    def test_decode_rejects_unknown_version(self):
+        import pickle
+        import zlib
+        data = zlib.compress(pickle.dumps((driver.SAMPLE_ENCODING_VERSION + 1,) + (None,) * 16))
+        with self.assertRaisesRegex(exceptions.RallyAssertionError, r"Cannot decode samples with encoding version"):
+            driver.decode_samples(data)
+
+
+class AsyncExecutorTests(TestCase):
+    def setUp(self):
+        runner.register_default_runners()
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_execute_schedule_as_coroutine(self, es):
+        import asyncio
+        import concurrent.futures
+        from esrally.driver import async_driver
+
+        es.bulk.return_value = {
+            "errors": False
+        }
+
+        params.register_param_source_for_name("driver-test-param-source", DriverTestParamSource)
+        test_track = track.Track(name="unittest", description="unittest track",
+                                 indices=None,
+                                 challenges=None)
+
+        task = track.Task("time-based", track.Operation("time-based", track.OperationType.Bulk.name, params={
+            "body": ["action_metadata_line", "index_line"],
+            "action-metadata-present": True,
+            "bulk-size": 1,
+            "size": 1
+        },
+                                                        param_source="driver-test-param-source"),
+                          warmup_time_period=0, clients=4, params={"target-throughput": 200})
+        schedule = driver.schedule_for(test_track, task, 0)
+
+        sampler = driver.Sampler(client_id=2, task=task, start_timestamp=time.perf_counter())
+        cancel = threading.Event()
+        complete = threading.Event()
+        request_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+        execute_schedule = async_driver.AsyncExecutor(task, schedule, es, sampler, cancel, complete, request_pool)
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(execute_schedule())
+        finally:
+            loop.close()
+            request_pool.shutdown()
+
+        samples = sampler.samples
+
+        self.assertTrue(len(samples) > 0)
+        self.assertFalse(complete.is_set(), "Executor should not auto-complete a normal task")
+        for sample in samples:
+            self.assertEqual(2, sample.client_id)
+            self.assertEqual(task, sample.task)
+            self.assertEqual(metrics.SampleType.Normal, sample.sample_type)
+            self.assertEqual(1, sample.total_ops)
+            self.assertEqual("docs", sample.total_ops_unit)
+            self.assertEqual(1, sample.request_meta_data["bulk-size"])
+
+    @mock.patch("esrally.driver.driver.spin_until")
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_spins_on_request_thread_with_precise_timing(self, es, spin_until):
+        import asyncio
+        import concurrent.futures
+        from esrally.driver import async_driver
+
+        es.bulk.return_value = {
+            "errors": False
+        }
+        spinning_threads = set()
+        spin_until.side_effect = lambda deadline: spinning_threads.add(threading.current_thread())
+
+        params.register_param_source_for_name("driver-test-param-source", DriverTestParamSource)
+        test_track = track.Track(name="unittest", description="unittest track", indices=None, challenges=None)
+        task = track.Task("time-based", track.Operation("time-based", track.OperationType.Bulk.name, params={
+            "body": ["action_metadata_line", "index_line"],
+            "action-metadata-present": True,
+            "bulk-size": 1,
+            "size": 5
+        },
+                                                        param_source="driver-test-param-source"),
+                          warmup_time_period=0, clients=1, params={"target-throughput": 200})
+        schedule = driver.schedule_for(test_track, task, 0)
+        sampler = driver.Sampler(client_id=0, task=task, start_timestamp=time.perf_counter())
+        request_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+        execute_schedule = async_driver.AsyncExecutor(task, schedule, es, sampler, threading.Event(), threading.Event(), request_pool,
+                                                      precise=True)
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(execute_schedule())
+        finally:
+            loop.close()
+            request_pool.shutdown()
+
+        samples = sampler.samples
+        self.assertEqual(5, len(samples))
+        # the first request is due immediately and is not throttled
+        self.assertEqual(4, spin_until.call_count)
+        self.assertNotIn(threading.current_thread(), spinning_threads)
+
+
+class PreciseTimingTests(TestCase):
+    def test_timing_mode_defaults_to_sleep(self):
+        cfg = config.Config()
+        self.assertFalse(driver.precise_timing(cfg))
+
+    def test_precise_timing_mode(self):
+        cfg = config.Config()
+        cfg.add(config.Scope.application, "driver", "timing.mode", "precise")
+        self.assertTrue(driver.precise_timing(cfg))
+
+    def test_rejects_unknown_timing_mode(self):
+        cfg = config.Config()
+        cfg.add(config.Scope.application, "driver", "timing.mode", "spin")
+        with self.assertRaisesRegex(exceptions.SystemSetupError, r"Unknown timing mode \[spin\]."):
+            driver.precise_timing(cfg)
+
+    def test_executes_request_after_deadline(self):
+        deadline = time.perf_counter() + 0.005
+        runner = mock.MagicMock(return_value=(3, "ops"))
+        start, total_ops, total_ops_unit, request_meta_data = driver.execute_single_at(deadline, runner, None, {})
+        self.assertGreaterEqual(start, deadline)
+        self.assertEqual(3, total_ops)
+        self.assertEqual("ops", total_ops_unit)
+        runner.assert_called_once_with(None, {})
+
+    @mock.patch("time.sleep", wraps=time.sleep)
+    def test_sleeps_and_spins_until_deadline(self, sleep):
+        deadline = time.perf_counter() + 0.05
+        driver.wait_until_precisely(deadline)
+
+        self.assertGreaterEqual(time.perf_counter(), deadline)
+        # we sleep for most of the time and only spin for the remainder
+        first_sleep = sleep.call_args_list[0][0][0]
+        self.assertLess(first_sleep, 0.05 - driver.PRECISE_TIMING_SPIN_PERIOD)
+        self.assertGreater(first_sleep, 0.03)
+        for c in sleep.call_args_list[1:]:
+            self.assertEqual(0, c[0][0])
+
+    @mock.patch("time.sleep")
+    def test_does_not_sleep_shortly_before_deadline(self, sleep):
+        deadline = time.perf_counter() - 1
+        driver.wait_until_precisely(deadline)
+
+        self.assertEqual(0, sleep.call_count)
+
+
 class ProfilerTests(TestCase):
     def test_profiler_is_a_transparent_wrapper(self):
         import time
@@ -1,4 +1,6 @@
+import gzip
 import io
+import json
 import random
 import unittest.mock as mock
 from unittest import TestCase
@@ -102,6 +104,36 @@ class RegisterRunnerTests(TestCase):
         self.assertEqual("user-defined multi-cluster enabled runner for [UnitTestMultiClusterRunner]", repr(returned_runner))
 
 
+class ParseTests(TestCase):
+    def test_parses_requested_properties_only(self):
+        response = '{"took": 5, "timed_out" : false, "_shards": {"total": 1, "failed": 0}, ' \
+                   '"hits": {"total": 2, "max_score": 1.0, "hits": [{"_id": "1"}, {"_id": "2"}]}}'
+        self.assertEqual({"took": 5, "timed_out": False, "hits.total": 2},
+                         runner.parse(response, ["took", "timed_out", "hits.total"]))
+
+    def test_stops_parsing_when_all_properties_are_found(self):
+        # everything after ``hits.total`` is invalid JSON but never parsed
+        response = '{"took":5,"hits":{"total":{"value":2,"relation":"eq"},"hits":[not parsed'
+        self.assertEqual({"took": 5, "hits.total": {"value": 2, "relation": "eq"}}, runner.parse(response, ["took", "hits.total"]))
+
+    def test_omits_missing_properties(self):
+        self.assertEqual({"errors": True}, runner.parse('{"errors":true,"items":[],"nested":{}}', ["errors", "took", "nested.key"]))
+
+    def test_does_not_treat_nested_keys_as_top_level_keys(self):
+        response = '{"hits":{"hits":[{"_source":{"took":17}}]},"took":3}'
+        self.assertEqual({"took": 3}, runner.parse(response, ["took"]))
+
+    def test_raises_error_on_invalid_json(self):
+        with self.assertRaises(ValueError):
+            runner.parse('["took", 3]', ["took"])
+        with self.assertRaises(ValueError):
+            runner.parse('{"took" 3}', ["took"])
+
+    def test_extracts_properties_of_deserialized_response(self):
+        response = {"took": 3, "hits": {"total": 2, "hits": []}}
+        self.assertEqual({"took": 3, "hits.total": 2}, runner.extract(response, ["took", "hits.total", "timed_out", "took.value"]))
+
+
 class BulkIndexRunnerTests(TestCase):
     @mock.patch("elasticsearch.Elasticsearch")
     def test_bulk_index_missing_params(self, es):
@@ -126,6 +158,245 @@ class BulkIndexRunnerTests(TestCase):
         self.assertEqual("Parameter source for operation 'bulk-index' did not provide the mandatory parameter 'action-metadata-present'. "
                          "Please add it to your parameter source.", ctx.exception.args[0])
 
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_parses_raw_response(self, es):
+        es.bulk.return_value = '{"took":8,"errors":false,"items":[{"index":{"status":201}},{"index":{"status":201}}]}'
+        bulk = runner.BulkIndex()
+
+        bulk_params = {
+            "body": ["action_meta_data", "index_line", "action_meta_data", "index_line"],
+            "action-metadata-present": True,
+            "bulk-size": 2,
+            "filter-response": True
+        }
+
+        result = bulk(es, bulk_params)
+
+        self.assertEqual(8, result["took"])
+        self.assertTrue(result["success"])
+        self.assertEqual(2, result["success-count"])
+        es.transport.serializer.raw_responses.assert_called_once_with()
+        es.transport.serializer.loads.assert_not_called()
+        es.bulk.assert_called_with(body=bulk_params["body"],
+                                   params={"filter_path": "took,errors,items.*.status,items.*.error.reason,items.*._shards.failed"})
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_deserializes_raw_response_with_errors(self, es):
+        es.bulk.return_value = '{"took":8,"errors":true,"items":[{"index":{"status":201,"_shards":{"failed":0}}},' \
+                               '{"index":{"status":429,"error":{"reason":"rejected"}}}]}'
+        es.transport.serializer.loads.side_effect = json.loads
+        bulk = runner.BulkIndex()
+
+        bulk_params = {
+            "body": ["action_meta_data", "index_line", "action_meta_data", "index_line"],
+            "action-metadata-present": True,
+            "bulk-size": 2
+        }
+
+        result = bulk(es, bulk_params)
+
+        self.assertEqual(8, result["took"])
+        self.assertFalse(result["success"])
+        self.assertEqual(1, result["success-count"])
+        self.assertEqual(1, result["error-count"])
+        self.assertEqual("HTTP status: 429, message: rejected", result["error-description"])
+        es.bulk.assert_called_with(body=bulk_params["body"], params={})
+
+    @staticmethod
+    def bulk_item(op, status):
+        item = {"status": status, "_shards": {"total": 2, "successful": 1, "failed": 0}}
+        if status == 429:
+            item = {"status": status, "error": {"type": "es_rejected_execution_exception", "reason": "rejected execution"}}
+        return {op: item}
+
+    @mock.patch("random.uniform", lambda a, b: b)
+    @mock.patch("time.sleep")
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_retries_rejected_items(self, es, sleep):
+        es.bulk.side_effect = [
+            {"took": 10, "errors": True, "items": [self.bulk_item("index", 201), self.bulk_item("delete", 429),
+                                                   self.bulk_item("index", 429)]},
+            {"took": 5, "errors": True, "items": [self.bulk_item("delete", 200), self.bulk_item("index", 429)]},
+            {"took": 2, "errors": False, "items": [self.bulk_item("index", 201)]}
+        ]
+        bulk = runner.BulkIndex()
+
+        bulk_params = {
+            "body": [
+                '{"index": {"_id": "1"}}',
+                '{"location" : [-0.1485188, 51.5250666]}',
+                '{"delete": {"_id": "2"}}',
+                '{"index": {"_id": "3"}}',
+                '{"location" : [-0.1479949, 51.5252071]}'
+            ],
+            "action-metadata-present": True,
+            "bulk-size": 3,
+            "retry-rejected": 5,
+            "retry-initial-backoff": 0.5
+        }
+
+        result = bulk(es, bulk_params)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(3, result["success-count"])
+        self.assertEqual(0, result["error-count"])
+        self.assertEqual(10, result["took"])
+        self.assertEqual(2, result["retries"])
+        self.assertEqual(3, result["retried-docs"])
+        self.assertGreaterEqual(result["retry-time"], 0)
+        sleep.assert_has_calls([mock.call(0.5), mock.call(1.0)])
+        es.bulk.assert_has_calls([
+            mock.call(body=bulk_params["body"], params={}),
+            mock.call(body=bulk_params["body"][2:], params={}),
+            mock.call(body=bulk_params["body"][3:], params={})
+        ])
+
+    @mock.patch("time.sleep")
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_gives_up_retrying_rejected_raw_items(self, es, sleep):
+        es.transport.perform_request.side_effect = [
+            {"took": 10, "errors": True, "items": [self.bulk_item("index", 429), self.bulk_item("index", 201)]},
+            {"took": 5, "errors": True, "items": [self.bulk_item("index", 429)]}
+        ]
+        bulk = runner.BulkIndex()
+
+        body = b'{"index": {"_id": "1"}}\n{"location" : [-0.1485188, 51.5250666]}\n' \
+               b'{"index": {"_id": "2"}}\n{"location" : [-0.1479949, 51.5252071]}\n'
+        bulk_params = {
+            "body": gzip.compress(body),
+            "index": "test",
+            "action-metadata-present": True,
+            "bulk-size": 2,
+            "precompress": True,
+            "retry-rejected": 1
+        }
+
+        result = bulk(es, bulk_params)
+
+        self.assertFalse(result["success"])
+        self.assertEqual(1, result["success-count"])
+        self.assertEqual(1, result["error-count"])
+        self.assertEqual("HTTP status: 429, message: rejected execution", result["error-description"])
+        self.assertEqual(1, result["retries"])
+        self.assertEqual(1, result["retried-docs"])
+        self.assertEqual(1, sleep.call_count)
+        # the retry is sent uncompressed
+        es.transport.perform_request.assert_called_with("POST", "/_bulk", params={},
+                                                        body=b'{"index": {"_id": "1"}}\n{"location" : [-0.1485188, 51.5250666]}\n',
+                                                        headers={"content-type": "application/x-ndjson"})
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_does_not_retry_without_rejections(self, es):
+        es.bulk.return_value = {"took": 10, "errors": False, "items": [self.bulk_item("index", 201)]}
+        bulk = runner.BulkIndex()
+
+        result = bulk(es, {
+            "body": ['{"index": {"_id": "1"}}', '{"location" : [-0.1485188, 51.5250666]}'],
+            "action-metadata-present": True,
+            "bulk-size": 1,
+            "retry-rejected": 3
+        })
+
+        self.assertTrue(result["success"])
+        self.assertNotIn("retries", result)
+        es.bulk.assert_called_once_with(body=['{"index": {"_id": "1"}}', '{"location" : [-0.1485188, 51.5250666]}'], params={})
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_raw_bytes(self, es):
+        es.transport.perform_request.return_value = {
+            "errors": False,
+            "took": 8
+        }
+        bulk = runner.BulkIndex()
+
+        bulk_params = {
+            "body": b"action_meta_data\nindex_line\naction_meta_data\nindex_line\n",
+            "action-metadata-present": True,
+            "bulk-size": 2,
+            "pipeline": "test-pipeline"
+        }
+
+        result = bulk(es, bulk_params)
+
+        self.assertEqual(8, result["took"])
+        self.assertEqual(2, result["weight"])
+        self.assertEqual(56, result["bulk-size-bytes"])
+        self.assertEqual(True, result["success"])
+        self.assertEqual(0, result["error-count"])
+
+        es.transport.perform_request.assert_called_with("POST", "/_bulk", params={"pipeline": "test-pipeline"},
+                                                        body=bulk_params["body"], headers={"content-type": "application/x-ndjson"})
+        es.bulk.assert_not_called()
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_raw_bytes_detailed_results(self, es):
+        es.transport.perform_request.return_value = {
+            "took": 30,
+            "errors": False,
+            "items": [
+                {
+                    "index": {
+                        "_index": "test",
+                        "_type": "type1",
+                        "result": "created",
+                        "_shards": {"total": 2, "successful": 1, "failed": 0},
+                        "status": 201
+                    }
+                }
+            ]
+        }
+        bulk = runner.BulkIndex()
+
+        result = bulk(es, {
+            "body": b'{ "index" : { "_index" : "test", "_type" : "type1" } }\n{"location" : [-0.1485188, 51.5250666]}\n',
+            "action-metadata-present": True,
+            "bulk-size": 1,
+            "detailed-results": True
+        })
+
+        self.assertEqual(93, result["bulk-request-size-bytes"])
+        self.assertEqual(39, result["total-document-size-bytes"])
+        self.assertEqual({"index": {"item-count": 1, "created": 1}}, result["ops"])
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_precompressed(self, es):
+        es.transport.perform_request.return_value = {
+            "took": 30,
+            "errors": False,
+            "items": [
+                {
+                    "index": {
+                        "_index": "test",
+                        "_type": "type1",
+                        "result": "created",
+                        "_shards": {"total": 2, "successful": 1, "failed": 0},
+                        "status": 201
+                    }
+                }
+            ]
+        }
+        bulk = runner.BulkIndex()
+
+        body = gzip.compress(b'{ "index" : { "_index" : "test", "_type" : "type1" } }\n{"location" : [-0.1485188, 51.5250666]}\n')
+        bulk_params = {
+            "body": body,
+            "action-metadata-present": True,
+            "bulk-size": 1,
+            "precompress": True,
+            "detailed-results": True
+        }
+
+        result = bulk(es, bulk_params)
+
+        self.assertEqual(True, result["success"])
+        self.assertEqual(len(body), result["compressed-size-bytes"])
+        self.assertEqual(95, result["uncompressed-size-bytes"])
+        self.assertEqual(95, result["bulk-size-bytes"])
+        self.assertEqual(93, result["bulk-request-size-bytes"])
+        self.assertEqual(39, result["total-document-size-bytes"])
+        es.transport.perform_request.assert_called_with("POST", "/_bulk", params={}, body=body,
+                                                        headers={"content-type": "application/x-ndjson", "content-encoding": "gzip"})
+
     @mock.patch("elasticsearch.Elasticsearch")
     def test_bulk_index_success_with_metadata(self, es):
         es.bulk.return_value = {
@@ -159,6 +430,58 @@ class BulkIndexRunnerTests(TestCase):
 
         es.bulk.assert_called_with(body=bulk_params["body"], params={})
 
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_returns_prefetch_stats(self, es):
+        es.bulk.return_value = {
+            "errors": False
+        }
+        bulk = runner.BulkIndex()
+
+        bulk_params = {
+            "body": [
+                "action_meta_data",
+                "index_line"
+            ],
+            "action-metadata-present": True,
+            "bulk-size": 1,
+            "prefetch-queue-depth": 7,
+            "prefetch-stall-time": 0.25
+        }
+
+        result = bulk(es, bulk_params)
+
+        self.assertEqual(True, result["success"])
+        self.assertEqual(7, result["prefetch-queue-depth"])
+        self.assertEqual(0.25, result["prefetch-stall-time"])
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_returns_size_in_bytes_of_param_source(self, es):
+        es.bulk.return_value = {
+            "errors": False
+        }
+        bulk = runner.BulkIndex()
+
+        result = bulk(es, {
+            "body": [
+                "action_meta_data",
+                "index_line"
+            ],
+            "action-metadata-present": True,
+            "bulk-size": 1,
+            "bulk-size-bytes": 28
+        })
+        self.assertEqual(28, result["bulk-size-bytes"])
+
+        result = bulk(es, {
+            "body": [
+                "action_meta_data",
+                "index_line"
+            ],
+            "action-metadata-present": True,
+            "bulk-size": 1
+        })
+        self.assertNotIn("bulk-size-bytes", result)
+
     @mock.patch("elasticsearch.Elasticsearch")
     def test_bulk_index_success_without_metadata(self, es):
         es.bulk.return_value = {
@@ -972,6 +1295,32 @@ class QueryRunnerTests(TestCase):
         self.assertFalse(results["timed_out"])
         self.assertFalse("error-type" in results)
 
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_query_parses_raw_response(self, es):
+        es.search.return_value = '{"took":5,"timed_out":false,"hits":{"total":2,"max_score":1.0,"hits":[{"_id":"1"},{"_id":"2"}]}}'
+
+        query_runner = runner.Query()
+
+        params = {
+            "body": {
+                "query": {
+                    "match_all": {}
+                }
+            },
+            "filter-response": True
+        }
+
+        with query_runner:
+            result = query_runner(es, params)
+
+        self.assertEqual(1, result["weight"])
+        self.assertEqual("ops", result["unit"])
+        self.assertEqual(2, result["hits"])
+        self.assertFalse(result["timed_out"])
+        self.assertEqual(5, result["took"])
+        es.transport.serializer.raw_responses.assert_called_once_with()
+        es.search.assert_called_once_with(index="_all", doc_type=None, body=params["body"], filter_path="took,timed_out,hits.total")
+
 
 class PutPipelineRunnerTests(TestCase):
     @mock.patch("elasticsearch.Elasticsearch")
@@ -1475,6 +1824,185 @@ class CloseMlJobTests(TestCase):
         es.xpack.ml.close_job.assert_called_once_with(job_id=params["job-id"], force=params["force"], timeout=params["timeout"])
 
 
+class MultiSearchRunnerTests(TestCase):
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_msearch(self, es):
+        es.transport.perform_request.return_value = {
+            "took": 12,
+            "responses": [
+                {"took": 2, "timed_out": False, "hits": {"total": 3, "hits": []}, "status": 200},
+                {"took": 10, "timed_out": False, "hits": {"total": {"value": 5, "relation": "eq"}, "hits": []}, "status": 200},
+                {"took": 4, "timed_out": True, "hits": {"total": 0, "hits": []}, "status": 200}
+            ]
+        }
+        params = {
+            "body": b'{"index":"logs"}\n{"query":{"match_all":{}}}\n' * 3,
+            "searches": 3,
+            "request-params": {},
+            "filter-response": True
+        }
+
+        result = runner.MultiSearch()(es, params)
+
+        self.assertEqual(3, result["weight"])
+        self.assertEqual("ops", result["unit"])
+        self.assertEqual(3, result["searches"])
+        self.assertEqual(8, result["hits"])
+        self.assertTrue(result["timed_out"])
+        self.assertEqual(12, result["took"])
+        self.assertEqual({"50_0", "90_0", "99_0", "100_0"}, set(result["took-percentiles"].keys()))
+        self.assertEqual(4, result["took-percentiles"]["50_0"])
+        self.assertAlmostEqual(8.8, result["took-percentiles"]["90_0"])
+        self.assertAlmostEqual(9.88, result["took-percentiles"]["99_0"])
+        self.assertEqual(10, result["took-percentiles"]["100_0"])
+        self.assertTrue(result["success"])
+        self.assertEqual(3, result["success-count"])
+        self.assertEqual(0, result["error-count"])
+        es.transport.perform_request.assert_called_once_with(
+            "POST", "/_msearch", body=params["body"], headers={"content-type": "application/x-ndjson"},
+            params={"filter_path": "took,responses.took,responses.timed_out,responses.hits.total,responses.status,"
+                                   "responses.error.type,responses.error.reason"})
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_msearch_with_errors(self, es):
+        es.transport.perform_request.return_value = {
+            "took": 5,
+            "responses": [
+                {"took": 5, "timed_out": False, "hits": {"total": 3, "hits": []}, "status": 200},
+                {"error": {"type": "index_not_found_exception", "reason": "no such index"}, "status": 404}
+            ]
+        }
+        params = {
+            "body": b'{"index":"logs"}\n{"query":{"match_all":{}}}\n{"index":"unknown"}\n{"query":{"match_all":{}}}\n',
+            "searches": 2
+        }
+
+        result = runner.MultiSearch()(es, params)
+
+        self.assertEqual(2, result["weight"])
+        self.assertEqual(3, result["hits"])
+        self.assertEqual({"50_0": 5, "90_0": 5, "99_0": 5, "100_0": 5}, result["took-percentiles"])
+        self.assertFalse(result["success"])
+        self.assertEqual(1, result["success-count"])
+        self.assertEqual(1, result["error-count"])
+        self.assertEqual("msearch", result["error-type"])
+        self.assertEqual("HTTP status: 404, message: no such index", result["error-description"])
+        es.transport.perform_request.assert_called_once_with("POST", "/_msearch", body=params["body"], params={},
+                                                             headers={"content-type": "application/x-ndjson"})
+
+
+class SlicedScrollRunnerTests(TestCase):
+    @staticmethod
+    def page(scroll_id, hit_count, took=4):
+        return {
+            "_scroll_id": scroll_id,
+            "timed_out": False,
+            "took": took,
+            "hits": {
+                "hits": [{"_id": str(i)} for i in range(hit_count)]
+            }
+        }
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_retrieves_all_slices_in_parallel(self, es):
+        # slice 0 has two full pages, slice 1 has one page
+        es.search.side_effect = lambda body, **kwargs: self.page("scroll-%d" % body["slice"]["id"], 2)
+        pages = {
+            "scroll-0": [self.page("scroll-0", 1), self.page("scroll-0", 0)],
+            "scroll-1": [self.page("scroll-1", 0)]
+        }
+        es.transport.perform_request.side_effect = lambda method, path, params=None: pages[params["scroll_id"]].pop(0)
+
+        params = {
+            "index": "unittest",
+            "type": None,
+            "cache": None,
+            "body": {
+                "query": {
+                    "match_all": {}
+                }
+            },
+            "slices": 2,
+            "pages": "all",
+            "results-per-page": 2
+        }
+
+        sliced_scroll = runner.SlicedScroll()
+        with sliced_scroll:
+            result = sliced_scroll(es, params)
+
+        self.assertEqual(5, result["weight"])
+        self.assertEqual(5, result["pages"])
+        self.assertEqual("pages", result["unit"])
+        self.assertEqual(5, result["hits"])
+        self.assertEqual(20, result["took"])
+        self.assertFalse(result["timed_out"])
+        self.assertGreater(result["hits-per-second"], 0)
+        self.assertEqual([(0, 3, 3), (1, 2, 2)], [(s["slice"], s["pages"], s["hits"]) for s in result["slices"]])
+        # the original body is not modified
+        self.assertEqual({"query": {"match_all": {}}}, params["body"])
+        es.search.assert_has_calls([
+            mock.call(index="unittest", doc_type=None, body={"query": {"match_all": {}}, "slice": {"id": 0, "max": 2}}, sort="_doc",
+                      scroll="10s", size=2, request_cache=None),
+            mock.call(index="unittest", doc_type=None, body={"query": {"match_all": {}}, "slice": {"id": 1, "max": 2}}, sort="_doc",
+                      scroll="10s", size=2, request_cache=None)
+        ], any_order=True)
+        es.transport.perform_request.assert_has_calls([
+            mock.call("DELETE", "/_search/scroll/scroll-0"),
+            mock.call("DELETE", "/_search/scroll/scroll-1")
+        ], any_order=True)
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_does_not_add_slice_for_single_slice(self, es):
+        es.search.return_value = self.page("scroll-0", 2)
+
+        params = {
+            "body": {
+                "query": {
+                    "match_all": {}
+                }
+            },
+            "slices": 1,
+            "pages": 1
+        }
+
+        sliced_scroll = runner.SlicedScroll()
+        with sliced_scroll:
+            result = sliced_scroll(es, params)
+
+        self.assertEqual(1, result["pages"])
+        self.assertEqual(2, result["hits"])
+        es.search.assert_called_once_with(index="_all", doc_type=None, body={"query": {"match_all": {}}}, sort="_doc", scroll="10s",
+                                          size=None, request_cache=None)
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_clears_scrolls_if_a_slice_fails(self, es):
+        def search(body, **kwargs):
+            if body["slice"]["id"] == 1:
+                raise ValueError("unit-test")
+            return self.page("scroll-0", 2)
+
+        es.search.side_effect = search
+        es.transport.perform_request.return_value = self.page("scroll-0", 2)
+
+        params = {
+            "body": {
+                "query": {
+                    "match_all": {}
+                }
+            },
+            "slices": 2,
+            "pages": "all"
+        }
+
+        sliced_scroll = runner.SlicedScroll()
+        with self.assertRaisesRegex(ValueError, "unit-test"):
+            with sliced_scroll:
+                sliced_scroll(es, params)
+
+        es.transport.perform_request.assert_called_with("DELETE", "/_search/scroll/scroll-0")
+
+
 class RawRequestRunnerTests(TestCase):
     @mock.patch("elasticsearch.Elasticsearch")
     def test_issue_request_with_defaults(self, es):
@@ -1,5 +1,6 @@
 import os
 import datetime
+import json
 import logging
 import unittest.mock as mock
 import random
@@ -265,6 +266,110 @@ class EsClientTests(TestCase):
                          ctx.exception.args[0])
 
 
+class BulkWriterTests(TestCase):
+    class FakeClient:
+        def __init__(self, responses=None):
+            self.bodies = []
+            self.responses = responses or []
+
+        def serialize(self, doc):
+            return json.dumps(doc)
+
+        def bulk(self, index, doc_type, body):
+            self.bodies.append(body)
+            if self.responses:
+                return self.responses.pop(0)
+            return {"errors": False}
+
+    def test_writes_docs_in_batches(self):
+        client = BulkWriterTests.FakeClient()
+        writer = metrics.BulkWriter(client, "rally-metrics-2016-01", "metrics", bulk_docs=10, bulk_bytes=1024 * 1024, clients=1)
+        for i in range(25):
+            writer.add({"value": i})
+        writer.flush()
+        writer.close()
+
+        docs = [json.loads(line) for body in client.bodies for line in body.splitlines()[1::2]]
+        self.assertEqual(list(range(25)), [d["value"] for d in docs])
+        self.assertTrue(all(body.count("\n") <= 20 for body in client.bodies))
+        stats = writer.stats()
+        self.assertEqual(25, stats["docs"])
+        self.assertEqual(sum(len(b) for b in client.bodies), stats["bytes"])
+        self.assertEqual(len(client.bodies), stats["requests"])
+        self.assertIsNone(writer.stats())
+
+    def test_splits_batches_by_size(self):
+        client = BulkWriterTests.FakeClient()
+        writer = metrics.BulkWriter(client, "rally-metrics-2016-01", "metrics", bulk_docs=1000, bulk_bytes=1, clients=1)
+        writer.add({"value": 1})
+        writer.add({"value": 2})
+        # wait until both documents are queued so they end up in the same batch
+        writer.flush()
+        writer.close()
+
+        self.assertEqual(2, sum(body.count("\n") // 2 for body in client.bodies))
+        self.assertTrue(all(body.count("\n") == 2 for body in client.bodies))
+
+    @mock.patch("esrally.time.sleep")
+    def test_retries_rejected_docs(self, sleep):
+        client = BulkWriterTests.FakeClient(responses=[
+            {"errors": True, "items": [{"index": {"status": 201}}, {"index": {"status": 429}}]}
+        ])
+        writer = metrics.BulkWriter(client, "rally-metrics-2016-01", "metrics", bulk_docs=2, clients=1)
+        writer._write([(0, {"value": 1}, True), (0, {"value": 2}, True)])
+        writer.close()
+
+        self.assertEqual(2, len(client.bodies))
+        self.assertEqual('{"index":{}}\n{"value": 2}\n', client.bodies[1])
+        self.assertEqual(1, writer.stats()["retries"])
+        self.assertEqual(1, sleep.call_count)
+
+    def test_raises_failure_on_flush(self):
+        client = BulkWriterTests.FakeClient(responses=[
+            {"errors": True, "items": [{"index": {"status": 400, "error": "mapper_parsing_exception"}}]}
+        ])
+        writer = metrics.BulkWriter(client, "rally-metrics-2016-01", "metrics", clients=1)
+        writer.add({"value": "a"})
+
+        with self.assertRaisesRegex(exceptions.RallyError, r"Could not write metrics to the metrics store."):
+            writer.flush()
+        # the failure is reported only once
+        writer.flush()
+        writer.close()
+
+    def test_rejects_docs_after_failure(self):
+        client = BulkWriterTests.FakeClient(responses=[
+            {"errors": True, "items": [{"index": {"status": 400, "error": "mapper_parsing_exception"}}]}
+        ])
+        writer = metrics.BulkWriter(client, "rally-metrics-2016-01", "metrics", clients=1)
+        writer.add({"value": "a"})
+        writer.q.join()
+        # a batch that is dequeued after the failure is dropped
+        writer.q.put((0, {"value": 1}, True))
+        writer.q.join()
+
+        with self.assertRaisesRegex(exceptions.RallyError, r"Dropped \[1\] further documents."):
+            writer.add({"value": 2})
+        self.assertEqual(1, len(client.bodies))
+        writer.close()
+
+    def test_does_not_count_uncounted_docs(self):
+        client = BulkWriterTests.FakeClient()
+        writer = metrics.BulkWriter(client, "rally-metrics-2016-01", "metrics", clients=1)
+        writer.add({"value": 1}, counted=False)
+        writer.flush()
+        self.assertIsNone(writer.stats())
+
+        writer.add({"value": 2})
+        writer.add({"value": 3}, counted=False)
+        writer.flush()
+        writer.close()
+
+        stats = writer.stats()
+        self.assertEqual(1, stats["docs"])
+        self.assertEqual(len('{"index":{}}\n{"value": 2}\n'), stats["bytes"])
+
+
 class EsMetricsTests(TestCase):
     TRIAL_TIMESTAMP = datetime.datetime(2016, 1, 31)
     TRIAL_ID = "6ebc6e53-ee20-4b0c-99b4-09697987e9f4"
@@ -311,6 +416,37 @@ class EsMetricsTests(TestCase):
         self.es_mock.create_index.assert_called_with(index="rally-metrics-2016-01")
         self.es_mock.bulk_index.assert_called_with(index="rally-metrics-2016-01", doc_type="metrics", items=[expected_doc])
 
+    def test_put_value_in_background(self):
+        self.cfg.add(config.Scope.application, "reporting", "datastore.bulk.background", "true")
+        metrics_store = metrics.EsMetricsStore(self.cfg,
+                                               client_factory_class=MockClientFactory,
+                                               index_template_provider_class=DummyIndexTemplateProvider,
+                                               clock=StaticClock)
+        es_mock = metrics_store._client
+        es_mock.exists.return_value = False
+        es_mock.serialize.side_effect = json.dumps
+        es_mock.bulk.return_value = {"errors": False}
+
+        metrics_store.open(EsMetricsTests.TRIAL_ID, EsMetricsTests.TRIAL_TIMESTAMP, "test", "append", "defaults", create=True)
+        metrics_store.lap = 1
+        metrics_store.put_count_cluster_level("indexing_throughput", 5000, "docs/s")
+        metrics_store.flush(refresh=False)
+
+        docs = [json.loads(line) for c in es_mock.bulk.call_args_list for line in c[1]["body"].splitlines()[1::2]]
+        self.assertEqual(["indexing_throughput", "metrics_store_indexing_throughput", "metrics_store_indexing_lag"],
+                         [d["name"] for d in docs])
+        self.assertEqual(5000, docs[0]["value"])
+        self.assertEqual(1, docs[1]["meta"]["docs"])
+        es_mock.bulk_index.assert_not_called()
+
+        # the writer's own statistics documents are not counted in the next period
+        bulk_requests = es_mock.bulk.call_count
+        metrics_store.flush(refresh=False)
+        self.assertEqual(bulk_requests, es_mock.bulk.call_count)
+
+        metrics_store.close()
+        self.assertIsNone(metrics_store._writer)
+
     def test_put_value_with_explicit_timestamps(self):
         throughput = 5000
         self.metrics_store.open(EsMetricsTests.TRIAL_ID, EsMetricsTests.TRIAL_TIMESTAMP, "test", "append", "defaults", create=True)
@@ -1121,6 +1257,26 @@ class InMemoryMetricsStoreTests(TestCase):
             "io-batch-size-kb": 4
         }, self.metrics_store.docs[1]["meta"])
 
+    def test_get_preserves_insertion_order_across_keys(self):
+        self.metrics_store.open(InMemoryMetricsStoreTests.TRIAL_ID, InMemoryMetricsStoreTests.TRIAL_TIMESTAMP,
+                                "test", "append-no-conflicts", "defaults", create=True)
+        self.metrics_store.lap = 1
+        self.metrics_store.put_value_cluster_level("service_time", 1.0, "ms", task="term-query", sample_type=metrics.SampleType.Warmup)
+        self.metrics_store.put_value_cluster_level("service_time", 2.0, "ms", task="phrase-query")
+        self.metrics_store.put_value_cluster_level("service_time", 3.0, "ms", task="term-query")
+        self.metrics_store.lap = 2
+        self.metrics_store.put_value_cluster_level("service_time", 4.0, "ms", task="term-query")
+        self.metrics_store.put_value_cluster_level("service_time", 5.0, "ms", task="phrase-query")
+        self.metrics_store.put_value_cluster_level("latency", 6.0, "ms", task="term-query")
+
+        self.assertEqual([1.0, 2.0, 3.0, 4.0, 5.0], self.metrics_store.get("service_time"))
+        self.assertEqual([1.0, 3.0, 4.0], self.metrics_store.get("service_time", task="term-query"))
+        self.assertEqual([3.0, 4.0], self.metrics_store.get("service_time", task="term-query", sample_type=metrics.SampleType.Normal))
+        self.assertEqual([4.0, 5.0], self.metrics_store.get("service_time", lap=2))
+        self.assertEqual([], self.metrics_store.get("service_time", task="unknown"))
+        self.assertEqual(3, self.metrics_store.get_count("service_time", task="term-query"))
+        self.assertEqual(0, self.metrics_store.get_count("indexing_throughput"))
+
     def test_get_error_rate_zero_without_samples(self):
         self.metrics_store.open(InMemoryMetricsStoreTests.TRIAL_ID, InMemoryMetricsStoreTests.TRIAL_TIMESTAMP,
                                 "test", "append-no-conflicts", "defaults", create=True)
@@ -1173,6 +1329,141 @@ class InMemoryMetricsStoreTests(TestCase):
         self.assertEqual(0.2, self.metrics_store.get_error_rate("term-query", sample_type=metrics.SampleType.Normal))
 
 
+class HdrHistogramTests(TestCase):
+    def test_percentiles_within_error_bound(self):
+        h = metrics.HdrHistogram(significant_digits=3)
+        values = [random.lognormvariate(3, 1.5) for _ in range(10000)]
+        for v in values:
+            h.record(v)
+
+        sorted_values = sorted(values)
+        percentiles = [0, 25, 50, 90, 99, 99.9, 99.99, 100]
+        for percentile, actual in zip(percentiles, h.percentiles(percentiles)):
+            expected = metrics.InMemoryMetricsStore.percentile_value(sorted_values, percentile)
+            self.assertAlmostEqual(expected, actual, delta=expected * 0.0005)
+
+    def test_exact_min_max_and_stats(self):
+        h = metrics.HdrHistogram(significant_digits=2)
+        for v in [-3.5, 0, 0, 7, 1000.25]:
+            h.record(v)
+
+        self.assertEqual(5, h.count)
+        self.assertEqual(-3.5, h.min)
+        self.assertEqual(1000.25, h.max)
+        self.assertEqual(1003.75, h.sum)
+        self.assertEqual(200.75, h.mean)
+        self.assertEqual([-3.5, 0, 0, 1000.25], h.percentiles([0, 25, 50, 100]))
+
+    def test_merge(self):
+        h1 = metrics.HdrHistogram()
+        h2 = metrics.HdrHistogram()
+        for i in range(1, 501):
+            h1.record(float(i))
+        for i in range(501, 1001):
+            h2.record(float(i))
+        h1.merge(h2)
+
+        self.assertEqual(1000, h1.count)
+        self.assertEqual(1.0, h1.min)
+        self.assertEqual(1000.0, h1.max)
+        self.assertAlmostEqual(500.5, h1.percentiles([50])[0], delta=500.5 * 0.0005)
+
+    def test_rejects_invalid_precision(self):
+        with self.assertRaises(exceptions.SystemSetupError):
+            metrics.HdrHistogram(significant_digits=0)
+
+
+class HistogramMetricsStoreTests(TestCase):
+    TRIAL_TIMESTAMP = datetime.datetime(2016, 1, 31)
+    TRIAL_ID = "6ebc6e53-ee20-4b0c-99b4-09697987e9f4"
+
+    def setUp(self):
+        self.cfg = config.Config()
+        self.cfg.add(config.Scope.application, "system", "env.name", "unittest")
+        self.cfg.add(config.Scope.application, "track", "params", {})
+        self.metrics_store = metrics.HistogramMetricsStore(self.cfg, clock=StaticClock)
+        self.metrics_store.open(HistogramMetricsStoreTests.TRIAL_ID, HistogramMetricsStoreTests.TRIAL_TIMESTAMP,
+                                "test", "append-no-conflicts", "defaults", create=True)
+        self.metrics_store.lap = 1
+
+    def tearDown(self):
+        del self.metrics_store
+        del self.cfg
+
+    def test_get_percentile(self):
+        for i in range(1, 1001):
+            self.metrics_store.put_value_cluster_level("latency", float(i), "ms", task="term-query")
+
+        percentiles = self.metrics_store.get_percentiles("latency", percentiles=[0, 50, 99, 100])
+        self.assertEqual(1.0, percentiles[0])
+        self.assertAlmostEqual(500.5, percentiles[50], delta=500.5 * 0.0005)
+        self.assertAlmostEqual(990.0, percentiles[99], delta=990.0 * 0.0005)
+        self.assertEqual(1000.0, percentiles[100])
+
+    def test_filters_by_task_and_sample_type(self):
+        self.metrics_store.put_value_cluster_level("service_time", 1.0, "ms", task="term-query", sample_type=metrics.SampleType.Warmup)
+        self.metrics_store.put_value_cluster_level("service_time", 2.0, "ms", task="term-query")
+        self.metrics_store.put_value_cluster_level("service_time", 3.0, "ms", task="term-query")
+        self.metrics_store.put_value_cluster_level("service_time", 100.0, "ms", task="phrase-query")
+
+        self.assertEqual({"count": 2, "min": 2.0, "max": 3.0, "avg": 2.5, "sum": 5.0},
+                         self.metrics_store.get_stats("service_time", task="term-query"))
+        self.assertEqual({"count": 4, "min": 1.0, "max": 100.0, "avg": 26.5, "sum": 106.0},
+                         self.metrics_store.get_stats("service_time", sample_type=None))
+        self.assertEqual({100: 1.0},
+                         self.metrics_store.get_percentiles("service_time", task="term-query", sample_type=metrics.SampleType.Warmup,
+                                                            percentiles=[100]))
+        self.assertIsNone(self.metrics_store.get_stats("service_time", task="unknown"))
+        self.assertEqual({}, self.metrics_store.get_percentiles("service_time", task="unknown"))
+
+    def test_does_not_retain_request_metrics_documents(self):
+        for i in range(1, 101):
+            self.metrics_store.put_value_cluster_level("latency", float(i), "ms", task="term-query")
+            self.metrics_store.put_value_cluster_level("service_time", float(i), "ms", task="term-query")
+        self.metrics_store.put_value_cluster_level("throughput", 200.0, "ops/s", task="term-query")
+
+        self.assertEqual(["throughput"], [doc["name"] for doc in self.metrics_store.docs])
+        self.assertEqual({"latency", "service_time"}, {key[0] for key in self.metrics_store.histograms})
+        self.assertEqual(100, self.metrics_store.get_count("latency", task="term-query"))
+        self.assertEqual("ms", self.metrics_store.get_unit("latency", task="term-query"))
+        self.assertEqual("ops/s", self.metrics_store.get_unit("throughput"))
+        self.assertEqual([], self.metrics_store.get("latency"))
+
+    def test_calculates_exact_stats_of_other_metrics(self):
+        for i in range(1, 11):
+            self.metrics_store.put_value_cluster_level("throughput", 1000.0 + i / 3, "docs/s", task="index")
+
+        # values are not rounded to histogram buckets
+        self.assertEqual(metrics.InMemoryMetricsStore.percentile_value([1000.0 + i / 3 for i in range(1, 11)], 50),
+                         self.metrics_store.get_median("throughput", task="index"))
+        self.assertEqual(10, self.metrics_store.get_count("throughput", task="index"))
+
+    def test_matches_in_memory_store_after_externalizing(self):
+        for i in range(1, 101):
+            self.metrics_store.put_value_cluster_level("service_time", float(i), "ms", task="term-query",
+                                                       meta_data={"success": i % 10 != 0})
+        self.metrics_store.put_value_cluster_level("throughput", 20.0, "ops/s", task="term-query")
+
+        restored = metrics.HistogramMetricsStore(self.cfg, clock=StaticClock)
+        restored.bulk_add(self.metrics_store.to_externalizable(clear=True))
+
+        self.assertEqual({}, self.metrics_store.histograms)
+        self.assertEqual([], self.metrics_store.docs)
+        self.assertEqual(0.1, restored.get_error_rate("term-query", sample_type=metrics.SampleType.Normal))
+        self.assertEqual(100, restored.get_count("service_time", task="term-query"))
+        self.assertEqual([20.0], restored.get("throughput"))
+        self.assertEqual({"count": 100, "min": 1.0, "max": 100.0, "avg": 50.5, "sum": 5050.0},
+                         restored.get_stats("service_time", task="term-query"))
+
+    def test_selected_by_config(self):
+        self.cfg.add(config.Scope.application, "reporting", "datastore.type", "in-memory")
+        self.assertEqual(metrics.InMemoryMetricsStore, metrics.metrics_store_class(self.cfg))
+        self.cfg.add(config.Scope.application, "reporting", "datastore.histogram", "true")
+        self.assertEqual(metrics.HistogramMetricsStore, metrics.metrics_store_class(self.cfg))
+        self.cfg.add(config.Scope.application, "reporting", "datastore.type", "elasticsearch")
+        self.assertEqual(metrics.EsMetricsStore, metrics.metrics_store_class(self.cfg))
+
+
 class FileRaceStoreTests(TestCase):
     TRIAL_TIMESTAMP = datetime.datetime(2016, 1, 31)
     TRIAL_ID = "6ebc6e53-ee20-4b0c-99b4-09697987e9f4"
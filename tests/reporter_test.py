@@ -106,6 +106,29 @@ class StatsTests(TestCase):
                         "100": 376
                     },
                     "error_rate": 0.0
+                },
+                {
+                    "task": "search #1",
+                    "operation": "search",
+                    "throughput": {
+                        "min": 20,
+                        "median": 20,
+                        "max": 20,
+                        "unit": "ops/s"
+                    },
+                    "latency": {
+                        "50": 12,
+                        "100": 15,
+                    },
+                    "service_time": {
+                        "50": 11,
+                        "100": 14
+                    },
+                    "schedule_lag": {
+                        "50": 0.02,
+                        "100": 0.3
+                    },
+                    "error_rate": 0.0
                 }
             ],
             "node_metrics": [
@@ -181,6 +204,18 @@ class StatsTests(TestCase):
             }
         }, select(metric_list, "latency", operation="index"))
 
+        self.assertIsNone(select(metric_list, "schedule_lag", operation="index"))
+
+        self.assertEqual({
+            "name": "schedule_lag",
+            "task": "search #1",
+            "operation": "search",
+            "value": {
+                "50": 0.02,
+                "100": 0.3
+            }
+        }, select(metric_list, "schedule_lag", operation="search"))
+
         self.assertEqual({
             "name": "error_rate",
             "task": "index #1",
@@ -138,7 +138,7 @@ class TrackPreparationTests(TestCase):
                                                             uncompressed_size_in_bytes=2000),
                                data_root="/tmp")
 
-        prepare_file_offset_table.assert_called_with("/tmp/docs.json")
+        prepare_file_offset_table.assert_called_with("/tmp/docs.json", stride=None)
 
     @mock.patch("esrally.utils.io.prepare_file_offset_table")
     @mock.patch("os.path.getsize")
@@ -158,7 +158,7 @@ class TrackPreparationTests(TestCase):
                                                             uncompressed_size_in_bytes=2000),
                                data_root="/tmp")
 
-        prepare_file_offset_table.assert_called_with("/tmp/docs.json")
+        prepare_file_offset_table.assert_called_with("/tmp/docs.json", stride=None)
 
     @mock.patch("esrally.utils.io.decompress")
     @mock.patch("os.path.getsize")
@@ -184,7 +184,7 @@ class TrackPreparationTests(TestCase):
                                    data_root="/tmp")
         self.assertEqual("[/tmp/docs.json] is corrupt. Extracted [1] bytes but [2000] bytes are expected.", ctx.exception.args[0])
 
-        decompress.assert_called_with("/tmp/docs.json.bz2", "/tmp")
+        decompress.assert_called_with("/tmp/docs.json.bz2", "/tmp", workers=1, offset_table=True, offset_table_stride=None)
 
     @mock.patch("esrally.utils.io.decompress")
     @mock.patch("os.path.getsize")
@@ -211,7 +211,7 @@ class TrackPreparationTests(TestCase):
         self.assertEqual("Decompressing [/tmp/docs.json.bz2] did not create [/tmp/docs.json]. Please check with the track author if the "
                          "compressed archive has been created correctly.", ctx.exception.args[0])
 
-        decompress.assert_called_with("/tmp/docs.json.bz2", "/tmp")
+        decompress.assert_called_with("/tmp/docs.json.bz2", "/tmp", workers=1, offset_table=True, offset_table_stride=None)
 
     @mock.patch("esrally.utils.io.prepare_file_offset_table")
     @mock.patch("esrally.utils.io.decompress")
@@ -235,7 +235,9 @@ class TrackPreparationTests(TestCase):
         # uncompressed file size is 2000 after decompression (in main loop)
         get_size.side_effect = [200, 200, 2000, 2000]
 
-        prepare_file_offset_table.return_value = 5
+        # the file offset table is built during decompression
+        decompress.return_value = 5
+        prepare_file_offset_table.return_value = None
 
         p = loader.DocumentSetPreparator(track_name="unit-test", offline=False, test_mode=False)
 
@@ -249,10 +251,105 @@ class TrackPreparationTests(TestCase):
                                data_root="/tmp")
 
         ensure_dir.assert_called_with("/tmp")
-        decompress.assert_called_with("/tmp/docs.json.bz2", "/tmp")
+        decompress.assert_called_with("/tmp/docs.json.bz2", "/tmp", workers=1, offset_table=True, offset_table_stride=None)
+        download.assert_called_with("http://benchmarks.elasticsearch.org/corpora/unit-test/docs.json.bz2",
+                                    "/tmp/docs.json.bz2", 200, progress_indicator=mock.ANY, chunk_consumer=None)
+        prepare_file_offset_table.assert_called_with("/tmp/docs.json", stride=None)
+
+    @mock.patch("esrally.utils.io.prepare_file_offset_table")
+    @mock.patch("esrally.utils.io.read_frame_index")
+    @mock.patch("os.path.isfile")
+    def test_uses_framed_file_if_available(self, is_file, read_frame_index, prepare_file_offset_table):
+        # uncompressed file does not exist
+        is_file.return_value = False
+        read_frame_index.return_value = (10000, 5, 2000, [0, 150])
+
+        p = loader.DocumentSetPreparator(track_name="unit-test", offline=False, test_mode=False)
+
+        p.prepare_document_set(document_set=track.Documents(source_format=track.Documents.SOURCE_FORMAT_BULK,
+                                                            document_file="docs.json",
+                                                            document_archive="docs.json.bz2",
+                                                            number_of_documents=5,
+                                                            compressed_size_in_bytes=200,
+                                                            uncompressed_size_in_bytes=2000),
+                               data_root="/tmp")
+
+        read_frame_index.assert_called_with("/tmp/docs.json.fgz")
+        # framed files don't need a file offset table
+        self.assertEqual(0, prepare_file_offset_table.call_count)
+
+    @mock.patch("esrally.utils.io.prepare_file_offset_table")
+    @mock.patch("esrally.utils.io.decompress")
+    @mock.patch("esrally.utils.io.convert_to_framed")
+    @mock.patch("esrally.utils.io.read_frame_index")
+    @mock.patch("os.path.getsize")
+    @mock.patch("os.path.isfile")
+    def test_converts_archive_to_framed_file(self, is_file, get_size, read_frame_index, convert_to_framed, decompress,
+                                             prepare_file_offset_table):
+        # uncompressed file does not exist
+        # compressed file exists
+        # uncompressed file does not exist (in main loop)
+        is_file.side_effect = [False, True, False]
+        # compressed file size is 200
+        get_size.return_value = 200
+        # the framed file is not available before conversion
+        read_frame_index.side_effect = [None, (10000, 5, 2000, [0, 150])]
+        convert_to_framed.return_value = 5
+
+        p = loader.DocumentSetPreparator(track_name="unit-test", offline=False, test_mode=False, framed=True)
+
+        p.prepare_document_set(document_set=track.Documents(source_format=track.Documents.SOURCE_FORMAT_BULK,
+                                                            document_file="docs.json",
+                                                            document_archive="docs.json.bz2",
+                                                            number_of_documents=5,
+                                                            compressed_size_in_bytes=200,
+                                                            uncompressed_size_in_bytes=2000),
+                               data_root="/tmp")
+
+        convert_to_framed.assert_called_with("/tmp/docs.json.bz2", "/tmp/docs.json.fgz")
+        self.assertEqual(0, decompress.call_count)
+        self.assertEqual(0, prepare_file_offset_table.call_count)
+
+    @mock.patch("esrally.utils.io.prepare_file_offset_table")
+    @mock.patch("esrally.utils.io.StreamingDecompressor")
+    @mock.patch("esrally.utils.net.download")
+    @mock.patch("esrally.utils.io.ensure_dir")
+    @mock.patch("os.path.getsize")
+    @mock.patch("os.path.isfile")
+    def test_decompress_document_archive_while_downloading(self, is_file, get_size, ensure_dir, download, streaming_decompressor,
+                                                           prepare_file_offset_table):
+        # uncompressed file does not exist
+        # compressed file does not exist
+        # file check for compressed file before download attempt (for potential error message)
+        # after download compressed file exists
+        # after decompression, uncompressed file exists
+        # uncompressed file exists (in main loop)
+        is_file.side_effect = [False, False, False, True, True, True]
+        # compressed file size is 200 after download
+        # uncompressed file size is 2000 after decompression
+        # uncompressed file size is 2000 (in main loop)
+        get_size.side_effect = [200, 2000, 2000]
+
+        decompressor = streaming_decompressor.return_value
+        decompressor.finish.return_value = 5
+        prepare_file_offset_table.return_value = None
+
+        p = loader.DocumentSetPreparator(track_name="unit-test", offline=False, test_mode=False, streaming_decompression=True)
+
+        p.prepare_document_set(document_set=track.Documents(source_format=track.Documents.SOURCE_FORMAT_BULK,
+                                                            base_url="http://benchmarks.elasticsearch.org/corpora/unit-test",
+                                                            document_file="docs.json",
+                                                            document_archive="docs.json.bz2",
+                                                            number_of_documents=5,
+                                                            compressed_size_in_bytes=200,
+                                                            uncompressed_size_in_bytes=2000),
+                               data_root="/tmp")
+
+        streaming_decompressor.assert_called_with("/tmp/docs.json.bz2", "/tmp", offset_table=True, offset_table_stride=None)
         download.assert_called_with("http://benchmarks.elasticsearch.org/corpora/unit-test/docs.json.bz2",
-                                    "/tmp/docs.json.bz2", 200, progress_indicator=mock.ANY)
-        prepare_file_offset_table.assert_called_with("/tmp/docs.json")
+                                    "/tmp/docs.json.bz2", 200, progress_indicator=mock.ANY, chunk_consumer=decompressor)
+        decompressor.finish.assert_called_once_with()
+        prepare_file_offset_table.assert_called_with("/tmp/docs.json", stride=None)
 
     @mock.patch("esrally.utils.io.prepare_file_offset_table")
     @mock.patch("esrally.utils.net.download")
@@ -284,8 +381,8 @@ class TrackPreparationTests(TestCase):
 
         ensure_dir.assert_called_with("/tmp")
         download.assert_called_with("http://benchmarks.elasticsearch.org/corpora/unit-test/docs.json",
-                                    "/tmp/docs.json", 2000, progress_indicator=mock.ANY)
-        prepare_file_offset_table.assert_called_with("/tmp/docs.json")
+                                    "/tmp/docs.json", 2000, progress_indicator=mock.ANY, chunk_consumer=None)
+        prepare_file_offset_table.assert_called_with("/tmp/docs.json", stride=None)
 
     @mock.patch("esrally.utils.net.download")
     @mock.patch("esrally.utils.io.ensure_dir")
@@ -385,7 +482,7 @@ class TrackPreparationTests(TestCase):
 
         ensure_dir.assert_called_with("/tmp")
         download.assert_called_with("http://benchmarks.elasticsearch.org/corpora/unit-test/docs-1k.json",
-                                    "/tmp/docs-1k.json", None, progress_indicator=mock.ANY)
+                                    "/tmp/docs-1k.json", None, progress_indicator=mock.ANY, chunk_consumer=None)
 
     @mock.patch("esrally.utils.net.download")
     @mock.patch("esrally.utils.io.ensure_dir")
@@ -414,7 +511,7 @@ class TrackPreparationTests(TestCase):
 
         ensure_dir.assert_called_with("/tmp")
         download.assert_called_with("http://benchmarks.elasticsearch.org/corpora/unit-test/docs.json",
-                                    "/tmp/docs.json", 2000, progress_indicator=mock.ANY)
+                                    "/tmp/docs.json", 2000, progress_indicator=mock.ANY, chunk_consumer=None)
 
     @mock.patch("esrally.utils.io.prepare_file_offset_table")
     @mock.patch("esrally.utils.io.decompress")
@@ -436,7 +533,7 @@ class TrackPreparationTests(TestCase):
                                                                                     uncompressed_size_in_bytes=2000),
                                                        data_root="."))
 
-        prepare_file_offset_table.assert_called_with("./docs.json")
+        prepare_file_offset_table.assert_called_with("./docs.json", stride=None)
 
     @mock.patch("esrally.utils.io.prepare_file_offset_table")
     @mock.patch("esrally.utils.io.decompress")
@@ -607,7 +704,9 @@ class TrackPreparationTests(TestCase):
         # uncompressed after decompression
         # uncompressed in final loop iteration
         get_size.side_effect = [200, 2000, 2000]
-        prepare_file_offset_table.return_value = 5
+        # the file offset table is built during decompression
+        decompress.return_value = 5
+        prepare_file_offset_table.return_value = None
 
         p = loader.DocumentSetPreparator(track_name="unit-test", offline=False, test_mode=False)
 
@@ -619,7 +718,7 @@ class TrackPreparationTests(TestCase):
                                                                                     uncompressed_size_in_bytes=2000),
                                                        data_root="."))
 
-        prepare_file_offset_table.assert_called_with("./docs.json")
+        prepare_file_offset_table.assert_called_with("./docs.json", stride=None)
 
     @mock.patch("os.path.getsize")
     @mock.patch("os.path.isfile")
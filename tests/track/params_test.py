@@ -1,4 +1,11 @@
+import gzip
+import json
+import os
 import random
+import shutil
+import tempfile
+import time
+import unittest.mock as mock
 from unittest import TestCase
 
 from esrally import exceptions
@@ -59,7 +66,7 @@ class ConflictingIdsBuilderTests(TestCase):
                 "         9",
                 "        10",
             ],
-            params.build_conflicting_ids(params.IndexIdConflict.SequentialConflicts, 11, 0)
+            list(params.build_conflicting_ids(params.IndexIdConflict.SequentialConflicts, 11, 0))
         )
 
         self.assertEqual(
@@ -76,29 +83,35 @@ class ConflictingIdsBuilderTests(TestCase):
                 "        14",
                 "        15",
             ],
-            params.build_conflicting_ids(params.IndexIdConflict.SequentialConflicts, 11, 5)
+            list(params.build_conflicting_ids(params.IndexIdConflict.SequentialConflicts, 11, 5))
         )
 
     def test_random_conflicts(self):
-        predictable_shuffle = list.reverse
-
-        self.assertEqual(
-            [
-                "         2",
-                "         1",
-                "         0"
-            ],
-            params.build_conflicting_ids(params.IndexIdConflict.RandomConflicts, 3, 0, shuffle=predictable_shuffle)
-        )
-
-        self.assertEqual(
-            [
-                "         7",
-                "         6",
-                "         5"
-            ],
-            params.build_conflicting_ids(params.IndexIdConflict.RandomConflicts, 3, 5, shuffle=predictable_shuffle)
-        )
+        for n in [1, 2, 3, 100, 1025]:
+            ids = params.build_conflicting_ids(params.IndexIdConflict.RandomConflicts, n, 5, key=42)
+            self.assertEqual(n, len(ids))
+            self.assertEqual(["%10d" % i for i in range(5, 5 + n)], sorted(ids))
+
+    def test_random_conflicts_depend_on_key(self):
+        ids = list(params.build_conflicting_ids(params.IndexIdConflict.RandomConflicts, 100, 0, key=42))
+        self.assertEqual(ids, list(params.build_conflicting_ids(params.IndexIdConflict.RandomConflicts, 100, 0, key=42)))
+        self.assertNotEqual(ids, list(params.build_conflicting_ids(params.IndexIdConflict.RandomConflicts, 100, 0, key=43)))
+        self.assertNotEqual(sorted(ids), ids)
+
+    def test_ids_are_computed_lazily(self):
+        n = 1000 * 1000 * 1000 * 1000
+        sequential = params.build_conflicting_ids(params.IndexIdConflict.SequentialConflicts, n, 10)
+        self.assertEqual(n, len(sequential))
+        self.assertEqual("        10", sequential[0])
+        self.assertEqual("1000000000009", sequential[-1])
+        with self.assertRaises(IndexError):
+            # noinspection PyStatementEffect
+            sequential[n]
+
+        randomized = params.build_conflicting_ids(params.IndexIdConflict.RandomConflicts, n, 10)
+        self.assertEqual(n, len(randomized))
+        for i in [0, 1, n - 1]:
+            self.assertTrue(10 <= int(randomized[i]) < n + 10)
 
 
 class ActionMetaDataTests(TestCase):
@@ -469,6 +482,72 @@ class IndexDataReaderTests(TestCase):
             ]
         ], bulks)
 
+    def test_read_bulks_by_size(self):
+        data = [
+            '{"key": "value1"}',
+            '{"key": "value2", "other": "large-value"}',
+            '{"key": "value3"}',
+            '{"key": "value4"}',
+            '{"key": "value5"}',
+            '{"key": "value6"}',
+            '{"key": "value7"}'
+        ]
+        source = params.Slice(io.StringAsFileSource, 0, len(data))
+        am_handler = params.GenerateActionMetaData("test_index", "test_type")
+
+        # each small document is 18 characters (including the newline), generated action and meta-data lines do not count
+        reader = params.IndexDataReader(data, batch_size=1, bulk_size=None, file_source=source, action_metadata=am_handler,
+                                        index_name="test_index", type_name="test_type", bulk_size_bytes=50)
+
+        self.assert_bulks_sized(reader, [2, 3, 2], [4, 6, 4])
+
+    def test_read_bulks_by_size_and_number_of_docs(self):
+        data = [
+            '{"index": {"_index": "test_index"}}',
+            '{"key": "value1"}',
+            '{"index": {"_index": "test_index"}}',
+            '{"key": "value2"}',
+            '{"index": {"_index": "test_index"}}',
+            '{"key": "value3"}',
+            '{"index": {"_index": "test_index"}}',
+            '{"key": "value4"}'
+        ]
+        source = params.Slice(io.StringAsFileSource, 0, len(data))
+        am_handler = params.SourceActionMetaData(source)
+
+        # each document is 54 bytes including its action and meta-data line
+        reader = params.IndexDataReader(data, batch_size=3, bulk_size=3, file_source=source, action_metadata=am_handler,
+                                        index_name="test_index", type_name=None, bulk_size_bytes=100)
+        self.assert_bulks_sized(reader, [2, 2], [4, 4])
+
+        source = params.Slice(io.StringAsFileSource, 0, len(data))
+        am_handler = params.SourceActionMetaData(source)
+        reader = params.IndexDataReader(data, batch_size=1, bulk_size=1, file_source=source, action_metadata=am_handler,
+                                        index_name="test_index", type_name=None, bulk_size_bytes=100)
+        self.assert_bulks_sized(reader, [1, 1, 1, 1], [2, 2, 2, 2])
+
+    def test_knows_size_of_bulks_in_bytes(self):
+        data = [
+            '{"key": "v\u00e4lue1"}',
+            '{"key": "v\u00e4lue2"}',
+            '{"key": "v\u00e4lue3"}'
+        ]
+        source = params.Slice(io.StringAsFileSource, 0, len(data))
+        am_handler = params.GenerateActionMetaData("t\u00e9st_index", "test_type", conflicting_ids=["1", "2", "3"],
+                                                   conflict_probability=100, on_conflict="update", rand=lambda: 0,
+                                                   randint=lambda x, y: x)
+        # each document is 19 bytes including its newline
+        reader = params.IndexDataReader(data, batch_size=2, bulk_size=None, file_source=source, action_metadata=am_handler,
+                                        index_name="t\u00e9st_index", type_name="test_type", bulk_size_bytes=38)
+        with reader:
+            bulks = [bulk for _, _, batch in reader for _, bulk in batch]
+
+        self.assertEqual([4, 2], [len(bulk) for bulk in bulks])
+        # the second document is sent as an update
+        self.assertTrue(bulks[0][3].startswith('{"doc":'))
+        self.assertEqual([len("".join(line + "\n" for line in bulk).encode("utf-8")) for bulk in bulks],
+                         [bulk.size_bytes for bulk in bulks])
+
     def assert_bulks_sized(self, reader, expected_bulk_sizes, expected_line_sizes):
         with reader:
             bulk_index = 0
@@ -479,6 +558,236 @@ class IndexDataReaderTests(TestCase):
                     bulk_index += 1
 
 
+class MmapIndexDataReaderTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data_file = os.path.join(self.tmp_dir, "docs.json")
+        with open(self.data_file, "wb") as f:
+            for i in range(1, 6):
+                f.write(b'{"index": {"_index": "test_index", "_id": "%d"}}\n{"key": "v\xc3\xa4lue%d"}\n' % (i, i))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def read(self, offset, number_of_lines, batch_size, bulk_size, bulk_size_bytes=None):
+        reader = params.MmapIndexDataReader(self.data_file, batch_size=batch_size, bulk_size=bulk_size, source_class=io.MmapSource,
+                                            offset=offset, number_of_lines=number_of_lines, index_name="test_index", type_name=None,
+                                            bulk_size_bytes=bulk_size_bytes)
+        batches = []
+        with reader:
+            for index, type, batch in reader:
+                self.assertEqual("test_index", index)
+                batches.append(batch)
+        return batches
+
+    def test_read_bulks_as_bytes(self):
+        batches = self.read(offset=0, number_of_lines=10, batch_size=4, bulk_size=2)
+
+        self.assertEqual(2, len(batches))
+        self.assertEqual([2, 2], [docs for docs, _ in batches[0]])
+        self.assertEqual([1], [docs for docs, _ in batches[1]])
+        self.assertEqual(b'{"index": {"_index": "test_index", "_id": "5"}}\n{"key": "v\xc3\xa4lue5"}\n', batches[1][0][1])
+        with open(self.data_file, "rb") as f:
+            self.assertEqual(f.read(), b"".join(bulk for batch in batches for _, bulk in batch))
+
+    def test_read_bulk_with_offset(self):
+        batches = self.read(offset=6, number_of_lines=4, batch_size=50, bulk_size=50)
+
+        self.assertEqual(1, len(batches))
+        docs, bulk = batches[0][0]
+        self.assertEqual(2, docs)
+        self.assertTrue(bulk.startswith(b'{"index": {"_index": "test_index", "_id": "4"}}\n'))
+        self.assertTrue(bulk.endswith(b'{"key": "v\xc3\xa4lue5"}\n'))
+
+    def test_read_bulks_by_size(self):
+        # each document is 67 bytes including its action and meta-data line
+        batches = self.read(offset=0, number_of_lines=10, batch_size=1, bulk_size=None, bulk_size_bytes=100)
+
+        self.assertEqual([[2], [2], [1]], [[docs for docs, _ in batch] for batch in batches])
+        self.assertEqual([134, 134, 67], [len(bulk) for batch in batches for _, bulk in batch])
+
+    def test_cuts_bulks_at_the_same_lines_as_index_data_reader(self):
+        # each document is 67 bytes but only 66 characters including its action and meta-data line
+        mmap_batches = self.read(offset=0, number_of_lines=10, batch_size=1, bulk_size=None, bulk_size_bytes=134)
+
+        source = params.Slice(io.FileSource, 0, 10)
+        reader = params.IndexDataReader(self.data_file, batch_size=1, bulk_size=None, file_source=source,
+                                        action_metadata=params.SourceActionMetaData(source), index_name="test_index", type_name=None,
+                                        bulk_size_bytes=134)
+        with reader:
+            batches = [batch for _, _, batch in reader]
+
+        self.assertEqual([[2], [2], [1]], [[docs for docs, _ in batch] for batch in mmap_batches])
+        self.assertEqual([[docs for docs, _ in batch] for batch in mmap_batches], [[docs for docs, _ in batch] for batch in batches])
+        self.assertEqual([bulk for batch in mmap_batches for _, bulk in batch],
+                         ["".join(line + "\n" for line in bulk).encode("utf-8") for batch in batches for _, bulk in batch])
+
+    def test_read_empty_file(self):
+        open(self.data_file, "wb").close()
+        self.assertEqual([], self.read(offset=0, number_of_lines=10, batch_size=50, bulk_size=50))
+
+
+class FramedFileReaderTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data_file = os.path.join(self.tmp_dir, "docs.json")
+        with open(self.data_file, "wb") as f:
+            for i in range(1, 101):
+                f.write(b'{"key": "v\xc3\xa4lue%d"}\n' % i)
+        io.convert_to_framed(self.data_file, io.framed_file_path(self.data_file), lines_per_frame=10)
+        # only the framed file is available
+        os.remove(self.data_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_reads_partition_of_framed_file(self):
+        docs = track.Documents(source_format=track.Documents.SOURCE_FORMAT_BULK, document_file=self.data_file, number_of_documents=100,
+                               target_index="test_index", target_type="test_type")
+        for create_reader in [params.create_default_reader, params.create_zero_copy_reader]:
+            reader = create_reader(docs, offset=35, num_lines=20, num_docs=20, batch_size=20, bulk_size=10,
+                                   id_conflicts=params.IndexIdConflict.NoConflicts, conflict_probability=None, on_conflict=None,
+                                   recency=None)
+            bulks = []
+            with reader:
+                for index, type, batch in reader:
+                    bulks.extend(bulk for _, bulk in batch)
+
+            self.assertEqual(2, len(bulks))
+            self.assertEqual('{"key": "v\u00e4lue36"}', bulks[0][1])
+            self.assertEqual('{"key": "v\u00e4lue55"}', bulks[1][-1])
+
+
+class BulkPackTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data_file = os.path.join(self.tmp_dir, "docs.json")
+        with open(self.data_file, "wb") as f:
+            for i in range(1, 8):
+                f.write(b'{"key": "v\xc3\xa4lue%d"}\n' % i)
+        self.corpora = [track.DocumentCorpus(name="default", documents=[
+            track.Documents(source_format=track.Documents.SOURCE_FORMAT_BULK, document_file=self.data_file, number_of_documents=7,
+                            target_index="test-idx", target_type="test-type")
+        ])]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def partition(self, partition_index=0, total_partitions=1, bulk_size=3, precompress=False):
+        return params.PartitionBulkIndexParamSource(self.corpora, partition_index, total_partitions, batch_size=bulk_size,
+                                                    bulk_size=bulk_size, ingest_percentage=100,
+                                                    id_conflicts=params.IndexIdConflict.NoConflicts, conflict_probability=None,
+                                                    on_conflict=None, recency=None, original_params={}, bulk_pack=True,
+                                                    precompress=precompress)
+
+    def bulks(self, partition):
+        return [partition.params() for _ in range(partition.size())]
+
+    def packs(self):
+        return sorted(os.listdir(os.path.join(self.tmp_dir, "bulk-packs")))
+
+    def test_writes_bulk_pack_on_first_use_and_reads_it_afterwards(self):
+        expected_first_body = (
+            b'{"index": {"_index": "test-idx", "_type": "test-type"}}\n{"key": "v\xc3\xa4lue1"}\n'
+            b'{"index": {"_index": "test-idx", "_type": "test-type"}}\n{"key": "v\xc3\xa4lue2"}\n'
+            b'{"index": {"_index": "test-idx", "_type": "test-type"}}\n{"key": "v\xc3\xa4lue3"}\n'
+        )
+        first = self.bulks(self.partition())
+        self.assertEqual(expected_first_body, first[0]["body"])
+        self.assertEqual([3, 3, 1], [bulk["bulk-size"] for bulk in first])
+        # the pack is complete as soon as the last bulk has been generated
+        packs = self.packs()
+        self.assertEqual(1, len(packs))
+        self.assertTrue(packs[0].endswith("-1-of-1.pack"))
+        self.assertEqual((3, 7), params.read_bulk_pack_header(os.path.join(self.tmp_dir, "bulk-packs", packs[0])))
+
+        with mock.patch("esrally.track.params.create_readers") as create_readers:
+            second = self.bulks(self.partition())
+            create_readers.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test_bulk_pack_depends_on_partition_and_document_file(self):
+        self.bulks(self.partition(partition_index=0, total_partitions=2))
+        self.bulks(self.partition(partition_index=1, total_partitions=2))
+        self.bulks(self.partition(bulk_size=2))
+        self.assertEqual(3, len(self.packs()))
+
+        with open(self.data_file, "ab") as f:
+            f.write(b'{"key": "changed"}\n')
+        self.bulks(self.partition(bulk_size=2))
+        self.assertEqual(4, len(self.packs()))
+
+    def test_discards_incomplete_bulk_pack(self):
+        partition = self.partition()
+        partition.params()
+        self.assertEqual(1, len(self.packs()))
+        self.assertTrue(self.packs()[0].endswith(".tmp"))
+        partition.close()
+        self.assertEqual([], self.packs())
+        self.assertIsNone(params.read_bulk_pack_header(os.path.join(self.tmp_dir, "bulk-packs", "missing.pack")))
+
+    def test_precompresses_bulks_once(self):
+        partition = params.PartitionBulkIndexParamSource(self.corpora, 0, 1, batch_size=3, bulk_size=3, ingest_percentage=100,
+                                                         id_conflicts=params.IndexIdConflict.NoConflicts, conflict_probability=None,
+                                                         on_conflict=None, recency=None, original_params={"precompress": True},
+                                                         precompress=True)
+        uncompressed = self.bulks(self.partition())
+        compressed = self.bulks(partition)
+        self.assertEqual([bulk["body"] for bulk in uncompressed], [gzip.decompress(bulk["body"]) for bulk in compressed])
+        self.assertTrue(compressed[0]["precompress"])
+
+        with mock.patch("esrally.track.params.gzip.compress", wraps=gzip.compress) as compress:
+            first = self.bulks(self.partition(precompress=True))
+            second = self.bulks(self.partition(precompress=True))
+            # only compressed while writing the bulk pack
+            self.assertEqual(3, compress.call_count)
+        self.assertEqual(first, second)
+        self.assertEqual([bulk["body"] for bulk in uncompressed], [gzip.decompress(bulk["body"]) for bulk in second])
+        self.assertEqual(2, len(self.packs()))
+
+    def test_counts_and_reports_bulks_by_size(self):
+        # each document is 20 bytes (including the newline)
+        partition = params.PartitionBulkIndexParamSource(self.corpora, 0, 1, batch_size=1, bulk_size=None, ingest_percentage=100,
+                                                         id_conflicts=params.IndexIdConflict.RandomConflicts, conflict_probability=50,
+                                                         on_conflict="update", recency=None, original_params={"bulk-size-bytes": 50},
+                                                         bulk_size_bytes=50)
+        self.assertEqual(3, partition.size())
+        bulks = self.bulks(partition)
+        self.assertEqual([3, 3, 1], [bulk["bulk-size"] for bulk in bulks])
+        self.assertEqual([len("".join(line + "\n" for line in bulk["body"]).encode("utf-8")) for bulk in bulks],
+                         [bulk["bulk-size-bytes"] for bulk in bulks])
+        # the wrapper of documents that are sent as updates is counted too
+        self.assertTrue(any(line.startswith('{"doc":') for bulk in bulks for line in bulk["body"]))
+
+    def test_concurrent_writers_use_different_temporary_files(self):
+        pack_path = os.path.join(self.tmp_dir, "bulk-packs", "bulks.pack")
+        first = params.BulkPackWriter(pack_path).open()
+        second = params.BulkPackWriter(pack_path).open()
+        self.assertNotEqual(first.tmp_path, second.tmp_path)
+
+        first.write("idx", None, 1, b"first\n")
+        second.write("idx", None, 1, b"second\n")
+        first.abort()
+        second.close()
+
+        self.assertEqual(["bulks.pack"], self.packs())
+        with params.BulkPackReader(pack_path) as reader:
+            self.assertEqual([("idx", None, [(1, b"second\n")])], list(reader))
+
+    def test_bulk_pack_round_trip_without_type(self):
+        pack_path = os.path.join(self.tmp_dir, "bulks.pack")
+        writer = params.BulkPackWriter(pack_path).open()
+        self.assertEqual(b'{"index": {}}\n{"a": 1}\n', writer.write("idx-1", None, 1, ['{"index": {}}', '{"a": 1}']))
+        writer.write("idx-2", "type", 2, b"raw bytes\n")
+        writer.close()
+
+        with params.BulkPackReader(pack_path) as reader:
+            self.assertEqual([
+                ("idx-1", None, [(1, b'{"index": {}}\n{"a": 1}\n')]),
+                ("idx-2", "type", [(2, b"raw bytes\n")])
+            ], list(reader))
+
+
 class InvocationGeneratorTests(TestCase):
     class TestIndexReader:
         def __init__(self, data):
@@ -610,7 +919,7 @@ class InvocationGeneratorTests(TestCase):
     def test_build_conflicting_ids(self):
         self.assertIsNone(params.build_conflicting_ids(params.IndexIdConflict.NoConflicts, 3, 0))
         self.assertEqual(["         0", "         1", "         2"],
-                         params.build_conflicting_ids(params.IndexIdConflict.SequentialConflicts, 3, 0))
+                         list(params.build_conflicting_ids(params.IndexIdConflict.SequentialConflicts, 3, 0)))
         # we cannot tell anything specific about the contents...
         self.assertEqual(3, len(params.build_conflicting_ids(params.IndexIdConflict.RandomConflicts, 3, 0)))
 
@@ -638,6 +947,20 @@ class BulkIndexParamSourceTests(TestCase):
 
         self.assertEqual("'bulk-size' must be positive but was -5", ctx.exception.args[0])
 
+    def test_create_with_bulk_size_bytes(self):
+        source = params.BulkIndexParamSource(track=track.Track(name="unit-test"), params={
+            "bulk-size-bytes": 1024
+        })
+        self.assertIsNone(source.bulk_size)
+        self.assertEqual(1, source.batch_size)
+        self.assertEqual(1024, source.bulk_size_bytes)
+
+        with self.assertRaises(exceptions.InvalidSyntax) as ctx:
+            params.BulkIndexParamSource(track=track.Track(name="unit-test"), params={
+                "bulk-size-bytes": 0
+            })
+        self.assertEqual("'bulk-size-bytes' must be positive but was 0", ctx.exception.args[0])
+
     def test_create_with_fraction_smaller_batch_size(self):
         with self.assertRaises(exceptions.InvalidSyntax) as ctx:
             params.BulkIndexParamSource(track=track.Track(name="unit-test"), params={
@@ -902,6 +1225,264 @@ class BulkIndexParamSourceTests(TestCase):
 
         self.assertEqual("'conflict-probability' must be numeric", ctx.exception.args[0])
 
+    def test_create_with_negative_prefetch(self):
+        with self.assertRaises(exceptions.InvalidSyntax) as ctx:
+            params.BulkIndexParamSource(track=track.Track(name="unit-test"), params={
+                "bulk-size": 5000,
+                "prefetch": -1
+            })
+
+        self.assertEqual("'prefetch' must be non-negative but was -1", ctx.exception.args[0])
+
+    def test_create_with_non_numeric_prefetch(self):
+        with self.assertRaises(exceptions.InvalidSyntax) as ctx:
+            params.BulkIndexParamSource(track=track.Track(name="unit-test"), params={
+                "bulk-size": 5000,
+                "prefetch": "many"
+            })
+
+        self.assertEqual("'prefetch' must be numeric", ctx.exception.args[0])
+
+    def test_create_with_negative_retry_rejected(self):
+        with self.assertRaises(exceptions.InvalidSyntax) as ctx:
+            params.BulkIndexParamSource(track=track.Track(name="unit-test"), params={
+                "bulk-size": 5000,
+                "retry-rejected": -1
+            })
+
+        self.assertEqual("'retry-rejected' must be non-negative but was -1", ctx.exception.args[0])
+
+    def test_create_with_invalid_retry_backoff(self):
+        with self.assertRaises(exceptions.InvalidSyntax) as ctx:
+            params.BulkIndexParamSource(track=track.Track(name="unit-test"), params={
+                "bulk-size": 5000,
+                "retry-rejected": 3,
+                "retry-initial-backoff": 0
+            })
+        self.assertEqual("'retry-initial-backoff' must be positive but was 0", ctx.exception.args[0])
+
+        with self.assertRaises(exceptions.InvalidSyntax) as ctx:
+            params.BulkIndexParamSource(track=track.Track(name="unit-test"), params={
+                "bulk-size": 5000,
+                "retry-rejected": 3,
+                "retry-max-backoff": "long"
+            })
+        self.assertEqual("'retry-max-backoff' must be numeric", ctx.exception.args[0])
+
+
+class BulkPrefetcherTests(TestCase):
+    def test_prefetches_all_bulks_in_order(self):
+        bulks = ({"bulk-id": "0-%d" % i} for i in range(1, 11))
+        prefetcher = params.BulkPrefetcher(bulks, depth=3)
+
+        bulk_ids = []
+        for bulk in prefetcher:
+            bulk_ids.append(bulk["bulk-id"])
+            self.assertTrue(0 <= bulk["prefetch-queue-depth"] <= 3)
+            self.assertGreaterEqual(bulk["prefetch-stall-time"], 0)
+
+        self.assertEqual(["0-%d" % i for i in range(1, 11)], bulk_ids)
+        # stays exhausted
+        with self.assertRaises(StopIteration):
+            next(prefetcher)
+
+    def test_does_not_read_more_than_depth_ahead(self):
+        produced = []
+
+        def bulks():
+            for i in range(100):
+                produced.append(i)
+                yield {"bulk-id": "0-%d" % i}
+
+        prefetcher = params.BulkPrefetcher(bulks(), depth=2)
+        self.assertEqual("0-0", next(prefetcher)["bulk-id"])
+        # wait until the producer is blocked on the full queue
+        for _ in range(100):
+            if prefetcher.queue.full():
+                break
+            time.sleep(0.01)
+        self.assertTrue(prefetcher.queue.full())
+        # one consumed, two in the queue and at most one more that waits to be put into the queue
+        self.assertLessEqual(len(produced), 4)
+        self.assertEqual(2, next(prefetcher)["prefetch-queue-depth"])
+        prefetcher.close()
+        self.assertFalse(prefetcher.thread.is_alive())
+        # prepared bulks are discarded
+        self.assertTrue(prefetcher.queue.empty())
+        with self.assertRaises(StopIteration):
+            next(prefetcher)
+
+    def test_closes_bulks_on_close(self):
+        closed = []
+
+        def bulks():
+            try:
+                for i in range(100):
+                    yield {"bulk-id": "0-%d" % i}
+            finally:
+                closed.append(True)
+
+        prefetcher = params.BulkPrefetcher(bulks(), depth=2)
+        self.assertEqual("0-0", next(prefetcher)["bulk-id"])
+        prefetcher.close()
+        self.assertEqual([True], closed)
+
+    def test_partition_closes_prefetcher(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_file = os.path.join(tmp_dir, "docs.json")
+            with open(data_file, "wb") as f:
+                for i in range(100):
+                    f.write(b'{"key": "value%d"}\n' % i)
+            corpora = [track.DocumentCorpus(name="default", documents=[
+                track.Documents(source_format=track.Documents.SOURCE_FORMAT_BULK, document_file=data_file, number_of_documents=100,
+                                target_index="test-idx", target_type="test-type")
+            ])]
+            partition = params.PartitionBulkIndexParamSource(corpora, 0, 1, batch_size=1, bulk_size=1, ingest_percentage=100,
+                                                             id_conflicts=params.IndexIdConflict.NoConflicts, conflict_probability=None,
+                                                             on_conflict=None, recency=None, original_params={}, prefetch=2)
+            self.assertEqual(1, partition.params()["bulk-size"])
+            partition.close()
+
+            self.assertFalse(partition.internal_params.thread.is_alive())
+            self.assertTrue(partition.internal_params.queue.empty())
+
+    def test_closes_bulks_if_never_started(self):
+        bulks = mock.Mock()
+        prefetcher = params.BulkPrefetcher(bulks, depth=2)
+        prefetcher.close()
+        bulks.close.assert_called_once_with()
+        self.assertIsNone(prefetcher.thread)
+
+    def test_propagates_errors_to_consumer(self):
+        def bulks():
+            yield {"bulk-id": "0-1"}
+            raise exceptions.DataError("Could not read document file")
+
+        prefetcher = params.BulkPrefetcher(bulks(), depth=5)
+        self.assertEqual("0-1", next(prefetcher)["bulk-id"])
+        with self.assertRaisesRegex(exceptions.DataError, "Could not read document file"):
+            next(prefetcher)
+        with self.assertRaises(StopIteration):
+            next(prefetcher)
+
+
+class SyntheticBulkParamSourceTests(TestCase):
+    FIELDS = {
+        "status": {"type": "keyword", "cardinality": 10, "skew": 1.5},
+        "size": {"type": "long", "min": 10, "max": 20},
+        "price": {"type": "double", "min": 1, "max": 2, "decimals": 2},
+        "@timestamp": {"type": "date", "start": "2018-01-01", "end": "2018-01-02"},
+        "message": {"type": "text", "vocabulary": ["quick", "brown", '"fox"'], "min-words": 2, "max-words": 4}
+    }
+
+    @staticmethod
+    def create_param_source(**kwargs):
+        t = track.Track(name="unit-test", indices=[track.Index(name="logs", types=["docs"])])
+        source_params = {
+            "bulk-size": 5,
+            "documents": 23,
+            "fields": SyntheticBulkParamSourceTests.FIELDS
+        }
+        source_params.update(kwargs)
+        return params.param_source_for_name("synthetic-bulk", t, source_params)
+
+    @staticmethod
+    def documents(partition):
+        docs = []
+        for _ in range(partition.size()):
+            body = partition.params()["body"]
+            docs.extend(json.loads(line) for line in body[1::2])
+        return docs
+
+    def test_generates_bulks_from_schema(self):
+        partition = self.create_param_source(pipeline="test-pipeline").partition(0, 1)
+        self.assertEqual(5, partition.size())
+
+        bulk = partition.params()
+        self.assertEqual("logs", bulk["index"])
+        self.assertEqual("docs", bulk["type"])
+        self.assertEqual("test-pipeline", bulk["pipeline"])
+        self.assertEqual(5, bulk["bulk-size"])
+        self.assertEqual("0-1", bulk["bulk-id"])
+        self.assertTrue(bulk["action-metadata-present"])
+        self.assertEqual(10, len(bulk["body"]))
+        self.assertEqual({"index": {"_index": "logs", "_type": "docs"}}, json.loads(bulk["body"][0]))
+
+        doc = json.loads(bulk["body"][1])
+        self.assertEqual(["@timestamp", "message", "price", "size", "status"], sorted(doc.keys()))
+        self.assertTrue(10 <= doc["size"] <= 20)
+        self.assertTrue(1 <= doc["price"] <= 2)
+        self.assertTrue(doc["@timestamp"].startswith("2018-01-01T"))
+        words = doc["message"].split(" ")
+        self.assertTrue(2 <= len(words) <= 4)
+        self.assertTrue(set(words) <= {"quick", "brown", '"fox"'})
+
+        bulk_sizes = [bulk["bulk-size"]] + [partition.params()["bulk-size"] for _ in range(4)]
+        self.assertEqual([5, 5, 5, 5, 3], bulk_sizes)
+        with self.assertRaises(StopIteration):
+            partition.params()
+
+    def test_partitions_deterministically(self):
+        source = self.create_param_source(seed=42)
+        self.assertEqual([2, 2, 2], [source.partition(i, 3).size() for i in range(3)])
+
+        first = [self.documents(source.partition(i, 3)) for i in range(3)]
+        second = [self.documents(self.create_param_source(seed=42).partition(i, 3)) for i in range(3)]
+        self.assertEqual(first, second)
+        self.assertEqual([8, 7, 8], [len(docs) for docs in first])
+        # different clients draw different documents
+        self.assertNotEqual(first[0], first[2])
+        # ... from the same value pools
+        keywords = [set(doc["status"] for doc in docs) for docs in first]
+        self.assertTrue(keywords[0] | keywords[1] | keywords[2] <= set(json.loads(v) for v in source.schema.fields[0].pool.values))
+
+    def test_generates_documents_indefinitely_without_document_count(self):
+        source = self.create_param_source(documents=None)
+        partition = source.partition(0, 1)
+        self.assertIsNone(partition.size())
+        for i in range(1, 101):
+            self.assertEqual("0-%d" % i, partition.params()["bulk-id"])
+
+    def test_zipf_skew_prefers_low_ranks(self):
+        pool = params.ValuePool(["a", "b", "c", "d"], skew=2)
+        values = pool.sample(random.Random(17).random, 10000)
+        counts = [values.count(v) for v in ["a", "b", "c", "d"]]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        # P(a) = 1 / (1 + 1/4 + 1/9 + 1/16) ~ 0.70
+        self.assertAlmostEqual(0.70, counts[0] / 10000, delta=0.02)
+        self.assertEqual(["d", "d"], pool.sample(lambda: 0.9999999999999999, 2))
+
+    def test_generates_date_formats(self):
+        rand = random.Random(7)
+        spec = {"type": "date", "start": "2018-01-01T23:59:58Z", "end": "2018-01-03T00:00:00Z"}
+        field = params.DateField("ts", spec, rand)
+        self.assertEqual(['"2018-01-01T23:59:58Z"'], field.sample(lambda: 0.0, 1))
+        self.assertEqual(['"2018-01-02T00:00:00Z"'], field.sample(lambda: 2 / 86402, 1))
+        self.assertEqual(['"2018-01-02T23:59:59Z"'], field.sample(lambda: 0.9999999999, 1))
+
+        spec["format"] = "epoch_millis"
+        self.assertEqual(["1514851198000"], params.DateField("ts", spec, rand).sample(lambda: 0.0, 1))
+        spec["format"] = "epoch_second"
+        self.assertEqual(["1514851198"], params.DateField("ts", spec, rand).sample(lambda: 0.0, 1))
+
+    def test_rejects_invalid_schema(self):
+        with self.assertRaisesRegex(exceptions.InvalidSyntax, "'fields' is mandatory"):
+            self.create_param_source(fields={})
+        with self.assertRaisesRegex(exceptions.InvalidSyntax, r"Unknown type \[geo_point\] of field \[location\]"):
+            self.create_param_source(fields={"location": {"type": "geo_point"}})
+        with self.assertRaisesRegex(exceptions.InvalidSyntax, r"'cardinality' of field \[status\] must be at least 1 but was 0"):
+            self.create_param_source(fields={"status": {"type": "keyword", "cardinality": 0}})
+        with self.assertRaisesRegex(exceptions.InvalidSyntax, r"'max' of field \[size\] must be greater than or equal to 'min'"):
+            self.create_param_source(fields={"size": {"type": "long", "min": 10, "max": 1}})
+        with self.assertRaisesRegex(exceptions.InvalidSyntax, r"'start' of field \[ts\] must be a date"):
+            self.create_param_source(fields={"ts": {"type": "date", "start": "yesterday"}})
+        with self.assertRaisesRegex(exceptions.InvalidSyntax, "Mandatory parameter 'bulk-size' is missing"):
+            params.SyntheticBulkParamSource(track.Track(name="unit-test", indices=[track.Index(name="logs")]),
+                                            {"fields": SyntheticBulkParamSourceTests.FIELDS})
+        with self.assertRaisesRegex(exceptions.InvalidSyntax, "'index' is mandatory"):
+            params.SyntheticBulkParamSource(track.Track(name="unit-test"),
+                                            {"bulk-size": 10, "fields": SyntheticBulkParamSourceTests.FIELDS})
+
 
 class BulkDataGeneratorTests(TestCase):
     class TestBulkReader:
@@ -1506,6 +2087,110 @@ class DeleteIndexTemplateParamSourceTests(TestCase):
         self.assertDictEqual({"master_timeout": 20}, p["request-params"])
 
 
+class MultiSearchParamSourceTests(TestCase):
+    def test_creates_msearch_body_from_search_parameters(self):
+        source = params.MultiSearchParamSource(track=track.Track(name="unit-test"), params={
+            "index": "logs",
+            "searches": 3,
+            "body": {
+                "query": {
+                    "term": {
+                        "country": "de"
+                    }
+                }
+            },
+            "body-params": {
+                "query.term.country": ["de", "ch"]
+            },
+            "request-params": {
+                "max_concurrent_searches": 2
+            }
+        })
+        choices = iter(["de", "ch", "ch"])
+        p = source.params(choice=lambda data: next(choices))
+
+        self.assertEqual(3, p["searches"])
+        self.assertEqual({"max_concurrent_searches": 2}, p["request-params"])
+        self.assertNotIn("filter-response", p)
+        self.assertEqual(b'{"index":"logs","request_cache":false}\n{"query":{"term":{"country":"de"}}}\n'
+                         b'{"index":"logs","request_cache":false}\n{"query":{"term":{"country":"ch"}}}\n'
+                         b'{"index":"logs","request_cache":false}\n{"query":{"term":{"country":"ch"}}}\n', p["body"])
+
+    def test_uses_serialized_search_bodies(self):
+        source = params.MultiSearchParamSource(track=track.Track(name="unit-test"), params={
+            "index": "logs",
+            "type": "doc",
+            "cache": True,
+            "searches": 2,
+            "body": {
+                "query": {
+                    "match_all": {}
+                }
+            },
+            "serialize-body": True,
+            "filter-response": True
+        })
+        p = source.params()
+
+        self.assertTrue(p["filter-response"])
+        self.assertEqual(b'{"index":"logs","request_cache":true,"type":"doc"}\n{"query":{"match_all":{}}}\n' * 2, p["body"])
+
+    def test_searches_must_be_positive_integer(self):
+        with self.assertRaisesRegex(exceptions.InvalidSyntax, r"'searches' must be a positive integer but was \[0\]"):
+            params.MultiSearchParamSource(track=track.Track(name="unit-test"), params={
+                "index": "logs",
+                "body": {},
+                "searches": 0
+            })
+
+    def test_rejects_scroll_queries(self):
+        with self.assertRaisesRegex(exceptions.InvalidSyntax, r"Scroll queries are not supported for operation type 'msearch'"):
+            params.MultiSearchParamSource(track=track.Track(name="unit-test"), params={
+                "index": "logs",
+                "body": {},
+                "searches": 10,
+                "pages": 5
+            })
+
+
+class SlicedScrollParamSourceTests(TestCase):
+    def test_passes_slices_to_runner(self):
+        source = params.SlicedScrollParamSource(track=track.Track(name="unit-test"), params={
+            "index": "_all",
+            "body": {
+                "query": {
+                    "match_all": {}
+                }
+            },
+            "slices": 4,
+            "results-per-page": 1000
+        })
+        p = source.params()
+
+        self.assertEqual(4, p["slices"])
+        self.assertEqual("all", p["pages"])
+        self.assertEqual(1000, p["results-per-page"])
+        self.assertEqual({"query": {"match_all": {}}}, p["body"])
+
+    def test_slices_must_be_positive_integer(self):
+        for slices in [None, 0, "4", True]:
+            with self.assertRaisesRegex(exceptions.InvalidSyntax, r"'slices' must be a positive integer but was \[%s\]" % slices):
+                params.SlicedScrollParamSource(track=track.Track(name="unit-test"), params={
+                    "index": "_all",
+                    "body": {},
+                    "slices": slices
+                })
+
+    def test_rejects_serialized_body(self):
+        with self.assertRaisesRegex(exceptions.InvalidSyntax, r"'serialize-body' is not supported for operation type 'sliced-scroll'"):
+            params.SlicedScrollParamSource(track=track.Track(name="unit-test"), params={
+                "index": "_all",
+                "body": {},
+                "slices": 2,
+                "serialize-body": True
+            })
+
+
 class SearchParamSourceTests(TestCase):
     def test_passes_request_parameters(self):
         index1 = track.Index(name="index1", types=["type1"])
@@ -1588,3 +2273,63 @@ class SearchParamSourceTests(TestCase):
         second = copy.deepcopy(search.params(choice=lambda d: d[1]))
 
         self.assertNotEqual(first, second)
+
+    def test_serializes_body_once(self):
+        search = params.SearchParamSource(track=track.Track(name="unit-test"), params={
+            "index": "_all",
+            "body": {
+                "query": {
+                    "match": {
+                        "title": "näme"
+                    }
+                }
+            },
+            "serialize-body": True
+        })
+
+        self.assertEqual('{"query":{"match":{"title":"näme"}}}'.encode("utf-8"), search.params()["body"])
+
+    def test_renders_serialized_body_params(self):
+        search = params.SearchParamSource(track=track.Track(name="unit-test"), params={
+            "index": "_all",
+            "body": {
+                "query": {
+                    "term": {
+                        "country": "at"
+                    }
+                },
+                "size": 10
+            },
+            "body-params": {
+                # intentionally in a different order than in the body
+                "size": [1, 100],
+                "query.term.country": ["de", {"value": "ch"}]
+            },
+            "serialize-body": True
+        })
+
+        self.assertEqual(b'{"query":{"term":{"country":"de"}},"size":1}', search.params(choice=lambda d: d[0])["body"])
+        self.assertEqual(b'{"query":{"term":{"country":{"value":"ch"}}},"size":100}', search.params(choice=lambda d: d[1])["body"])
+
+    def test_serialize_body_must_be_boolean(self):
+        with self.assertRaisesRegex(exceptions.InvalidSyntax, r"'serialize-body' must be a boolean but was \[yes\]"):
+            params.SearchParamSource(track=track.Track(name="unit-test"), params={
+                "index": "_all",
+                "body": {},
+                "serialize-body": "yes"
+            })
+
+    def test_passes_filter_response_to_runner(self):
+        search = params.SearchParamSource(track=track.Track(name="unit-test"), params={
+            "index": "_all",
+            "body": {},
+            "filter-response": True
+        })
+        self.assertTrue(search.params()["filter-response"])
+
+        with self.assertRaisesRegex(exceptions.InvalidSyntax, r"'filter-response' must be a boolean but was \[yes\]"):
+            params.SearchParamSource(track=track.Track(name="unit-test"), params={
+                "index": "_all",
+                "body": {},
+                "filter-response": "yes"
+            })
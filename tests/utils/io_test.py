@@ -1,4 +1,7 @@
+import bz2
+import gzip
 import os
+import shutil
 import tempfile
 import unittest.mock as mock
 from unittest import TestCase
@@ -76,6 +79,85 @@ class IoTests(TestCase):
         self.assertFalse(io.has_extension("/tmp/README", "README"))
 
 
+class FileOffsetTableTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data_file_path = os.path.join(self.tmp_dir, "docs.json")
+        with open(self.data_file_path, mode="wt", encoding="utf-8") as f:
+            for i in range(1000):
+                print('{"id": %d, "name": "n\u00e4me-%d"}' % (i, i), file=f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def skip(self, lines):
+        with open(self.data_file_path, mode="rt", encoding="utf-8") as f:
+            io.skip_lines(self.data_file_path, f, lines)
+            return f.readline()
+
+    def test_prepare_and_skip_lines(self):
+        for stride in [1, 7, 1000, 5000]:
+            self.assertEqual(1000, io.prepare_file_offset_table(self.data_file_path, stride=stride))
+            for lines in [0, 1, 6, 7, 8, 500, 999]:
+                self.assertEqual('{"id": %d, "name": "n\u00e4me-%d"}\n' % (lines, lines), self.skip(lines))
+            self.assertEqual("", self.skip(1000))
+
+    def test_lookup_returns_closest_offset(self):
+        io.prepare_file_offset_table(self.data_file_path, stride=100)
+        line_number, offset = io.file_offset(self.data_file_path, 250)
+        self.assertEqual(200, line_number)
+        with open(self.data_file_path, mode="rb") as f:
+            self.assertEqual(offset, len(b"".join(f.readlines()[:200])))
+
+    def test_rebuilds_only_if_data_file_changed(self):
+        self.assertEqual(1000, io.prepare_file_offset_table(self.data_file_path))
+        # touching the file does not invalidate the offset table
+        os.utime(self.data_file_path)
+        self.assertIsNone(io.prepare_file_offset_table(self.data_file_path))
+        # ... but a different stride does
+        self.assertEqual(1000, io.prepare_file_offset_table(self.data_file_path, stride=10))
+
+        with open(self.data_file_path, mode="at", encoding="utf-8") as f:
+            print('{"id": 1000}', file=f)
+        self.assertEqual(1001, io.prepare_file_offset_table(self.data_file_path, stride=10))
+
+    def test_ignores_invalid_offset_table(self):
+        with open("%s.offset" % self.data_file_path, mode="wt", encoding="utf-8") as f:
+            print("50000;1234", file=f)
+        self.assertEqual((0, 0), io.file_offset(self.data_file_path, 500))
+        self.assertEqual('{"id": 500, "name": "n\u00e4me-500"}\n', self.skip(500))
+        # the old format is replaced
+        self.assertEqual(1000, io.prepare_file_offset_table(self.data_file_path))
+
+    def test_no_offset_table(self):
+        self.assertEqual((0, 0), io.file_offset(self.data_file_path, 500))
+        self.assertEqual('{"id": 500, "name": "n\u00e4me-500"}\n', self.skip(500))
+
+    def test_builds_offset_table_incrementally(self):
+        with open(self.data_file_path, mode="rb") as f:
+            data = f.read()
+        # switches to a stride of 1000 once the file is larger than expected for a small corpus
+        for threshold, stride in [(len(data), 1), (1024, 1000)]:
+            with mock.patch("esrally.utils.io.OFFSET_TABLE_SMALL_CORPUS_BYTES", threshold):
+                builder = io.OffsetTableBuilder()
+                # chunks that end in the middle of a line
+                for i in range(0, len(data), 333):
+                    builder.update(data[i:i + 333])
+                self.assertEqual(1000, builder.write(self.data_file_path))
+            with open("%s.offset" % self.data_file_path, mode="rb") as f:
+                self.assertEqual(stride, io.OFFSET_TABLE_HEADER.unpack(f.read(io.OFFSET_TABLE_HEADER.size))[1])
+            # up to date
+            self.assertIsNone(io.prepare_file_offset_table(self.data_file_path, stride=stride))
+            for lines in [0, 1, 500, 999]:
+                self.assertEqual('{"id": %d, "name": "n\u00e4me-%d"}\n' % (lines, lines), self.skip(lines))
+
+    def test_counts_last_line_without_newline(self):
+        with open(self.data_file_path, mode="wb") as f:
+            f.write(b"a\nb\nc")
+        self.assertEqual(3, io.prepare_file_offset_table(self.data_file_path, stride=1))
+        self.assertEqual("c", self.skip(2))
+
+
 class DecompressionTests(TestCase):
     def test_decompresses_supported_file_formats(self):
         for ext in ["zip", "gz", "bz2", "tgz", "tar.bz2", "tar.gz"]:
@@ -93,3 +175,139 @@ class DecompressionTests(TestCase):
     def read(self, f):
         with open(f, 'r') as content_file:
             return content_file.read()
+
+
+class ParallelDecompressionTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.lines = ['{"id": %d, "name": "name-%d"}\n' % (i, i) for i in range(10000)]
+        self.data = "".join(self.lines).encode("utf-8")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def create_archive(self, ext, streams, trailer=b""):
+        compress = bz2.compress if ext == "bz2" else gzip.compress
+        archive_path = os.path.join(self.tmp_dir, "docs.json.%s" % ext)
+        chunk_size = -(-len(self.data) // streams)
+        with open(archive_path, mode="wb") as f:
+            for i in range(0, len(self.data), chunk_size):
+                f.write(compress(self.data[i:i + chunk_size]))
+            f.write(trailer)
+        return archive_path
+
+    def assert_decompressed(self, lines_read):
+        with open(os.path.join(self.tmp_dir, "docs.json"), mode="rb") as f:
+            self.assertEqual(self.data, f.read())
+        self.assertEqual(len(self.lines), lines_read)
+        line_number, offset = io.file_offset(os.path.join(self.tmp_dir, "docs.json"), 4321)
+        self.assertEqual(4321, line_number)
+        self.assertEqual(len("".join(self.lines[:4321])), offset)
+
+    def test_decompresses_multiple_streams_in_parallel(self):
+        for ext in ["bz2", "gz"]:
+            archive_path = self.create_archive(ext, streams=7)
+            with mock.patch("esrally.utils.io._do_decompress_manually") as sequential:
+                lines_read = io.decompress(archive_path, self.tmp_dir, workers=4, offset_table=True)
+                self.assertEqual(0, sequential.call_count)
+            self.assert_decompressed(lines_read)
+
+    def test_falls_back_to_sequential_decompression(self):
+        for ext in ["bz2", "gz"]:
+            # a single stream cannot be decompressed in parallel
+            archive_path = self.create_archive(ext, streams=1)
+            self.assert_decompressed(io.decompress(archive_path, self.tmp_dir, workers=4, offset_table=True))
+
+    def test_falls_back_to_sequential_decompression_on_unknown_data(self):
+        # gzip ignores zero padding after the last member
+        archive_path = self.create_archive("gz", streams=3, trailer=b"\x00" * 16)
+        self.assert_decompressed(io.decompress(archive_path, self.tmp_dir, workers=2, offset_table=True))
+
+    def test_decompresses_while_streaming(self):
+        for ext in ["bz2", "gz"]:
+            archive_path = self.create_archive(ext, streams=3)
+            decompressor = io.StreamingDecompressor(archive_path, self.tmp_dir, offset_table=True)
+            with open(archive_path, mode="rb") as f:
+                for chunk in iter(lambda: f.read(1000), b""):
+                    decompressor(chunk)
+            self.assert_decompressed(decompressor.finish())
+
+    def test_raises_error_on_truncated_stream(self):
+        archive_path = self.create_archive("bz2", streams=1)
+        decompressor = io.StreamingDecompressor(archive_path, self.tmp_dir)
+        with open(archive_path, mode="rb") as f:
+            decompressor(f.read(1000))
+        with self.assertRaisesRegex(RuntimeError, r"Could not decompress \[.*docs.json.bz2\] while streaming"):
+            decompressor.finish()
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, "docs.json")))
+
+
+class FramedFileTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data_file_path = os.path.join(self.tmp_dir, "docs.json")
+        self.lines = ['{"id": %d, "name": "n\u00e4me-%d"}\n' % (i, i) for i in range(1000)]
+        self.data = "".join(self.lines).encode("utf-8")
+        self.archive_path = "%s.bz2" % self.data_file_path
+        with open(self.archive_path, mode="wb") as f:
+            f.write(bz2.compress(self.data))
+        self.framed_path = io.framed_file_path(self.data_file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def read_from(self, line_number, lines=3):
+        source = io.data_file_source(self.data_file_path, "rt")
+        self.assertIsInstance(source, io.FramedFileSource)
+        with source:
+            source.skip_lines(line_number)
+            return [source.readline() for _ in range(lines)]
+
+    def test_converts_compressed_file(self):
+        self.assertEqual(1000, io.convert_to_framed(self.archive_path, self.framed_path, lines_per_frame=64))
+
+        lines_per_frame, number_of_lines, size, offsets = io.read_frame_index(self.framed_path)
+        self.assertEqual(64, lines_per_frame)
+        self.assertEqual(1000, number_of_lines)
+        self.assertEqual(len(self.data), size)
+        # 16 frames plus the end of the last frame
+        self.assertEqual(17, len(offsets))
+        self.assertEqual(os.path.getsize(self.framed_path), offsets[-1])
+        # a framed file is a regular multi-member gzip file
+        with gzip.open(self.framed_path, mode="rb") as f:
+            self.assertEqual(self.data, f.read())
+
+    def test_reads_from_any_line(self):
+        io.convert_to_framed(self.archive_path, self.framed_path, lines_per_frame=64)
+        # the uncompressed file is not available
+        self.assertFalse(os.path.exists(self.data_file_path))
+        self.assertTrue(io.has_framed_file_only(self.data_file_path))
+
+        for line_number in [0, 1, 63, 64, 65, 500, 959]:
+            self.assertEqual(self.lines[line_number:line_number + 3], self.read_from(line_number))
+        self.assertEqual([self.lines[999], "", ""], self.read_from(999))
+        self.assertEqual(["", "", ""], self.read_from(1000))
+
+    def test_counts_last_line_without_newline(self):
+        with open(self.data_file_path, mode="wb") as f:
+            f.write(b"a\nb\nc\nd")
+        self.assertEqual(4, io.convert_to_framed(self.data_file_path, self.framed_path, lines_per_frame=2))
+        with io.FramedFileSource(self.framed_path, "rb") as source:
+            source.skip_lines(3)
+            self.assertEqual(b"d", source.readline())
+
+    def test_prefers_uncompressed_file(self):
+        io.convert_to_framed(self.archive_path, self.framed_path)
+        with open(self.data_file_path, mode="wb") as f:
+            f.write(self.data)
+        self.assertFalse(io.has_framed_file_only(self.data_file_path))
+        self.assertIsInstance(io.data_file_source(self.data_file_path, "rt"), io.FileSource)
+
+    def test_incomplete_framed_file_is_ignored(self):
+        writer = io.FramedFileWriter(self.framed_path).open()
+        writer.write(self.data)
+        # the writer has not been closed yet, i.e. there is no frame index
+        self.assertIsNone(io.read_frame_index(self.framed_path))
+        self.assertFalse(io.has_framed_file_only(self.data_file_path))
+        writer.abort()
+        self.assertFalse(os.path.exists(self.framed_path))
@@ -0,0 +1,159 @@
+import hashlib
+import http.server
+import os
+import random
+import shutil
+import socketserver
+import tempfile
+import threading
+import unittest.mock as mock
+import urllib.error
+import urllib3
+from unittest import TestCase
+
+from esrally import exceptions
+from esrally.utils import net
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def respond(self, send_body):
+        server = self.server
+        if self.path != "/docs.json.bz2":
+            self.send_error(404)
+            return
+        byte_range = self.headers.get("Range")
+        server.requests.append((self.command, byte_range))
+        data = server.data
+        if byte_range and server.accept_ranges:
+            start, end = byte_range[len("bytes="):].split("-")
+            data = data[int(start):int(end) + 1]
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        if server.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        if send_body:
+            if self.command == "GET" and server.broken_responses > 0:
+                # simulate a broken connection
+                server.broken_responses -= 1
+                self.wfile.write(data[:len(data) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+            else:
+                self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DownloadTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.local_path = os.path.join(self.tmp_dir, "docs.json.bz2")
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+        self.server.data = random.Random(42).getrandbits(8 * 1024 * 1024).to_bytes(1024 * 1024, "little")
+        self.server.accept_ranges = True
+        self.server.broken_responses = 0
+        self.server.requests = []
+        self.url = "http://127.0.0.1:%d/docs.json.bz2" % self.server.server_address[1]
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def ranges(self):
+        return sorted(byte_range for command, byte_range in self.server.requests if command == "GET")
+
+    def assert_downloaded(self):
+        with open(self.local_path, mode="rb") as f:
+            self.assertEqual(self.server.data, f.read())
+        self.assertEqual(["docs.json.bz2"], os.listdir(self.tmp_dir))
+
+    def test_downloads_segments_in_parallel(self):
+        progress = mock.Mock()
+
+        net.download(self.url, self.local_path, progress_indicator=progress, segments=4)
+
+        self.assert_downloaded()
+        self.assertEqual(["bytes=0-262143", "bytes=262144-524287", "bytes=524288-786431", "bytes=786432-1048575"], self.ranges())
+        progress.assert_called_with(1024 * 1024, 1024 * 1024)
+
+    def test_downloads_in_one_request_without_range_support(self):
+        self.server.accept_ranges = False
+
+        net.download(self.url, self.local_path, segments=4)
+
+        self.assert_downloaded()
+        self.assertEqual([None], self.ranges())
+
+    def test_retries_broken_segment(self):
+        self.server.broken_responses = 1
+
+        net.download(self.url, self.local_path, segments=1)
+
+        self.assert_downloaded()
+        self.assertEqual(["bytes=0-1048575", "bytes=524288-1048575"], self.ranges())
+
+    @mock.patch("esrally.utils.net.PROGRESS_RECORD_INTERVAL_BYTES", 1)
+    @mock.patch("esrally.utils.net.SEGMENT_ATTEMPTS", 1)
+    def test_resumes_interrupted_download(self):
+        self.server.broken_responses = 2
+
+        with self.assertRaises(urllib3.exceptions.ProtocolError):
+            net.download(self.url, self.local_path, segments=2)
+        # the partial download is kept
+        self.assertEqual({"docs.json.bz2.tmp", "docs.json.bz2.tmp.progress"}, set(os.listdir(self.tmp_dir)))
+
+        self.server.requests = []
+        net.download(self.url, self.local_path, segments=2)
+
+        self.assert_downloaded()
+        # only the missing halves of both segments are downloaded
+        self.assertEqual(["bytes=262144-524287", "bytes=786432-1048575"], self.ranges())
+
+    def test_replays_resumed_data_to_chunk_consumer(self):
+        with mock.patch("esrally.utils.net.PROGRESS_RECORD_INTERVAL_BYTES", 1), mock.patch("esrally.utils.net.SEGMENT_ATTEMPTS", 1):
+            self.server.broken_responses = 1
+            with self.assertRaises(urllib3.exceptions.ProtocolError):
+                net.download(self.url, self.local_path, chunk_consumer=lambda chunk: None)
+
+        chunks = []
+        net.download(self.url, self.local_path, chunk_consumer=chunks.append, segments=4)
+
+        self.assert_downloaded()
+        self.assertEqual(self.server.data, b"".join(chunks))
+
+    def test_verifies_checksum(self):
+        with self.assertRaisesRegex(exceptions.DataError, r"Expected sha256 checksum \[abc\]"):
+            net.download(self.url, self.local_path, checksum="sha256:abc")
+        self.assertEqual([], os.listdir(self.tmp_dir))
+
+        net.download(self.url, self.local_path, checksum="sha256:%s" % hashlib.sha256(self.server.data).hexdigest())
+        self.assert_downloaded()
+
+    def test_raises_error_on_unexpected_size(self):
+        with self.assertRaisesRegex(exceptions.DataError, r"Downloaded \[1048576\] bytes but \[100\] bytes are expected"):
+            net.download(self.url, self.local_path, expected_size_in_bytes=100)
+        self.assertEqual([], os.listdir(self.tmp_dir))
+
+    def test_raises_error_on_missing_file(self):
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            net.download(self.url + ".missing", self.local_path)
+        self.assertEqual(404, ctx.exception.code)
+        self.assertEqual([], os.listdir(self.tmp_dir))